@@ -0,0 +1,27 @@
+from django.template import defaultfilters
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.formats import localize
+from jinja2 import Environment, Undefined
+
+
+def url(viewname, *args, **kwargs):
+    return reverse(viewname, args=args or None, kwargs=kwargs or None)
+
+
+def environment(**options):
+    # Как в шаблонах Django, отсутствующая переменная выводится пустой строкой
+    # и при DEBUG, а не текстом '{{ имя }}'
+    options['undefined'] = Undefined
+    env = Environment(**options)
+    env.globals.update({
+        'static': static,
+        'url': url,
+    })
+    # Фильтры Django, чтобы вывод совпадал с шаблонами Django
+    env.filters.update({
+        'localize': localize,
+        'truncatewords': defaultfilters.truncatewords,
+        'urlencode': defaultfilters.urlencode,
+    })
+    return env
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
+import datetime
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -43,10 +46,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'vacancy.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'vacancy.middleware.RateLimitMiddleware',
+    'vacancy.middleware.ProfilingMiddleware',
+    'vacancy.middleware.MemoryTrackingMiddleware',
+    'vacancy.middleware.VacancyViewsMiddleware',
+    'vacancy.middleware.PrerenderedPageMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,8 +76,23 @@ TEMPLATES = [
             ],
         },
     },
+    {
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'environment': 'cong.jinja2.environment',
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+            ],
+        },
+    },
 ]
 
+# Движок для публичных страниц: 'django' или 'jinja2'
+PUBLIC_TEMPLATE_ENGINE = os.environ.get('PUBLIC_TEMPLATE_ENGINE', 'django')
+
 WSGI_APPLICATION = 'cong.wsgi.application'
 
 
@@ -82,6 +106,26 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения. Для локальной проверки достаточно указать
+# DB_REPLICAS=db-replica.sqlite3 и синхронизировать файл командой sync_replicas
+
+DATABASE_REPLICAS = []
+for number, replica_name in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    alias = 'replica{}'.format(number)
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, replica_name),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['vacancy.routers.PrimaryReplicaRouter']
+
+# Сколько секунд реплика может отставать от основной базы. Столько же
+# после изменяющего запроса чтения клиента идут в основную базу
+REPLICA_MAX_LAG = 10
+REPLICA_PIN_COOKIE = 'read_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -130,3 +174,146 @@ MEDIA_SPECIALITY_IMAGE_DIR = 'speciality'
 
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
+
+# Sitemap и Atom-ленты каталога
+
+SITEMAP_PAGE_SIZE = 5000
+SITEMAP_CHUNK_SIZE = 2000
+FEED_ITEMS_COUNT = 50
+SECTION_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Через сколько дней вакансия считается устаревшей и уходит в архив
+
+VACANCY_LIFETIME_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+
+# Дайджесты сохраненных поисков складываются в локальный outbox
+
+SAVED_SEARCH_OUTBOX_DIR = os.path.join(BASE_DIR, 'outbox')
+SAVED_SEARCH_CHUNK_SIZE = 2000
+# Адрес сайта для ссылок в письмах
+SITE_URL = os.environ.get('SITE_URL', 'https://django-vacancies-project.herokuapp.com')
+
+# Похожие вакансии
+
+SIMILARITY_INDEX_PATH = os.path.join(BASE_DIR, 'var', 'similarity.npz')
+SIMILARITY_FEATURES = 2 ** 18
+SIMILARITY_TOP_K = 5
+SIMILARITY_BATCH_SIZE = 256
+
+# Статистика зарплат
+
+SALARY_STATS_CHUNK_SIZE = 5000
+
+# Журнал изменений для внешних потребителей
+
+CHANGELOG_BATCH_SIZE = 1000
+CHANGELOG_SAFETY_LAG = datetime.timedelta(seconds=5)
+# Пропуск в id дольше этого считается откатом транзакции, а не незафиксированной записью
+CHANGELOG_GAP_TIMEOUT = datetime.timedelta(minutes=5)
+
+# Профилирование запросов сотрудниками (?profile=1 или заголовок X-Profile)
+
+PROFILING_ENABLED = True
+PROFILING_DIR = os.path.join(BASE_DIR, 'var', 'profiles')
+PROFILING_REQUESTS_PER_DUMP = 10
+PROFILING_SAMPLE_INTERVAL = 0.005
+
+# Замеры памяти по представлениям
+
+MEMORY_TRACKING_SAMPLE_RATE = 0.01
+MEMORY_PEAK_WARNING = 32 * 1024 * 1024
+
+# Статические копии публичных страниц
+
+PRERENDER_DIR = os.path.join(BASE_DIR, 'var', 'pages')
+PRERENDER_HOST = 'django-vacancies-project.herokuapp.com'
+PRERENDER_BATCH_SIZE = 200
+
+# Поиск резюме работодателями
+
+RESUME_SEARCH_PAGE_SIZE = 20
+
+# Загрузка логотипов компаний
+
+LOGO_MAX_UPLOAD_SIZE = 2 * 1024 * 1024
+LOGO_MAX_DIMENSIONS = (4000, 4000)
+LOGO_FORMATS = ('PNG', 'JPEG', 'GIF', 'WEBP')
+LOGO_SIZE = (260, 160)
+
+# Поиск вакансий: бюджет времени на запрос и упрощенный режим
+
+SEARCH_MIN_QUERY_LENGTH = 3
+SEARCH_TIME_BUDGET = 0.5
+SEARCH_MAX_RESULTS = 200
+SEARCH_CACHE_TIMEOUT = 60
+SEARCH_STALE_TIMEOUT = 24 * 60 * 60
+SEARCH_DEGRADED_WINDOW = 5000
+
+# Кеш вакансий и компаний по первичному ключу
+
+OBJECT_CACHE_TIMEOUT = 10 * 60
+
+# Ограничение частоты запросов: имя URL -> метод -> (жетонов, за сколько секунд)
+
+RATE_LIMITS = {
+    'vacancies_search': {'GET': (30, 60)},
+    'vacancy': {'POST': (5, 60)},
+}
+# За роутером Heroku адрес клиента приходит в X-Forwarded-For
+RATE_LIMIT_FORWARDED_FOR = 'DYNO' in os.environ
+
+# Счетчики лимитов, метрики и кеш объектов должны быть общими для всех
+# воркеров: в продакшене кеш живет в memcached, кеш в памяти процесса
+# остается только для разработки и тестов
+
+if os.environ.get('MEMCACHED_SERVERS'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': os.environ['MEMCACHED_SERVERS'].split(','),
+        },
+    }
+elif 'DYNO' in os.environ:
+    # С кешем в памяти у каждого воркера были бы свои лимиты и метрики
+    raise ImproperlyConfigured('Не задан MEMCACHED_SERVERS: нужен общий для воркеров кеш')
+
+# Поиск дубликатов вакансий (MinHash + LSH): 16 полос по 8 значений
+# находят пары со сходством от ~0.7, оценка сходства отсекает ниже порога
+
+DEDUP_PERMUTATIONS = 128
+DEDUP_BANDS = 16
+DEDUP_SHINGLE_SIZE = 3
+DEDUP_THRESHOLD = 0.8
+DEDUP_MAX_CANDIDATES = 50
+DEDUP_BATCH_SIZE = 1000
+
+# Поиск вакансий по расстоянию до города, км
+
+LOCATION_DEFAULT_RADIUS = 50
+LOCATION_MAX_RADIUS = 1000
+
+# Резервные копии SQLite базы
+
+BACKUP_DIR = os.path.join(BASE_DIR, 'var', 'backups')
+BACKUP_KEEP = 7
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.01
+BACKUP_BUSY_TIMEOUT = 30
+BACKUP_MAX_RESTARTS = 20
+
+# Дневная статистика откликов и просмотров для работодателей
+
+ROLLUP_FLUSH_INTERVAL = 60
+ROLLUP_FLUSH_SIZE = 1000
+ROLLUP_BATCH_SIZE = 10000
+ANALYTICS_DEFAULT_DAYS = 30
+ANALYTICS_MAX_DAYS = 365
+
+# Списки вакансий постранично; каталог открытых вакансий в памяти процесса
+# (см. vacancy.catalog) включается переменной окружения VACANCY_CATALOG=1
+
+VACANCIES_PAGE_SIZE = 50
+VACANCY_CATALOG_ENABLED = os.environ.get('VACANCY_CATALOG') == '1'
+VACANCY_CATALOG_POLL_INTERVAL = 1
+VACANCY_CATALOG_BATCH_SIZE = 500
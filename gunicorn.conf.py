@@ -0,0 +1,41 @@
+import os
+
+from vacancy.memory import current_rss
+
+# Воркер, раздувшийся больше WORKER_MAX_RSS_MB, дорабатывает текущий
+# запрос и перезапускается мастером
+
+worker_max_rss = int(os.environ.get('WORKER_MAX_RSS_MB', 512)) * 1024 * 1024
+
+
+def when_ready(server):
+    # С --preload (см. Procfile) приложение уже загружено в мастере: шаблоны
+    # и URLconf компилируются один раз и достаются воркерам после fork
+    from vacancy.warmup import warm_up_code
+
+    warm_up_code()
+
+
+def post_worker_init(worker):
+    # Соединения с базой открываются уже в воркере: общие сокеты после fork
+    # использовать нельзя
+    from vacancy.warmup import warm_up_worker
+
+    warm_up_worker(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    # Просмотры вакансий копятся в памяти воркера, см. vacancy.rollups
+    from vacancy.rollups import flush_views
+
+    flush_views()
+
+
+def post_request(worker, req, environ, resp):
+    rss = current_rss()
+    if rss > worker_max_rss:
+        worker.log.warning(
+            'Worker %s RSS %d MiB exceeds %d MiB after %s, recycling',
+            worker.pid, rss // 2 ** 20, worker_max_rss // 2 ** 20, req.path,
+        )
+        worker.alive = False
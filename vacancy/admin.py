@@ -1,9 +1,166 @@
+import csv
+
 from django.contrib import admin
-from .models import Company, Speciality, Vacancy, Application, Resume
-
-# Register your models here.
-admin.site.register(Company)
-admin.site.register(Speciality)
-admin.site.register(Vacancy)
-admin.site.register(Application)
-admin.site.register(Resume)
+from django.contrib.admin.utils import get_fields_from_path
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, models, transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
+
+from . import objectcache, prerender
+from .models import ChangeLogEntry, Company, LogoField, Speciality, Vacancy, Application, Resume
+from .sections import company_section, sitemap_page_for, sitemap_section, speciality_section, touch_section
+
+# Ниже этого числа строк точный COUNT(*) дешевле оценки
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Для таблицы без фильтров берет оценку числа строк из статистики базы
+    вместо COUNT(*). С фильтрами считает точно - там работают индексы.
+    """
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            estimate = self.estimate(self.object_list)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def estimate(queryset):
+        table = queryset.model._meta.db_table
+        connection = connections[queryset.db]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            elif connection.vendor == 'sqlite':
+                # sqlite_stat1 появляется после ANALYZE
+                if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+                    return None
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return int(str(row[0]).split()[0])
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_search_results(self, request, queryset, search_term):
+        # Строка поиска целиком сравнивается на равенство с полями search_fields:
+        # istartswith и iexact становятся LIKE, который SQLite не берет из индекса
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        conditions = Q()
+        for field_name in self.get_search_fields(request):
+            try:
+                value = get_fields_from_path(self.model, field_name)[-1].to_python(search_term)
+            except ValidationError:
+                continue
+            conditions |= Q(**{field_name: value})
+        if not conditions:
+            return queryset.none(), False
+        return queryset.filter(conditions), False
+
+
+@admin.register(Company)
+class CompanyAdmin(ScalableAdmin):
+    list_display = ('id', 'name', 'location', 'city', 'employee_count', 'owner')
+    list_select_related = ('owner', 'city')
+    search_fields = ('name',)
+    raw_id_fields = ('owner', 'city')
+    formfield_overrides = {models.ImageField: {'form_class': LogoField}}
+
+
+@admin.register(Speciality)
+class SpecialityAdmin(admin.ModelAdmin):
+    list_display = ('id', 'code', 'title')
+
+
+@admin.register(Vacancy)
+class VacancyAdmin(ScalableAdmin):
+    list_display = ('id', 'title', 'company', 'speciality', 'published_at', 'is_closed')
+    list_select_related = ('company', 'speciality')
+    list_filter = ('is_closed', 'speciality')
+    search_fields = ('id', 'company__name')
+    raw_id_fields = ('company', 'duplicate_of')
+    actions = ('close_vacancies',)
+
+    def close_vacancies(self, request, queryset):
+        rows = list(queryset.filter(is_closed=False).values_list('id', 'speciality__code', 'company_id'))
+        ids = [row[0] for row in rows]
+        with transaction.atomic():
+            updated = Vacancy.objects.filter(id__in=ids).update(is_closed=True)
+            # update() идет мимо save(), поэтому журнал изменений пишется здесь же
+            closed = list(Vacancy.objects.filter(id__in=ids).select_related('speciality'))
+            ChangeLogEntry.objects.bulk_create(
+                [ChangeLogEntry.entry_for(vacancy, ChangeLogEntry.SAVE) for vacancy in closed],
+                batch_size=500,
+            )
+        # update() не вызывает сигналы, поэтому кеш объектов, копии страниц
+        # и разделы каталога сбрасываются вручную
+        for vacancy in closed:
+            objectcache.invalidate(Vacancy, vacancy.id)
+            prerender.invalidate(prerender.vacancy_paths(vacancy))
+        sections = {'sitemap:index'}
+        for vacancy_id, speciality_code, company_id in rows:
+            sections.update((
+                sitemap_section(sitemap_page_for(vacancy_id)),
+                speciality_section(speciality_code),
+                company_section(company_id),
+            ))
+        touch_section(*sections)
+        self.message_user(request, 'Закрыто вакансий: {}'.format(updated))
+    close_vacancies.short_description = 'Закрыть выбранные вакансии'
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+@admin.register(Application)
+class ApplicationAdmin(ScalableAdmin):
+    list_display = ('id', 'written_username', 'written_phone', 'vacancy', 'user')
+    list_select_related = ('vacancy', 'user')
+    list_filter = ('vacancy__speciality',)
+    search_fields = ('vacancy__id', 'user__username')
+    raw_id_fields = ('vacancy', 'user')
+    actions = ('export_applications',)
+
+    def export_applications(self, request, queryset):
+        rows = queryset.order_by('id').values_list(
+            'id', 'vacancy_id', 'vacancy__title', 'written_username', 'written_phone', 'written_cover_letter',
+        )
+        writer = csv.writer(Echo())
+        header = ('id', 'vacancy_id', 'vacancy', 'username', 'phone', 'cover_letter')
+        lines = (writer.writerow(row) for row in rows.iterator())
+        response = StreamingHttpResponse(
+            (line for chunk in ([writer.writerow(header)], lines) for line in chunk),
+            content_type='text/csv; charset=utf-8',
+        )
+        response['Content-Disposition'] = 'attachment; filename="applications.csv"'
+        return response
+    export_applications.short_description = 'Выгрузить отклики в CSV'
+
+
+@admin.register(Resume)
+class ResumeAdmin(ScalableAdmin):
+    list_display = ('id', 'name', 'surname', 'speciality', 'grade', 'status', 'salary', 'user')
+    list_select_related = ('speciality', 'user')
+    list_filter = ('speciality',)
+    search_fields = ('id', 'user__username')
+    raw_id_fields = ('user',)
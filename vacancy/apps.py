@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class VacancyConfig(AppConfig):
     name = 'vacancy'
+
+    def ready(self):
+        from vacancy import signals  # noqa: F401
@@ -0,0 +1,140 @@
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.db import connections
+
+SNAPSHOT_PREFIX = 'db-'
+SNAPSHOT_SUFFIXES = ('.sqlite3', '.sqlite3.gz')
+
+
+class BackupError(Exception):
+    pass
+
+
+def database_path(alias):
+    database = connections.databases[alias]
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise BackupError('Резервное копирование поддерживается только для SQLite')
+    return database['NAME']
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _copy(source, target, pages, sleep):
+    # Между шагами блокировка источника снята, и пишущие воркеры успевают
+    # выполнить свои транзакции. Если источник меняется, SQLite начинает
+    # копирование заново: это видно по выросшему числу оставшихся страниц
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > settings.BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        time.sleep(sleep)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    except _TooManyRestarts:
+        # База меняется быстрее, чем копируется по шагам: копируем одним шагом,
+        # пишущие соединения подождут его в пределах своего busy timeout
+        source.backup(target)
+
+
+def _check(path):
+    connection = sqlite3.connect(path)
+    try:
+        result = connection.execute('PRAGMA quick_check').fetchone()[0]
+    except sqlite3.DatabaseError as error:
+        result = str(error)
+    finally:
+        connection.close()
+    if result != 'ok':
+        raise BackupError('Копия {} повреждена: {}'.format(path, result))
+
+
+def snapshots(directory=None):
+    directory = directory or settings.BACKUP_DIR
+    paths = [
+        path for suffix in SNAPSHOT_SUFFIXES
+        for path in glob.glob(os.path.join(directory, SNAPSHOT_PREFIX + '*' + suffix))
+    ]
+    # Имена содержат время снимка, поэтому сортировка по имени хронологическая
+    return sorted(paths, key=os.path.basename)
+
+
+def backup(alias, directory=None, compress=False, pages=None, sleep=None):
+    """Снимок базы без остановки приложения. Возвращает путь к файлу снимка."""
+    source_path = database_path(alias)
+    directory = directory or settings.BACKUP_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = SNAPSHOT_PREFIX + time.strftime('%Y%m%d-%H%M%S') + SNAPSHOT_SUFFIXES[compress]
+    path = os.path.join(directory, name)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        source = sqlite3.connect(source_path, timeout=settings.BACKUP_BUSY_TIMEOUT)
+        target = sqlite3.connect(tmp_path)
+        try:
+            _copy(
+                source, target,
+                pages or settings.BACKUP_PAGES_PER_STEP,
+                settings.BACKUP_STEP_SLEEP if sleep is None else sleep,
+            )
+        finally:
+            target.close()
+            source.close()
+        _check(tmp_path)
+        if compress:
+            with open(tmp_path, 'rb') as raw, gzip.open(tmp_path + '.gz', 'wb') as packed:
+                shutil.copyfileobj(raw, packed)
+            os.replace(tmp_path + '.gz', path)
+        else:
+            os.replace(tmp_path, path)
+    finally:
+        for leftover in (tmp_path, tmp_path + '.gz'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return path
+
+
+def rotate(keep, directory=None):
+    """Удаляет старые снимки, оставляя keep последних."""
+    removed = snapshots(directory)[:-keep] if keep else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def restore(alias, path):
+    """
+    Заменяет содержимое базы снимком через тот же backup API, не подменяя
+    файл под открытыми соединениями. Копирование идет одним шагом, чтобы
+    никто не увидел наполовину восстановленную базу.
+    """
+    target_path = database_path(alias)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if path.endswith('.gz'):
+            unpacked = os.path.join(tmp_dir, 'snapshot.sqlite3')
+            with gzip.open(path, 'rb') as packed, open(unpacked, 'wb') as raw:
+                shutil.copyfileobj(packed, raw)
+            path = unpacked
+        _check(path)
+        connections[alias].close()
+        source = sqlite3.connect(path)
+        target = sqlite3.connect(target_path, timeout=settings.BACKUP_BUSY_TIMEOUT)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
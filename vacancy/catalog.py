@@ -0,0 +1,175 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from vacancy.changes import committed, oldest_position
+from vacancy.models import ChangeLogEntry, Vacancy, vacancy_expiry_date
+
+CATALOG_FIELDS = (
+    'id', 'speciality_id', 'company_id', 'company__city_id',
+    'salary_min', 'salary_max', 'published_at', 'duplicate_of_id',
+)
+COLUMNS = ('id', 'speciality', 'company', 'city', 'salary_min', 'salary_max', 'published_at', 'duplicate_of')
+# Пустые значения: у id и ссылок их не бывает ниже 1, у зарплат - ниже 0
+NULLS = {'city': -1, 'salary_min': -1, 'salary_max': -1, 'duplicate_of': 0}
+
+# Сортировки списка вакансий: порядок в базе, каталог повторяет его в sorted_ids()
+ORDERINGS = {
+    'new': ('-published_at', '-id'),
+    'salary': (Coalesce(F('salary_max'), F('salary_min')).desc(nulls_last=True), '-id'),
+}
+DEFAULT_ORDERING = 'new'
+
+
+def _columns(rows):
+    rows = list(rows)
+    values = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+    columns = {}
+    for name, column in zip(COLUMNS, values):
+        if name == 'published_at':
+            columns[name] = np.fromiter((day.toordinal() for day in column), dtype=np.int32, count=len(column))
+        else:
+            null = NULLS.get(name)
+            columns[name] = np.fromiter(
+                (null if value is None else value for value in column), dtype=np.int64, count=len(column),
+            )
+    return columns
+
+
+def _fetch(vacancy_ids):
+    vacancy_ids = list(vacancy_ids)
+    rows = []
+    for start in range(0, len(vacancy_ids), settings.VACANCY_CATALOG_BATCH_SIZE):
+        chunk = vacancy_ids[start:start + settings.VACANCY_CATALOG_BATCH_SIZE]
+        rows.extend(Vacancy.objects.filter(id__in=chunk, is_closed=False).values_list(*CATALOG_FIELDS))
+    return rows
+
+
+class VacancyCatalog:
+    """
+    Открытые вакансии в памяти процесса, по массиву numpy на поле. Фильтры,
+    сортировка и подсчет считаются векторно, из базы читается только страница.
+    Изменения подтягиваются из журнала изменений, как у ChangeFeed.
+    """
+
+    def __init__(self, columns, position):
+        self.columns = columns
+        # id последней учтенной записи журнала
+        self.position = position
+
+    @classmethod
+    def load(cls):
+        # Позиция берется до чтения вакансий: изменения, сделанные во время
+        # чтения, будут применены повторно при следующем опросе
+        position = cls.safe_position()
+        rows = Vacancy.objects.filter(is_closed=False).order_by('id').values_list(*CATALOG_FIELDS)
+        return cls(_columns(rows.iterator(chunk_size=settings.VACANCY_CATALOG_BATCH_SIZE)), position)
+
+    @staticmethod
+    def safe_position():
+        # Записи старше CHANGELOG_GAP_TIMEOUT учтены все, дальше позиция идет
+        # до первой свежей записи или пропуска в id, как у ChangeFeed
+        gap_horizon = timezone.now() - settings.CHANGELOG_GAP_TIMEOUT
+        position = ChangeLogEntry.objects.filter(created_at__lte=gap_horizon).aggregate(position=Max('id'))['position']
+        position = max(position or 0, oldest_position())
+        entries = ChangeLogEntry.objects.filter(id__gt=position).order_by('id').only('id', 'created_at')
+        for entry in committed(entries.iterator(), position):
+            position = entry.id
+        return position
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def poll(self):
+        """Применяет записи журнала после position. False, если нужна полная перезагрузка."""
+        # Записи, прочитанные всеми потребителями, удаляются (см. changes.prune):
+        # если удалены и неучтенные, часть изменений пропала
+        if oldest_position() > self.position:
+            return False
+
+        entries = list(
+            ChangeLogEntry.objects.filter(id__gt=self.position).order_by('id')
+            .only('id', 'model', 'object_id', 'created_at')
+        )
+        # Позиция сдвигается по всем записям, а применяются и еще не
+        # зафиксированные в позиции: повторное применение ничего не портит
+        position = self.position
+        for entry in committed(entries, position):
+            position = entry.id
+        vacancy_ids, company_ids = set(), set()
+        for entry in entries:
+            if entry.model == 'vacancy':
+                vacancy_ids.add(entry.object_id)
+            elif entry.model == 'company':
+                company_ids.add(entry.object_id)
+        if company_ids:
+            # От компании зависит город всех ее вакансий
+            company_ids = list(company_ids)
+            vacancy_ids.update(self.columns['id'][np.isin(self.columns['company'], company_ids)].tolist())
+            vacancy_ids.update(Vacancy.objects.filter(company_id__in=company_ids).values_list('id', flat=True))
+        if vacancy_ids:
+            self.replace(vacancy_ids, _fetch(vacancy_ids))
+        self.position = position
+        return True
+
+    def replace(self, vacancy_ids, rows):
+        columns = self.columns
+        keep = ~np.isin(columns['id'], list(vacancy_ids))
+        added = _columns(rows)
+        merged = {name: np.concatenate([columns[name][keep], added[name]]) for name in COLUMNS}
+        order = np.argsort(merged['id'], kind='stable')
+        # Столбцы подменяются целиком: запросы в других потоках дочитывают прежние
+        self.columns = {name: column[order] for name, column in merged.items()}
+
+    def select(self, speciality_ids=None, city_ids=None, collapsed=True):
+        """Маска активных вакансий, как Vacancy.objects.active().collapsed() с фильтрами."""
+        columns = self.columns
+        mask = columns['published_at'] >= vacancy_expiry_date().toordinal()
+        if collapsed:
+            # Дубликат скрывается, пока его оригинал открыт
+            mask &= ~np.isin(columns['duplicate_of'], columns['id'][mask])
+        if speciality_ids is not None:
+            mask &= np.isin(columns['speciality'], list(speciality_ids))
+        if city_ids is not None:
+            mask &= np.isin(columns['city'], list(city_ids))
+        return columns, mask
+
+    def sorted_ids(self, columns, mask, ordering=DEFAULT_ORDERING):
+        positions = np.flatnonzero(mask)
+        ids = columns['id'][positions]
+        if ordering == 'salary':
+            salary = columns['salary_max'][positions]
+            salary = np.where(salary >= 0, salary, columns['salary_min'][positions])
+            order = np.lexsort((-ids, -salary))
+        else:
+            order = np.lexsort((-ids, -columns['published_at'][positions]))
+        return ids[order]
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+_polled_at = 0.0
+
+
+def get():
+    """Актуальный каталог процесса или None, если каталог выключен."""
+    global _catalog, _polled_at
+    if not settings.VACANCY_CATALOG_ENABLED:
+        return None
+    with _catalog_lock:
+        if time.monotonic() - _polled_at >= settings.VACANCY_CATALOG_POLL_INTERVAL:
+            if _catalog is None or not _catalog.poll():
+                _catalog = VacancyCatalog.load()
+            _polled_at = time.monotonic()
+        return _catalog
+
+
+def mark_stale():
+    # Процесс, изменивший вакансию, видит изменение сразу, не дожидаясь опроса
+    global _polled_at
+    _polled_at = 0.0
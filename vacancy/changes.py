@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from vacancy.models import ChangeConsumer, ChangeLogEntry
+
+
+def committed(entries, position):
+    """
+    Начало entries (записей после position по возрастанию id), которое уже
+    не изменится. Транзакция с меньшим id может зафиксироваться позже
+    транзакции с большим, поэтому чтение останавливается на свежей записи
+    и на пропуске в id, пока пропуск не старше CHANGELOG_GAP_TIMEOUT
+    (тогда это откаченная транзакция).
+    """
+    now = timezone.now()
+    horizon = now - settings.CHANGELOG_SAFETY_LAG
+    gap_horizon = now - settings.CHANGELOG_GAP_TIMEOUT
+    for entry in entries:
+        if entry.created_at > horizon:
+            return
+        if entry.id != position + 1 and entry.created_at > gap_horizon:
+            return
+        position = entry.id
+        yield entry
+
+
+def oldest_position():
+    """Позиция перед самой старой записью журнала: записи до нее удалены prune()."""
+    oldest = ChangeLogEntry.objects.aggregate(id=Min('id'))['id']
+    return 0 if oldest is None else oldest - 1
+
+
+class ChangeFeed:
+    """
+    Чтение журнала изменений с курсором. Позиция сдвигается только после
+    ack(), поэтому пачка, обработка которой упала, будет прочитана снова
+    (доставка как минимум один раз).
+    """
+
+    def __init__(self, name, batch_size=None):
+        self.consumer, _ = ChangeConsumer.objects.get_or_create(name=name)
+        self.batch_size = batch_size or settings.CHANGELOG_BATCH_SIZE
+
+    def read(self):
+        # Новый потребитель начинает с самой старой сохранившейся записи,
+        # пропуск перед ней - удаленные записи, а не незафиксированные
+        position = max(self.consumer.position, oldest_position())
+        entries = ChangeLogEntry.objects.filter(id__gt=position).order_by('id')[:self.batch_size]
+        return list(committed(entries, position))
+
+    def ack(self, entries):
+        if not entries:
+            return
+        self.consumer.position = entries[-1].id
+        ChangeConsumer.objects.filter(id=self.consumer.id, position__lt=self.consumer.position).update(
+            position=self.consumer.position, updated_at=timezone.now(),
+        )
+
+    def batches(self):
+        while True:
+            entries = self.read()
+            if not entries:
+                return
+            yield entries
+
+
+def prune():
+    """
+    Удаляет записи, которые прочитали все потребители. Последняя прочитанная
+    остается: по ней читатели без курсора (см. catalog) отличают удаленные
+    записи от пропуска в id.
+    """
+    with transaction.atomic():
+        position = ChangeConsumer.objects.aggregate(position=Min('position'))['position']
+        if position is None:
+            return 0
+        deleted, _ = ChangeLogEntry.objects.filter(id__lt=position).delete()
+    return deleted
@@ -0,0 +1,181 @@
+import hashlib
+import math
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from vacancy import objectcache, prerender
+from vacancy.models import ChangeLogEntry, Vacancy, VacancyBucket, VacancySignature
+
+WORD_RE = re.compile(r'\w+')
+TEXT_FIELDS = ('title', 'skills', 'text')
+
+# Хеши перестановок (a * x + b) mod p по простому Мерсенна 2^31 - 1:
+# произведение укладывается в uint64 без переполнения
+MERSENNE_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(20201101)
+PERMUTATION_A = _random.randint(1, MERSENNE_PRIME, settings.DEDUP_PERMUTATIONS).astype(np.uint64)
+PERMUTATION_B = _random.randint(0, MERSENNE_PRIME, settings.DEDUP_PERMUTATIONS).astype(np.uint64)
+
+
+def shingles(title, skills, text):
+    words = WORD_RE.findall(' '.join((title, skills, text)).lower())
+    size = settings.DEDUP_SHINGLE_SIZE
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[start:start + size]) for start in range(len(words) - size + 1)}
+
+
+def signature(title, skills, text):
+    items = shingles(title, skills, text)
+    if not items:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(item.encode()) % MERSENNE_PRIME for item in items), dtype=np.uint64, count=len(items),
+    )
+    return ((np.outer(hashes, PERMUTATION_A) + PERMUTATION_B) % MERSENNE_PRIME).min(axis=0).astype(np.uint32)
+
+
+def buckets(minhash):
+    rows = len(minhash) // settings.DEDUP_BANDS
+    for band in range(settings.DEDUP_BANDS):
+        digest = hashlib.blake2b(minhash[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest()
+        # 63 бита помещаются в BigIntegerField
+        yield band, int.from_bytes(digest, 'big') >> 1
+
+
+def similarity(first, second):
+    """Оценка коэффициента Жаккара по доле совпавших минимумов."""
+    return float(np.mean(first == second))
+
+
+def load_signature(value):
+    return np.frombuffer(bytes(value), dtype=np.uint32)
+
+
+def find_originals(items):
+    """
+    Для пачки (vacancy_id, сигнатура), упорядоченной по id, находит оригинал
+    каждой вакансии среди более ранних: {vacancy_id: id оригинала или None}.
+    Новая, еще не сохраненная вакансия передается с vacancy_id=None.
+    Все кандидаты пачки ищутся одним запросом к таблице корзин.
+    """
+    item_buckets = {vacancy_id: list(buckets(minhash)) for vacancy_id, minhash in items if minhash is not None}
+    if not item_buckets:
+        return {vacancy_id: None for vacancy_id, minhash in items}
+
+    by_band = defaultdict(set)
+    for pairs in item_buckets.values():
+        for band, bucket in pairs:
+            by_band[band].add(bucket)
+    query = Q()
+    for band, band_buckets in by_band.items():
+        query |= Q(band=band, bucket__in=band_buckets)
+    candidates = VacancyBucket.objects.filter(query)
+    ids = [vacancy_id for vacancy_id, minhash in items if vacancy_id is not None]
+    if len(ids) == len(items):
+        candidates = candidates.filter(vacancy_id__lt=max(ids))
+
+    members = defaultdict(set)
+    for vacancy_id, band, bucket in candidates.values_list('vacancy_id', 'band', 'bucket').iterator():
+        members[(band, bucket)].add(vacancy_id)
+
+    local = {vacancy_id: minhash for vacancy_id, minhash in items}
+    wanted = {
+        candidate
+        for pairs in item_buckets.values() for pair in pairs for candidate in members[pair]
+        if candidate not in local
+    }
+    signatures, originals = {}, {}
+    for vacancy_id, minhash, duplicate_of in (
+        VacancySignature.objects.filter(vacancy_id__in=wanted)
+        .values_list('vacancy_id', 'minhash', 'vacancy__duplicate_of')
+        .iterator()
+    ):
+        signatures[vacancy_id] = load_signature(minhash)
+        originals[vacancy_id] = duplicate_of or vacancy_id
+
+    result = {}
+    for vacancy_id, minhash in items:
+        if minhash is None:
+            result[vacancy_id] = None
+            continue
+        limit = math.inf if vacancy_id is None else vacancy_id
+        found = set()
+        for pair in item_buckets[vacancy_id]:
+            found.update(candidate for candidate in members[pair] if candidate < limit)
+        matches = []
+        for candidate in sorted(found)[:settings.DEDUP_MAX_CANDIDATES]:
+            if candidate in local:
+                other, original = local[candidate], result.get(candidate) or candidate
+            else:
+                other, original = signatures.get(candidate), originals.get(candidate)
+            if other is not None and similarity(minhash, other) >= settings.DEDUP_THRESHOLD:
+                matches.append(original)
+        result[vacancy_id] = min(matches) if matches else None
+    return result
+
+
+def store_signatures(items):
+    ids = [vacancy_id for vacancy_id, minhash in items]
+    VacancyBucket.objects.filter(vacancy_id__in=ids).delete()
+    VacancySignature.objects.filter(vacancy_id__in=ids).delete()
+    VacancySignature.objects.bulk_create(
+        [VacancySignature(vacancy_id=vacancy_id, minhash=minhash.tobytes()) for vacancy_id, minhash in items
+         if minhash is not None],
+        batch_size=1000,
+    )
+    VacancyBucket.objects.bulk_create(
+        [
+            VacancyBucket(vacancy_id=vacancy_id, band=band, bucket=bucket)
+            for vacancy_id, minhash in items if minhash is not None
+            for band, bucket in buckets(minhash)
+        ],
+        batch_size=1000,
+    )
+
+
+def deduplicate(batch_size=None):
+    """
+    Пересчитывает сигнатуры и оригиналы всего каталога в порядке id.
+    В памяти держится только одна пачка: к моменту ее обработки оригиналы
+    всех более ранних вакансий уже записаны в базу.
+    """
+    batch_size = batch_size or settings.DEDUP_BATCH_SIZE
+    last_id, processed, changed_total = 0, 0, 0
+    while True:
+        rows = list(
+            Vacancy.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'duplicate_of', *TEXT_FIELDS)[:batch_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        items = [(row[0], signature(*row[2:])) for row in rows]
+        with transaction.atomic():
+            store_signatures(items)
+            originals = find_originals(items)
+            changed = defaultdict(list)
+            for vacancy_id, duplicate_of, *text in rows:
+                if originals[vacancy_id] != duplicate_of:
+                    changed[originals[vacancy_id]].append(vacancy_id)
+            for original, ids in changed.items():
+                Vacancy.objects.filter(id__in=ids).update(duplicate_of=original)
+            changed_ids = [vacancy_id for ids in changed.values() for vacancy_id in ids]
+            changed_vacancies = list(Vacancy.objects.filter(id__in=changed_ids).select_related('speciality'))
+            # update() идет мимо save(), поэтому журнал изменений пишется здесь же
+            ChangeLogEntry.objects.bulk_create(
+                [ChangeLogEntry.entry_for(vacancy, ChangeLogEntry.SAVE) for vacancy in changed_vacancies],
+                batch_size=500,
+            )
+        for vacancy in changed_vacancies:
+            objectcache.invalidate(Vacancy, vacancy.id)
+            prerender.invalidate(prerender.vacancy_paths(vacancy))
+        processed += len(rows)
+        changed_total += len(changed_vacancies)
+    return processed, changed_total
@@ -0,0 +1,78 @@
+import datetime
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.feedgenerator import Atom1Feed
+
+from vacancy.models import Company, Speciality
+from vacancy.sections import company_section, section_response, speciality_section
+
+
+class VacanciesFeed(Feed):
+    feed_type = Atom1Feed
+
+    def items(self, obj):
+        return (
+            obj.vacancies.active().select_related('company')
+            .order_by('-published_at', '-id')[:settings.FEED_ITEMS_COUNT]
+            .iterator()
+        )
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return item.skills
+
+    def item_link(self, item):
+        return reverse('vacancy', args=[item.id])
+
+    def item_author_name(self, item):
+        return item.company.name
+
+    def item_pubdate(self, item):
+        return timezone.make_aware(datetime.datetime.combine(item.published_at, datetime.time.min))
+
+
+class SpecialityVacanciesFeed(VacanciesFeed):
+
+    def get_object(self, request, speciality):
+        return get_object_or_404(Speciality, code=speciality)
+
+    def title(self, obj):
+        return 'Вакансии: {}'.format(obj.title)
+
+    def link(self, obj):
+        return reverse('specialization', args=[obj.code])
+
+
+class CompanyVacanciesFeed(VacanciesFeed):
+
+    def get_object(self, request, company_id):
+        return get_object_or_404(Company, id=company_id)
+
+    def title(self, obj):
+        return 'Вакансии компании {}'.format(obj.name)
+
+    def link(self, obj):
+        return reverse('company', args=[obj.id])
+
+
+def speciality_feed(request, speciality):
+
+    def render():
+        # Лента небольшая, поэтому строится сразу: так 404 отдается до начала ответа
+        return [SpecialityVacanciesFeed()(request, speciality=speciality).content.decode()]
+
+    return section_response(request, speciality_section(speciality), Atom1Feed.content_type, render)
+
+
+def company_feed(request, company_id):
+
+    def render():
+        return [CompanyVacanciesFeed()(request, company_id=company_id).content.decode()]
+
+    return section_response(request, company_section(company_id), Atom1Feed.content_type, render)
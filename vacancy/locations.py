@@ -0,0 +1,92 @@
+import csv
+import math
+import os
+import re
+
+from django.db.models import Q
+
+from vacancy.models import Location, LocationAlias
+
+EARTH_RADIUS_KM = 6371.0
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'gazetteer.csv')
+CITY_PREFIX_RE = re.compile(r'^(г\.|город\s)\s*')
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(name):
+    name = CITY_PREFIX_RE.sub('', (name or '').lower().replace('ё', 'е').strip())
+    return ' '.join(WORD_RE.findall(name))
+
+
+def read_gazetteer(path=GAZETTEER_PATH):
+    with open(path, encoding='utf-8') as gazetteer:
+        for row in csv.DictReader(gazetteer):
+            aliases = {normalize(row['name'])}
+            aliases.update(normalize(alias) for alias in row['aliases'].split('|') if alias.strip())
+            yield {
+                'name': row['name'],
+                'country': row['country'],
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+                'aliases': aliases,
+            }
+
+
+def resolve(name):
+    """id города из справочника для свободно введенного названия или None."""
+    alias = normalize(name)
+    if not alias:
+        return None
+    return LocationAlias.objects.filter(alias=alias).values_list('location_id', flat=True).first()
+
+
+def find(name):
+    return Location.objects.filter(aliases__alias=normalize(name)).first()
+
+
+def distance_km(latitude, longitude, other_latitude, other_longitude):
+    """Расстояние по большому кругу (формула гаверсинусов)."""
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    half_dphi = (other_phi - phi) / 2
+    half_dlambda = math.radians(other_longitude - longitude) / 2
+    a = math.sin(half_dphi) ** 2 + math.cos(phi) * math.cos(other_phi) * math.sin(half_dlambda) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def box_ranges(latitude, longitude, radius_km):
+    """
+    Прямоугольник, который заведомо содержит круг радиуса radius_km:
+    (юг, север, [(запад, восток), ...]). Через антимеридиан диапазонов долготы два.
+    """
+    delta_latitude = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = latitude - delta_latitude, latitude + delta_latitude
+    if south <= -90 or north >= 90:
+        # Круг накрывает полюс: подходят все долготы
+        return max(south, -90), min(north, 90), [(-180, 180)]
+    delta_longitude = math.degrees(math.asin(
+        min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude)))
+    ))
+    west, east = longitude - delta_longitude, longitude + delta_longitude
+    if west < -180:
+        return south, north, [(west + 360, 180), (-180, east)]
+    if east > 180:
+        return south, north, [(west, 180), (-180, east - 360)]
+    return south, north, [(west, east)]
+
+
+def bounding_box(latitude, longitude, radius_km):
+    south, north, longitudes = box_ranges(latitude, longitude, radius_km)
+    condition = Q()
+    for west, east in longitudes:
+        condition |= Q(longitude__range=(west, east))
+    return Q(latitude__range=(south, north)) & condition
+
+
+def locations_within(location, radius_km):
+    """id городов не дальше radius_km от location: грубый отбор по индексу координат, затем точное расстояние."""
+    candidates = Location.objects.filter(bounding_box(location.latitude, location.longitude, radius_km))
+    return [
+        location_id
+        for location_id, latitude, longitude in candidates.values_list('id', 'latitude', 'longitude')
+        if distance_km(location.latitude, location.longitude, latitude, longitude) <= radius_km
+    ]
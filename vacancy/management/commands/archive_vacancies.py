@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from vacancy.models import Application, ArchivedApplication, ArchivedVacancy, Vacancy
+
+VACANCY_FIELDS = (
+    'id', 'title', 'skills', 'published_at', 'text', 'salary_min', 'salary_max',
+    'is_closed', 'speciality_id', 'company_id',
+)
+APPLICATION_FIELDS = (
+    'id', 'written_username', 'written_phone', 'written_cover_letter', 'vacancy_id', 'user_id',
+    'idempotency_key', 'created_at',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит устаревшие вакансии и отклики на них в архивные таблицы. '
+        'Запускается по расписанию, например раз в сутки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        archived = 0
+        while True:
+            count = self.archive_batch(batch_size)
+            if not count:
+                break
+            archived += count
+        self.stdout.write(self.style.SUCCESS('В архив перенесено вакансий: {}'.format(archived)))
+
+    @transaction.atomic
+    def archive_batch(self, batch_size):
+        vacancies = list(
+            Vacancy.objects.expired().order_by('id').values(*VACANCY_FIELDS)[:batch_size]
+        )
+        if not vacancies:
+            return 0
+        ids = [vacancy['id'] for vacancy in vacancies]
+
+        ArchivedVacancy.objects.bulk_create(
+            [ArchivedVacancy(**vacancy) for vacancy in vacancies],
+            ignore_conflicts=True,
+        )
+        ArchivedApplication.objects.bulk_create(
+            [
+                ArchivedApplication(**application)
+                for application in Application.objects.filter(vacancy_id__in=ids).values(*APPLICATION_FIELDS)
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        # Отклики удаляются каскадом вместе с вакансиями
+        Vacancy.objects.filter(id__in=ids).delete()
+        return len(ids)
@@ -0,0 +1,24 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from vacancy import rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневную статистику откликов по истории откликов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ROLLUP_BATCH_SIZE)
+        parser.add_argument('--since', help='Пересчитать только начиная с этого дня, ГГГГ-ММ-ДД')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('Дата должна быть в формате ГГГГ-ММ-ДД')
+        count = rollups.backfill(options['batch_size'], since)
+        self.stdout.write(self.style.SUCCESS('Обновлено дневных записей: {}'.format(count)))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from vacancy import backups
+
+
+class Command(BaseCommand):
+    help = 'Снимает копию SQLite базы без остановки приложения и удаляет старые снимки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--dir', help='Каталог снимков, по умолчанию BACKUP_DIR')
+        parser.add_argument('--compress', action='store_true', help='Сжать снимок gzip')
+        parser.add_argument('--keep', type=int, default=settings.BACKUP_KEEP, help='Сколько последних снимков хранить')
+        parser.add_argument('--pages', type=int, help='Страниц за один шаг копирования')
+        parser.add_argument('--sleep', type=float, help='Пауза между шагами, с')
+
+    def handle(self, *args, **options):
+        try:
+            path = backups.backup(
+                options['database'], options['dir'],
+                compress=options['compress'], pages=options['pages'], sleep=options['sleep'],
+            )
+        except backups.BackupError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS('Снимок сохранен: {}'.format(path)))
+        for removed in backups.rotate(options['keep'], options['dir']):
+            self.stdout.write('Удален старый снимок {}'.format(removed))
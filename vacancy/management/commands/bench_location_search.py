@@ -0,0 +1,103 @@
+import random
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand
+
+from vacancy.locations import box_ranges, distance_km, read_gazetteer
+
+SCHEMA = '''
+CREATE TABLE location (id INTEGER PRIMARY KEY, latitude REAL NOT NULL, longitude REAL NOT NULL);
+CREATE TABLE company (id INTEGER PRIMARY KEY, city_id INTEGER);
+CREATE TABLE vacancy (id INTEGER PRIMARY KEY, company_id INTEGER NOT NULL);
+'''
+INDEXES = '''
+CREATE INDEX location_coordinates_idx ON location (latitude, longitude);
+CREATE INDEX company_city_idx ON company (city_id);
+CREATE INDEX vacancy_company_idx ON vacancy (company_id);
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск вакансий в радиусе: полный перебор с расчетом расстояния '
+        'против отбора городов по индексу координат. База создается в памяти'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vacancies', type=int, default=1000000)
+        parser.add_argument('--companies', type=int, default=50000)
+        parser.add_argument('--locations', type=int, default=20000, help='Всего городов вместе со справочником')
+        parser.add_argument('--radius', type=int, default=50)
+        parser.add_argument('--queries', type=int, default=20)
+
+    def handle(self, *args, **options):
+        generator = random.Random(0)
+        db = sqlite3.connect(':memory:')
+        db.create_function('distance_km', 4, distance_km, deterministic=True)
+        db.executescript(SCHEMA)
+
+        start = time.perf_counter()
+        cities = [(city['latitude'], city['longitude']) for city in read_gazetteer()]
+        # Остальные города разбрасываются вокруг городов справочника
+        while len(cities) < options['locations']:
+            latitude, longitude = generator.choice(cities[:150])
+            cities.append((latitude + generator.uniform(-3, 3), longitude + generator.uniform(-5, 5)))
+        db.executemany('INSERT INTO location VALUES (?, ?, ?)', [(i + 1, *city) for i, city in enumerate(cities)])
+        db.executemany(
+            'INSERT INTO company VALUES (?, ?)',
+            ((i + 1, generator.randint(1, len(cities))) for i in range(options['companies'])),
+        )
+        db.executemany(
+            'INSERT INTO vacancy VALUES (?, ?)',
+            ((i + 1, generator.randint(1, options['companies'])) for i in range(options['vacancies'])),
+        )
+        db.executescript(INDEXES)
+        db.execute('ANALYZE')
+        self.stdout.write('Данные: {} вакансий за {:.1f} с'.format(options['vacancies'], time.perf_counter() - start))
+
+        radius = options['radius']
+        centers = [cities[generator.randrange(150)] for _ in range(options['queries'])]
+        results = {}
+        for name, search in (('no prefilter', self.full_scan), ('bounding box', self.bounding_box)):
+            start = time.perf_counter()
+            results[name] = [search(db, latitude, longitude, radius) for latitude, longitude in centers]
+            elapsed = (time.perf_counter() - start) / len(centers)
+            found = sum(len(ids) for ids in results[name]) // len(centers)
+            self.stdout.write('{:>12}: {:8.1f} ms/запрос, в среднем {} вакансий'.format(name, elapsed * 1000, found))
+        if [sorted(ids) for ids in results['no prefilter']] != [sorted(ids) for ids in results['bounding box']]:
+            self.stderr.write('Результаты стратегий не совпадают')
+
+    @staticmethod
+    def full_scan(db, latitude, longitude, radius):
+        return [row[0] for row in db.execute(
+            'SELECT vacancy.id FROM vacancy '
+            'JOIN company ON company.id = vacancy.company_id '
+            'JOIN location ON location.id = company.city_id '
+            'WHERE distance_km(?, ?, location.latitude, location.longitude) <= ?',
+            (latitude, longitude, radius),
+        )]
+
+    @staticmethod
+    def bounding_box(db, latitude, longitude, radius):
+        # Та же схема, что в locations.locations_within: прямоугольник по индексу,
+        # точное расстояние только для попавших в него городов
+        south, north, longitudes = box_ranges(latitude, longitude, radius)
+        city_ids = []
+        for west, east in longitudes:
+            rows = db.execute(
+                'SELECT id, latitude, longitude FROM location '
+                'WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?',
+                (south, north, west, east),
+            )
+            city_ids.extend(
+                city_id for city_id, city_latitude, city_longitude in rows
+                if distance_km(latitude, longitude, city_latitude, city_longitude) <= radius
+            )
+        if not city_ids:
+            return []
+        return [row[0] for row in db.execute(
+            'SELECT vacancy.id FROM company JOIN vacancy ON vacancy.company_id = company.id '
+            'WHERE company.city_id IN ({})'.format(', '.join('?' * len(city_ids))),
+            city_ids,
+        )]
@@ -0,0 +1,63 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Выполняется в отдельном процессе, чтобы замерять холодный старт
+PROBE = '''
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+from cong.wsgi import application
+timings = {"import": time.perf_counter() - start}
+
+if sys.argv[1] == "warm":
+    from vacancy.warmup import warm_up_code, warm_up_worker
+    start = time.perf_counter()
+    warm_up_code()
+    warm_up_worker(application)
+    timings["warm-up"] = time.perf_counter() - start
+
+for name in ("first request", "second request"):
+    environ = {"PATH_INFO": sys.argv[2], "QUERY_STRING": "bench=1", "HTTP_HOST": sys.argv[3]}
+    setup_testing_defaults(environ)
+    start = time.perf_counter()
+    statuses = []
+    for chunk in application(environ, lambda status, headers, exc_info=None: statuses.append(status)):
+        pass
+    timings[name] = time.perf_counter() - start
+    if not statuses[0].startswith("200"):
+        sys.exit("Unexpected status " + statuses[0])
+
+print(json.dumps(timings))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время импорта приложения и первого запроса в новом процессе с прогревом и без'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/vacancies/')
+
+    def handle(self, *args, **options):
+        for mode in ('cold', 'warm'):
+            runs = [self.probe(mode, options['path']) for _ in range(options['runs'])]
+            line = ', '.join(
+                '{} {:.1f} ms'.format(name, statistics.median(run[name] for run in runs) * 1000)
+                for name in runs[0]
+            )
+            self.stdout.write('{}: {}'.format(mode, line))
+
+    def probe(self, mode, path):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, mode, path, settings.PRERENDER_HOST],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode)
+        return json.loads(result.stdout.strip().splitlines()[-1])
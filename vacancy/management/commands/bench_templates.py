@@ -0,0 +1,52 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.template import engines
+from django.test import RequestFactory
+
+from vacancy.models import Company, SearchVacanciesForm, Speciality, Vacancy
+from vacancy.rows import vacancy_rows
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время рендеринга публичных шаблонов движками Django и Jinja2'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        vacancies = vacancy_rows(Vacancy.objects.all())
+        companies = list(Company.objects.annotate(vacancies_count=Count('vacancies')))
+        specialities = list(Speciality.objects.annotate(vacancies_count=Count('vacancies')))
+        if not vacancies or not companies:
+            raise CommandError('В базе нет вакансий')
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        # Строки из базы размножаются до нужного количества, чтобы не зависеть от размера базы
+        pages = (
+            ('vacancy/vacancies.html', {'vacancies': (vacancies * (rows // len(vacancies) + 1))[:rows]}),
+            ('vacancy/index.html', {
+                'compaines': (companies * (rows // len(companies) + 1))[:rows],
+                'specialities': specialities,
+                'form': SearchVacanciesForm(),
+            }),
+        )
+
+        for template_name, context in pages:
+            timings = {}
+            for engine in ('django', 'jinja2'):
+                template = engines[engine].get_template(template_name)
+                template.render(context, request)
+                start = time.perf_counter()
+                for _ in range(options['runs']):
+                    template.render(context, request)
+                timings[engine] = (time.perf_counter() - start) / options['runs']
+            self.stdout.write('{}, {} строк: django {:.1f} ms, jinja2 {:.1f} ms, x{:.1f}'.format(
+                template_name, rows, timings['django'] * 1e3, timings['jinja2'] * 1e3,
+                timings['django'] / timings['jinja2'],
+            ))
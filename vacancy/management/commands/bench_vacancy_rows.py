@@ -0,0 +1,63 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+
+from vacancy.models import Company, Vacancy
+from vacancy.rows import VACANCY_ROW_FIELDS, VacancyRow
+
+MODEL_FIELDS = [field.attname for field in Vacancy._meta.concrete_fields]
+COMPANY_FIELDS = [field.attname for field in Company._meta.concrete_fields]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает память и время на строку списка вакансий: экземпляры моделей против VacancyRow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        source = list(Vacancy.objects.select_related('company').values_list(*self.joined_fields()))
+        if not source:
+            raise CommandError('В базе нет вакансий')
+        # Строки из базы размножаются до нужного количества, чтобы не зависеть от размера базы
+        source = (source * (rows // len(source) + 1))[:rows]
+
+        for name, build in (('model', self.build_models), ('row', self.build_rows)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            vacancies = build(source)
+            built = time.perf_counter() - start
+            objects_size = tracemalloc.get_traced_memory()[0]
+            render_to_string('vacancy/vacancies.html', {'vacancies': vacancies, 'title': 'Benchmark'})
+            total = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.stdout.write(
+                '{:>6}: {:>6} bytes/row held, {:>6} bytes/row peak with render, '
+                'build {:.1f} us/row, build+render {:.1f} us/row'.format(
+                    name, objects_size // rows, peak // rows, built / rows * 1e6, total / rows * 1e6,
+                )
+            )
+
+    @staticmethod
+    def joined_fields():
+        return MODEL_FIELDS + ['company__' + field for field in COMPANY_FIELDS]
+
+    @staticmethod
+    def build_models(source):
+        vacancies = []
+        split = len(MODEL_FIELDS)
+        for values in source:
+            vacancy = Vacancy.from_db('default', MODEL_FIELDS, values[:split])
+            vacancy.company = Company.from_db('default', COMPANY_FIELDS, values[split:])
+            vacancies.append(vacancy)
+        return vacancies
+
+    @staticmethod
+    def build_rows(source):
+        fields = Command.joined_fields()
+        positions = [fields.index(field) for field in VACANCY_ROW_FIELDS]
+        return [VacancyRow(*(values[position] for position in positions)) for values in source]
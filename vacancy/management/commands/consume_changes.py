@@ -0,0 +1,44 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from vacancy.changes import ChangeFeed, prune
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит новые записи журнала изменений для потребителя в формате JSON Lines '
+        'и сдвигает его позицию после каждой выведенной пачки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('consumer', help='Имя потребителя, например search или analytics')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--follow', action='store_true', help='Ждать новые записи')
+        parser.add_argument('--interval', type=float, default=1.0)
+        parser.add_argument('--prune', action='store_true', help='Удалить записи, прочитанные всеми потребителями')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            self.stderr.write('Удалено записей: {}'.format(prune()))
+            return
+
+        feed = ChangeFeed(options['consumer'], options['batch_size'])
+        while True:
+            for entries in feed.batches():
+                for entry in entries:
+                    self.stdout.write(json.dumps({
+                        'id': entry.id,
+                        'model': entry.model,
+                        'object_id': entry.object_id,
+                        'action': entry.action,
+                        'payload': entry.payload,
+                        'created_at': entry.created_at,
+                    }, cls=DjangoJSONEncoder, ensure_ascii=False))
+                self.stdout.flush()
+                feed.ack(entries)
+            if not options['follow']:
+                return
+            time.sleep(options['interval'])
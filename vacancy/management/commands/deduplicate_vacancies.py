@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from vacancy import dedup
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сигнатуры всех вакансий и отмечает дубликаты'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        processed, changed = dedup.deduplicate(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Обработано вакансий: {}, изменено: {}'.format(processed, changed)))
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.urls import reverse
+from django.utils import timezone
+
+from vacancy.matching import SavedSearchIndex
+from vacancy.models import SavedSearchMatcherState, Vacancy
+
+VACANCY_FIELDS = ('id', 'title', 'skills', 'text', 'salary_min', 'salary_max', 'speciality_id')
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет вакансии, появившиеся с прошлого запуска, по всем сохраненным поискам '
+        'и складывает дайджесты для соискателей в SAVED_SEARCH_OUTBOX_DIR'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            state, created = SavedSearchMatcherState.objects.select_for_update().get_or_create(id=1)
+            if created:
+                # Первый запуск ничего не рассылает, а только запоминает текущую позицию
+                state.last_vacancy_id = Vacancy.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+                state.ran_at = timezone.now()
+                state.save()
+                return
+
+            digests = self.collect_digests(state.last_vacancy_id)
+            sent = self.send_digests(digests['vacancies'])
+
+            state.last_vacancy_id = digests['last_vacancy_id']
+            state.ran_at = timezone.now()
+            state.save()
+
+        self.stdout.write(self.style.SUCCESS('Отправлено дайджестов: {}'.format(sent)))
+
+    def collect_digests(self, last_vacancy_id):
+        index = SavedSearchIndex.build()
+        vacancies = defaultdict(dict)
+        rows = (
+            Vacancy.objects.active()
+            .collapsed()
+            .filter(id__gt=last_vacancy_id)
+            .order_by('id')
+            .values(*VACANCY_FIELDS)
+        )
+        for vacancy in rows.iterator(chunk_size=settings.SAVED_SEARCH_CHUNK_SIZE):
+            last_vacancy_id = vacancy['id']
+            for search in index.match(vacancy):
+                vacancies[search['user_id']][vacancy['id']] = vacancy['title']
+        return {'vacancies': vacancies, 'last_vacancy_id': last_vacancy_id}
+
+    def send_digests(self, vacancies):
+        users = User.objects.filter(id__in=vacancies, resume__isnull=False).exclude(email='')
+        messages = []
+        for user in users.only('id', 'email').iterator():
+            lines = [
+                '{} - {}'.format(title, urljoin(settings.SITE_URL, reverse('vacancy', args=[vacancy_id])))
+                for vacancy_id, title in vacancies[user.id].items()
+            ]
+            messages.append(EmailMessage(
+                subject='Новые вакансии по вашим поискам',
+                body='\n'.join(lines),
+                to=[user.email],
+            ))
+
+        connection = get_connection(
+            'django.core.mail.backends.filebased.EmailBackend',
+            file_path=settings.SAVED_SEARCH_OUTBOX_DIR,
+        )
+        return connection.send_messages(messages) or 0
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from vacancy import prerender
+from vacancy.models import PrerenderQueue
+
+
+class Command(BaseCommand):
+    help = (
+        'Перегенерирует статические копии страниц из очереди. '
+        'С --all рендерит все публичные страницы (например, раз в сутки, когда вакансии устаревают)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=settings.PRERENDER_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['all']:
+            PrerenderQueue.objects.all().delete()
+            paths = list(prerender.all_paths())
+            removed = prerender.remove_stale(paths)
+            count = sum(prerender.write_page(path) for path in paths)
+        else:
+            # Вакансии устаревают по дате без сохранения, поэтому их копии
+            # ищутся при каждом запуске
+            removed = prerender.remove_inactive_vacancies()
+            count = prerender.regenerate_queued(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Отрендерено страниц: {}, удалено устаревших: {}'.format(count, removed)))
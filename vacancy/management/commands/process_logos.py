@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from vacancy.uploads import process_queued_logos
+
+
+class Command(BaseCommand):
+    help = 'Пережимает недавно загруженные логотипы компаний до LOGO_SIZE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        count = process_queued_logos(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Обработано логотипов: {}'.format(count)))
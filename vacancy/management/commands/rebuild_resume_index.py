@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from vacancy import resume_search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс по опыту работы и образованию в резюме'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        resume_search.rebuild_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Индекс резюме пересобран'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from vacancy import salaries
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику зарплат по специализациям и городам с нуля'
+
+    def handle(self, *args, **options):
+        count = salaries.rebuild()
+        self.stdout.write(self.style.SUCCESS('Пересчитано статистик: {}'.format(count)))
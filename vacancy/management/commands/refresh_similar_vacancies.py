@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from vacancy import similarity
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие вакансии для измененных вакансий (или для всех с --full)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Пересобрать индекс целиком')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            count = similarity.rebuild()
+        else:
+            count = similarity.refresh()
+        self.stdout.write(self.style.SUCCESS('Обновлено вакансий: {}'.format(count)))
@@ -0,0 +1,39 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from vacancy import backups
+
+
+class Command(BaseCommand):
+    help = 'Восстанавливает SQLite базу из снимка (по умолчанию из последнего)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', nargs='?', help='Файл снимка')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--dir', help='Каталог снимков, по умолчанию BACKUP_DIR')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive')
+
+    def handle(self, *args, **options):
+        path = options['snapshot']
+        if path is None:
+            available = backups.snapshots(options['dir'])
+            if not available:
+                raise CommandError('Снимков не найдено')
+            path = available[-1]
+        if not os.path.exists(path):
+            raise CommandError('Файл {} не найден'.format(path))
+
+        if options['interactive']:
+            answer = input('Текущие данные базы {} будут заменены снимком {}. Продолжить? [y/N] '.format(
+                options['database'], path,
+            ))
+            if answer.lower() != 'y':
+                self.stdout.write('Отменено')
+                return
+        try:
+            backups.restore(options['database'], path)
+        except backups.BackupError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS('База восстановлена из {}'.format(path)))
@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from vacancy.routers import mark_replica_synced
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную SQLite базу в файлы реплик (для локального запуска с репликами)'
+
+    def handle(self, *args, **options):
+        primary = connections.databases[DEFAULT_DB_ALIAS]
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Синхронизация поддерживается только для SQLite')
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write('Реплики не настроены')
+            return
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(connections.databases[alias]['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                mark_replica_synced(alias)
+                self.stdout.write(self.style.SUCCESS('Реплика {} синхронизирована'.format(alias)))
+        finally:
+            source.close()
@@ -0,0 +1,67 @@
+import re
+from collections import defaultdict
+
+from django.conf import settings
+
+from vacancy.models import SavedSearch
+from vacancy.search import matches, normalize_query
+
+WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(*texts):
+    return {word for text in texts if text for word in WORD_RE.findall(text.lower())}
+
+
+def ngrams(text, length):
+    return {text[start:start + length] for start in range(len(text) - length + 1)}
+
+
+class SavedSearchIndex:
+    """
+    Инвертированный индекс сохраненных поисков: начало запроса -> поиски с ним.
+    Запрос совпадает с вакансией по правилу поиска на сайте (search_vacancies):
+    подстрока названия, навыков или описания без учета регистра. Поэтому новая
+    вакансия проверяется только против поисков, начало запроса которых
+    встречается в ее тексте, а не против всех поисков подряд.
+    """
+
+    def __init__(self, searches):
+        # Короче запрос на сайте не выполняется
+        self.key_length = settings.SEARCH_MIN_QUERY_LENGTH
+        self.searches = {}
+        self.postings = defaultdict(list)
+        # Поиски без текста запроса отбираются только по специализации
+        self.without_query = defaultdict(list)
+
+        for search in searches:
+            query = normalize_query(search['query'])
+            if not query:
+                self.searches[search['id']] = search
+                self.without_query[search['speciality_id']].append(search['id'])
+            elif len(query) >= self.key_length:
+                self.searches[search['id']] = dict(search, query=query)
+                self.postings[query[:self.key_length]].append(search['id'])
+
+    @classmethod
+    def build(cls):
+        rows = SavedSearch.objects.values('id', 'user_id', 'query', 'speciality_id', 'salary_min')
+        return cls(rows.iterator())
+
+    def match(self, vacancy):
+        candidates = set()
+        for field in ('title', 'skills', 'text'):
+            for key in ngrams((vacancy[field] or '').lower(), self.key_length):
+                candidates.update(self.postings.get(key, ()))
+        candidates = [search_id for search_id in candidates if matches(self.searches[search_id]['query'], vacancy)]
+        candidates += self.without_query.get(None, [])
+        candidates += self.without_query.get(vacancy['speciality_id'], [])
+
+        salary = vacancy['salary_max'] or vacancy['salary_min']
+        for search_id in candidates:
+            search = self.searches[search_id]
+            if search['speciality_id'] is not None and search['speciality_id'] != vacancy['speciality_id']:
+                continue
+            if search['salary_min'] and (salary is None or salary < search['salary_min']):
+                continue
+            yield search
@@ -0,0 +1,35 @@
+import logging
+import os
+import resource
+import threading
+
+logger = logging.getLogger(__name__)
+
+_peaks = {}
+_peaks_lock = threading.Lock()
+
+
+def current_rss():
+    """Текущий RSS процесса в байтах."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Вне Linux доступен только пиковый RSS (в килобайтах, на macOS - в байтах)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def record_peak(view_name, peak):
+    with _peaks_lock:
+        stats = _peaks.setdefault(view_name, {'requests': 0, 'max': 0, 'total': 0})
+        stats['requests'] += 1
+        stats['max'] = max(stats['max'], peak)
+        stats['total'] += peak
+
+
+def view_memory_stats():
+    with _peaks_lock:
+        return {
+            view_name: dict(stats, mean=stats['total'] // stats['requests'])
+            for view_name, stats in _peaks.items()
+        }
@@ -0,0 +1,19 @@
+from django.core.cache import cache
+
+METRIC_KEY = 'metrics:{}'
+
+
+def incr(name, delta=1):
+    key = METRIC_KEY.format(name)
+    # Обычно счетчик уже есть и хватает одного incr, как в ratelimit.consume
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # add() создает счетчик атомарно: проигравший гонку воркер прибавляет к созданному
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def snapshot(names):
+    values = cache.get_many([METRIC_KEY.format(name) for name in names])
+    return {name: values.get(METRIC_KEY.format(name), 0) for name in names}
@@ -0,0 +1,182 @@
+import os
+import random
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.urls import Resolver404, resolve
+
+from vacancy import metrics, prerender, ratelimit, rollups
+from vacancy.memory import logger as memory_logger, record_peak
+from vacancy.profiling import profile_request
+from vacancy.routers import choose_replica, set_read_alias
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Безопасные запросы читают из реплики. После POST и других изменяющих
+    запросов клиент получает cookie, и пока реплики могут отставать
+    (REPLICA_MAX_LAG секунд), его чтения идут в основную базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS and settings.REPLICA_PIN_COOKIE not in request.COOKIES:
+            set_read_alias(choose_replica())
+        else:
+            set_read_alias(DEFAULT_DB_ALIAS)
+        try:
+            response = self.get_response(request)
+        finally:
+            set_read_alias(DEFAULT_DB_ALIAS)
+
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_MAX_LAG,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Ограничивает частоту запросов к дорогим представлениям. Лимиты задаются
+    в RATE_LIMITS по имени URL и HTTP-методу, ведро заводится на пару
+    (пользователь или IP, маршрут). Остальные запросы не обращаются к кешу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name
+        limit = settings.RATE_LIMITS.get(url_name, {}).get(request.method)
+        if limit is None:
+            return None
+        retry_after = ratelimit.consume(ratelimit.client_id(request), url_name, *limit)
+        if not retry_after:
+            return None
+        metrics.incr('ratelimit.rejected')
+        response = HttpResponse('Слишком много запросов, попробуйте позже', status=429)
+        response['Retry-After'] = retry_after
+        return response
+
+
+def _view_name(request):
+    try:
+        return (resolve(request.path_info).view_name or 'unknown').replace(':', '-')
+    except Resolver404:
+        return 'unknown'
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование запроса по заголовку X-Profile или параметру ?profile
+    для сотрудников. Результаты копятся по представлениям и сбрасываются
+    в PROFILING_DIR каждые PROFILING_REQUESTS_PER_DUMP запросов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED or not self.requested(request):
+            return self.get_response(request)
+        if not (request.user.is_authenticated and request.user.is_staff):
+            return self.get_response(request)
+        return profile_request(_view_name(request), request.get_full_path(), self.get_response, request)
+
+    @staticmethod
+    def requested(request):
+        return 'HTTP_X_PROFILE' in request.META or 'profile' in request.GET
+
+
+class MemoryTrackingMiddleware:
+    """
+    Замеряет пиковое потребление памяти запросом через tracemalloc.
+    Трассировка замедляет запрос, поэтому замеряется только доля
+    запросов MEMORY_TRACKING_SAMPLE_RATE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.MEMORY_TRACKING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        try:
+            response = self.get_response(request)
+        finally:
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            if started:
+                tracemalloc.stop()
+
+        view_name = _view_name(request)
+        record_peak(view_name, peak)
+        if peak > settings.MEMORY_PEAK_WARNING:
+            memory_logger.warning('%s: peak %d KiB for %s', view_name, peak // 1024, request.get_full_path())
+        return response
+
+
+class PrerenderedPageMiddleware:
+    """
+    Анонимным посетителям публичные страницы отдаются из заранее
+    отрендеренных файлов. Файл удаляется, как только данные страницы
+    меняются, поэтому существующий файл всегда актуален.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and not request.GET and not request.user.is_authenticated:
+            filename = prerender.page_file(request.path_info)
+            if filename and os.path.exists(filename) and prerender.is_public(request.path_info):
+                try:
+                    with open(filename) as page:
+                        html = page.read()
+                except FileNotFoundError:
+                    return self.get_response(request)
+                html = html.replace(prerender.IDEMPOTENCY_PLACEHOLDER, uuid.uuid4().hex)
+                return HttpResponse(html.replace(prerender.CSRF_PLACEHOLDER, get_token(request)))
+        return self.get_response(request)
+
+
+class VacancyViewsMiddleware:
+    """
+    Считает просмотры страниц вакансий, в том числе отданных из
+    заранее отрендеренных файлов, поэтому стоит перед PrerenderedPageMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method == 'GET' and response.status_code == 200:
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return response
+            if match.url_name == 'vacancy':
+                rollups.record_view(match.kwargs['vacancy_id'])
+        return response
@@ -0,0 +1,53 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedApplication',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('written_username', models.CharField(max_length=30, verbose_name='Имя')),
+                ('written_phone', models.CharField(max_length=15, verbose_name='Телефон')),
+                ('written_cover_letter', models.TextField(verbose_name='Сопроводительное письмо')),
+                ('vacancy_id', models.IntegerField(db_index=True, verbose_name='Вакансия')),
+                ('user_id', models.IntegerField(db_index=True, null=True, verbose_name='Пользователь')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedVacancy',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=50, verbose_name='Название вакансии')),
+                ('skills', models.CharField(blank=True, max_length=500, verbose_name='Навыки')),
+                ('published_at', models.DateField(verbose_name='Дата размещения')),
+                ('text', models.TextField(blank=True, verbose_name='Описание')),
+                ('salary_min', models.IntegerField(blank=True, null=True, verbose_name='Зарплата от')),
+                ('salary_max', models.IntegerField(blank=True, null=True, verbose_name='Зарплата до')),
+                ('is_closed', models.BooleanField(default=False, verbose_name='Закрыта')),
+                ('speciality_id', models.IntegerField(db_index=True, verbose_name='Специализация')),
+                ('company_id', models.IntegerField(db_index=True, verbose_name='Компания')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Перенесена в архив')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='vacancy',
+            name='is_closed',
+            field=models.BooleanField(default=False, verbose_name='Закрыта'),
+        ),
+        migrations.AddIndex(
+            model_name='vacancy',
+            index=models.Index(condition=models.Q(is_closed=False), fields=['published_at'], name='vacancy_open_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vacancy',
+            index=models.Index(condition=models.Q(is_closed=False), fields=['speciality', 'published_at'], name='vacancy_open_speciality_idx'),
+        ),
+    ]
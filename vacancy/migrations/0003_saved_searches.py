@@ -0,0 +1,35 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('vacancy', '0002_vacancy_lifecycle_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearchMatcherState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_vacancy_id', models.IntegerField(default=0)),
+                ('ran_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(blank=True, max_length=100, verbose_name='Запрос')),
+                ('salary_min', models.PositiveIntegerField(blank=True, null=True, verbose_name='Зарплата не ниже')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('speciality', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to='vacancy.speciality', verbose_name='Специализация')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0004_similar_vacancies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalaryStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('vacancy', 'Вакансии'), ('resume', 'Резюме')], max_length=10, verbose_name='Источник')),
+                ('location', models.CharField(blank=True, max_length=15, verbose_name='Город')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('total', models.BigIntegerField(default=0, verbose_name='Сумма')),
+                ('speciality', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='salary_stats', to='vacancy.speciality')),
+            ],
+            options={
+                'unique_together': {('speciality', 'kind', 'location')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SalaryBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.SmallIntegerField(verbose_name='Корзина')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('stats', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='vacancy.salarystats')),
+            ],
+            options={
+                'unique_together': {('stats', 'bucket')},
+            },
+        ),
+    ]
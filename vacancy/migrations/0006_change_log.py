@@ -0,0 +1,34 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:21
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0005_salary_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeConsumer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Потребитель')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Позиция')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлен')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=30, verbose_name='Модель')),
+                ('object_id', models.IntegerField(verbose_name='Идентификатор записи')),
+                ('action', models.CharField(choices=[('save', 'Сохранение'), ('delete', 'Удаление')], max_length=10, verbose_name='Действие')),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Данные')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время')),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0006_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrerenderQueue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=200, unique=True, verbose_name='Адрес страницы')),
+                ('queued_at', models.DateTimeField(auto_now_add=True, verbose_name='Поставлена в очередь')),
+            ],
+        ),
+    ]
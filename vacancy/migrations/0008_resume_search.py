@@ -0,0 +1,38 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0007_prerender_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumeTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50, verbose_name='Слово')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='resume',
+            index=models.Index(fields=['speciality', 'status', 'grade', 'id', 'salary'], name='resume_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resume',
+            index=models.Index(fields=['status', 'grade', 'id', 'salary'], name='resume_status_grade_idx'),
+        ),
+        migrations.AddField(
+            model_name='resumeterm',
+            name='resume',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='vacancy.resume'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='resumeterm',
+            unique_together={('term', 'resume')},
+        ),
+    ]
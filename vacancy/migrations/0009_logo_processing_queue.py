@@ -0,0 +1,19 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0008_resume_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogoProcessingQueue',
+            fields=[
+                ('company_id', models.IntegerField(primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0009_logo_processing_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VacancySignature',
+            fields=[
+                ('minhash', models.BinaryField(verbose_name='Сигнатура')),
+                ('vacancy', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='vacancy.vacancy')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='vacancy',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='vacancy.vacancy', verbose_name='Дубликат вакансии'),
+        ),
+        migrations.CreateModel(
+            name='VacancyBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField(verbose_name='Полоса')),
+                ('bucket', models.BigIntegerField(verbose_name='Корзина')),
+                ('vacancy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='vacancy.vacancy')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vacancybucket',
+            index=models.Index(fields=['band', 'bucket', 'vacancy'], name='vacancy_bucket_idx'),
+        ),
+    ]
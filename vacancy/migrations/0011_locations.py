@@ -0,0 +1,41 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0010_vacancy_duplicates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Город')),
+                ('country', models.CharField(max_length=2, verbose_name='Страна')),
+                ('latitude', models.FloatField(verbose_name='Широта')),
+                ('longitude', models.FloatField(verbose_name='Долгота')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LocationAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=50, unique=True, verbose_name='Написание')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='vacancy.location')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['latitude', 'longitude'], name='location_coordinates_idx'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='city',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='companies', to='vacancy.location', verbose_name='Город из справочника'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+import csv
+import os
+import re
+
+from django.db import migrations
+
+# Копии нормализации и загрузчика из vacancy.locations на момент миграции:
+# миграция не должна зависеть от текущего кода приложения
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gazetteer.csv')
+CITY_PREFIX_RE = re.compile(r'^(г\.|город\s)\s*')
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(name):
+    name = CITY_PREFIX_RE.sub('', (name or '').lower().replace('ё', 'е').strip())
+    return ' '.join(WORD_RE.findall(name))
+
+
+def read_gazetteer(path=GAZETTEER_PATH):
+    with open(path, encoding='utf-8') as gazetteer:
+        for row in csv.DictReader(gazetteer):
+            aliases = {normalize(row['name'])}
+            aliases.update(normalize(alias) for alias in row['aliases'].split('|') if alias.strip())
+            yield {
+                'name': row['name'],
+                'country': row['country'],
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+                'aliases': aliases,
+            }
+
+
+def load_locations(apps, schema_editor):
+    Location = apps.get_model('vacancy', 'Location')
+    LocationAlias = apps.get_model('vacancy', 'LocationAlias')
+    Company = apps.get_model('vacancy', 'Company')
+
+    for city in read_gazetteer():
+        location, _ = Location.objects.update_or_create(
+            name=city['name'],
+            defaults={'country': city['country'], 'latitude': city['latitude'], 'longitude': city['longitude']},
+        )
+        for alias in city['aliases']:
+            LocationAlias.objects.update_or_create(alias=alias, defaults={'location': location})
+
+    aliases = dict(LocationAlias.objects.values_list('alias', 'location_id'))
+    for company in Company.objects.exclude(location='').only('id', 'location').iterator():
+        city_id = aliases.get(normalize(company.location))
+        if city_id:
+            Company.objects.filter(id=company.id).update(city_id=city_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0011_locations'),
+    ]
+
+    operations = [
+        migrations.RunPython(load_locations, migrations.RunPython.noop),
+    ]
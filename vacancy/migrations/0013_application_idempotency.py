@@ -0,0 +1,46 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:41
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_repeated_applications(apps, schema_editor):
+    # Повторные отклики пользователя на ту же вакансию: остается первый.
+    # Сигналов у исторических моделей нет, удаление пишется в журнал здесь
+    Application = apps.get_model('vacancy', 'Application')
+    ChangeLogEntry = apps.get_model('vacancy', 'ChangeLogEntry')
+    repeated = (
+        Application.objects.filter(user__isnull=False, vacancy__isnull=False)
+        .values('vacancy', 'user')
+        .annotate(first_id=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in repeated.iterator():
+        duplicates = Application.objects.filter(vacancy=group['vacancy'], user=group['user']).exclude(
+            id=group['first_id'],
+        )
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(model='application', object_id=application_id, action='delete')
+            for application_id in duplicates.values_list('id', flat=True)
+        ])
+        duplicates.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0012_load_gazetteer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='idempotency_key',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='Ключ отправки'),
+        ),
+        migrations.RunPython(remove_repeated_applications, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='application',
+            constraint=models.UniqueConstraint(condition=models.Q(user__isnull=False), fields=('vacancy', 'user'), name='application_vacancy_user_uniq'),
+        ),
+    ]
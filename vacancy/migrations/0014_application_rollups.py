@@ -0,0 +1,67 @@
+# Generated by Django 3.1.2 on 2026-10-19 14:46
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def restore_application_dates(apps, schema_editor):
+    # Время отправки берется из журнала изменений, а если записи в нем нет -
+    # из даты размещения вакансии
+    Application = apps.get_model('vacancy', 'Application')
+    ChangeLogEntry = apps.get_model('vacancy', 'ChangeLogEntry')
+    first_entry = ChangeLogEntry.objects.filter(
+        model='application', object_id=OuterRef('id'),
+    ).order_by('id').values('created_at')[:1]
+    Application.objects.filter(created_at__isnull=True).update(created_at=Subquery(first_entry))
+
+    by_date = {}
+    missing = Application.objects.filter(created_at__isnull=True, vacancy__isnull=False)
+    for application_id, published_at in missing.values_list('id', 'vacancy__published_at').iterator():
+        by_date.setdefault(published_at, []).append(application_id)
+    for published_at, ids in by_date.items():
+        created_at = timezone.make_aware(datetime.datetime.combine(published_at, datetime.time()))
+        Application.objects.filter(id__in=ids).update(created_at=created_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0013_application_idempotency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VacancyDailyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vacancy_id', models.IntegerField(verbose_name='Вакансия')),
+                ('company_id', models.IntegerField(verbose_name='Компания')),
+                ('day', models.DateField(verbose_name='День')),
+                ('applications', models.IntegerField(default=0, verbose_name='Отклики')),
+                ('views', models.IntegerField(default=0, verbose_name='Просмотры')),
+            ],
+        ),
+        # С auto_now_add существующие отклики получили бы время миграции
+        migrations.AddField(
+            model_name='application',
+            name='created_at',
+            field=models.DateTimeField(null=True, verbose_name='Отправлен'),
+        ),
+        migrations.RunPython(restore_application_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='application',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True, verbose_name='Отправлен'),
+        ),
+        migrations.AddIndex(
+            model_name='vacancydailystats',
+            index=models.Index(fields=['company_id', 'day'], name='daily_stats_company_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vacancydailystats',
+            unique_together={('vacancy_id', 'day')},
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.1.2 on 2026-10-19 15:06
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+
+def restore_archived_application_dates(apps, schema_editor):
+    # Как в 0014: время отправки из журнала изменений, иначе дата размещения
+    # вакансии. Ключи отправки уже перенесенных откликов не восстановить
+    ArchivedApplication = apps.get_model('vacancy', 'ArchivedApplication')
+    ArchivedVacancy = apps.get_model('vacancy', 'ArchivedVacancy')
+    ChangeLogEntry = apps.get_model('vacancy', 'ChangeLogEntry')
+    first_entry = ChangeLogEntry.objects.filter(
+        model='application', object_id=OuterRef('id'),
+    ).order_by('id').values('created_at')[:1]
+    ArchivedApplication.objects.filter(created_at__isnull=True).update(created_at=Subquery(first_entry))
+
+    published = ArchivedVacancy.objects.filter(id=OuterRef('vacancy_id')).values('published_at')[:1]
+    missing = ArchivedApplication.objects.filter(created_at__isnull=True).annotate(published_at=Subquery(published))
+    by_date = {}
+    for application_id, published_at in missing.values_list('id', 'published_at').iterator():
+        if published_at is not None:
+            by_date.setdefault(published_at, []).append(application_id)
+    for published_at, ids in by_date.items():
+        created_at = timezone.make_aware(datetime.datetime.combine(published_at, datetime.time()))
+        ArchivedApplication.objects.filter(id__in=ids).update(created_at=created_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vacancy', '0014_application_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedapplication',
+            name='created_at',
+            field=models.DateTimeField(null=True, verbose_name='Отправлен'),
+        ),
+        migrations.AddField(
+            model_name='archivedapplication',
+            name='idempotency_key',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='Ключ отправки'),
+        ),
+        migrations.RunPython(restore_archived_application_dates, migrations.RunPython.noop),
+    ]
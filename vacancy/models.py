@@ -1,9 +1,71 @@
+import datetime
+import math
+import uuid
+
 from django import forms
 from django.conf import settings
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
+from django.db.models import Q
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 
+from vacancy import objectcache
+
+
+class ChangeLogEntry(models.Model):
+    """Журнал изменений для внешних потребителей: пишется в той же транзакции, что и сама запись."""
+
+    SAVE = 'save'
+    DELETE = 'delete'
+    ACTIONS = [
+        (SAVE, 'Сохранение'),
+        (DELETE, 'Удаление'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField('Модель', max_length=30)
+    object_id = models.IntegerField('Идентификатор записи')
+    action = models.CharField('Действие', max_length=10, choices=ACTIONS)
+    payload = models.JSONField('Данные', encoder=DjangoJSONEncoder, null=True)
+    created_at = models.DateTimeField('Время', auto_now_add=True)
+
+    @classmethod
+    def entry_for(cls, instance, action):
+        payload = None
+        if action == cls.SAVE:
+            payload = {field.attname: field.value_from_object(instance) for field in instance._meta.concrete_fields}
+            for field in instance._meta.concrete_fields:
+                if isinstance(field, models.FileField):
+                    payload[field.attname] = payload[field.attname].name or ''
+        return cls(model=instance._meta.model_name, object_id=instance.pk, action=action, payload=payload)
+
+    @classmethod
+    def record(cls, instance, action, using=None):
+        cls.entry_for(instance, action).save(using=using)
+
+
+class ChangeConsumer(models.Model):
+
+    name = models.CharField('Потребитель', max_length=50, unique=True)
+    # id последней обработанной записи журнала
+    position = models.BigIntegerField('Позиция', default=0)
+    updated_at = models.DateTimeField('Обновлен', auto_now=True)
+
+
+class ChangeLoggedModel(models.Model):
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(self.__class__, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            ChangeLogEntry.record(self, ChangeLogEntry.SAVE, using=using)
+
 
 class Speciality(models.Model):
 
@@ -11,8 +73,50 @@ class Speciality(models.Model):
     code = models.CharField('Код', max_length=15, blank=True)
     picture = models.ImageField('Лого', upload_to=settings.MEDIA_SPECIALITY_IMAGE_DIR, blank=True)
 
+    def __str__(self):
+        return self.title
+
+
+class Location(models.Model):
+
+    # Города из встроенного справочника vacancy/gazetteer.csv
+    name = models.CharField('Город', max_length=50, unique=True)
+    country = models.CharField('Страна', max_length=2)
+    latitude = models.FloatField('Широта')
+    longitude = models.FloatField('Долгота')
+
+    class Meta:
+        indexes = [models.Index(fields=['latitude', 'longitude'], name='location_coordinates_idx')]
+
+    def __str__(self):
+        return self.name
+
+
+class LocationAlias(models.Model):
 
-class Company(models.Model):
+    # Нормализованные написания города, по которым сопоставляется свободный ввод
+    alias = models.CharField('Написание', max_length=50, unique=True)
+
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name='aliases',
+    )
+
+
+class CachedQuerySet(models.QuerySet):
+    # Связанные записи, которые хранятся в кеше вместе с объектом
+    cache_related = ()
+
+    def cached(self, pk):
+        """Запись по первичному ключу через кеш объектов, None если ее нет. Фильтры queryset не учитываются."""
+        return objectcache.get(self.model, pk, self.cache_related)
+
+    def refresh_cached(self, pk):
+        objectcache.refresh(self.model, pk, self.cache_related)
+
+
+class Company(ChangeLoggedModel):
 
     name = models.CharField('Название', max_length=50, unique=True)
     location = models.CharField('Город', max_length=15, blank=True)
@@ -20,6 +124,14 @@ class Company(models.Model):
     logo = models.ImageField('Логотип', upload_to=settings.MEDIA_COMPANY_IMAGE_DIR, blank=True)
     employee_count = models.PositiveIntegerField('Количество сотрудников', default=1)
 
+    city = models.ForeignKey(
+        Location,
+        verbose_name='Город из справочника',
+        on_delete=models.SET_NULL,
+        related_name='companies',
+        null=True,
+        blank=True,
+    )
     owner = models.OneToOneField(
         User,
         verbose_name='Владелец',
@@ -29,8 +141,32 @@ class Company(models.Model):
         blank=True,
     )
 
+    objects = CachedQuerySet.as_manager()
+
+
+def vacancy_expiry_date():
+    return timezone.localdate() - datetime.timedelta(days=settings.VACANCY_LIFETIME_DAYS)
+
+
+class VacancyQuerySet(CachedQuerySet):
+    cache_related = ('company', 'speciality')
+
+    def active(self):
+        return self.filter(is_closed=False, published_at__gte=vacancy_expiry_date())
 
-class Vacancy(models.Model):
+    def expired(self):
+        return self.filter(published_at__lt=vacancy_expiry_date())
+
+    def collapsed(self):
+        # Дубликат скрывается, пока его оригинал открыт
+        return self.exclude(duplicate_of__is_closed=False, duplicate_of__published_at__gte=vacancy_expiry_date())
+
+
+class Vacancy(ChangeLoggedModel):
+
+    ACTIVE = 'active'
+    CLOSED = 'closed'
+    EXPIRED = 'expired'
 
     title = models.CharField('Название вакансии', max_length=50)
     skills = models.CharField('Навыки', max_length=500, blank=True)
@@ -38,6 +174,7 @@ class Vacancy(models.Model):
     text = models.TextField('Описание', blank=True)
     salary_min = models.IntegerField('Зарплата от', null=True, blank=True)
     salary_max = models.IntegerField('Зарплата до', null=True, blank=True)
+    is_closed = models.BooleanField('Закрыта', default=False)
 
     speciality = models.ForeignKey(
         Speciality,
@@ -49,13 +186,54 @@ class Vacancy(models.Model):
         on_delete=models.CASCADE,
         related_name='vacancies'
     )
+    duplicate_of = models.ForeignKey(
+        'self',
+        verbose_name='Дубликат вакансии',
+        on_delete=models.SET_NULL,
+        related_name='duplicates',
+        null=True,
+        blank=True,
+    )
 
+    objects = VacancyQuerySet.as_manager()
 
-class Application(models.Model):
+    class Meta:
+        # Публичные страницы читают только открытые вакансии, индекс покрывает
+        # только их и не растет вместе с закрытыми
+        indexes = [
+            models.Index(
+                fields=['published_at'],
+                condition=Q(is_closed=False),
+                name='vacancy_open_published_idx',
+            ),
+            models.Index(
+                fields=['speciality', 'published_at'],
+                condition=Q(is_closed=False),
+                name='vacancy_open_speciality_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def status(self):
+        if self.is_closed:
+            return self.CLOSED
+        if self.published_at and self.published_at < vacancy_expiry_date():
+            return self.EXPIRED
+        return self.ACTIVE
+
+
+class Application(ChangeLoggedModel):
 
     written_username = models.CharField('Имя', max_length=30)
     written_phone = models.CharField('Телефон', max_length=15)
     written_cover_letter = models.TextField('Сопроводительное письмо')
+    # Ключ из формы отклика: повторная отправка той же формы не создает новую запись
+    idempotency_key = models.UUIDField('Ключ отправки', unique=True, null=True, blank=True, editable=False)
+    # Пусто только у откликов, для которых время отправки не удалось восстановить
+    created_at = models.DateTimeField('Отправлен', auto_now_add=True, null=True)
 
     vacancy = models.ForeignKey(
         Vacancy,
@@ -73,6 +251,15 @@ class Application(models.Model):
 
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vacancy', 'user'],
+                condition=Q(user__isnull=False),
+                name='application_vacancy_user_uniq',
+            ),
+        ]
+
 
 class Resume(models.Model):
 
@@ -120,6 +307,239 @@ class Resume(models.Model):
         null=True,
     )
 
+    class Meta:
+        # Поиск резюме работодателями: равенства по специализации, статусу
+        # и квалификации, затем id для keyset-пагинации и зарплата, чтобы
+        # фильтр по ней проверялся по самому индексу
+        indexes = [
+            models.Index(fields=['speciality', 'status', 'grade', 'id', 'salary'], name='resume_search_idx'),
+            models.Index(fields=['status', 'grade', 'id', 'salary'], name='resume_status_grade_idx'),
+        ]
+
+
+class ResumeTerm(models.Model):
+
+    # Слова из опыта работы и образования для полнотекстового поиска по резюме
+    term = models.CharField('Слово', max_length=50)
+
+    resume = models.ForeignKey(
+        Resume,
+        on_delete=models.CASCADE,
+        related_name='terms',
+    )
+
+    class Meta:
+        unique_together = [('term', 'resume')]
+
+
+class SimilarVacancy(models.Model):
+
+    score = models.FloatField('Сходство')
+
+    vacancy = models.ForeignKey(
+        Vacancy,
+        on_delete=models.CASCADE,
+        related_name='similar_vacancies',
+    )
+    similar = models.ForeignKey(
+        Vacancy,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+    )
+
+    class Meta:
+        unique_together = [('vacancy', 'similar')]
+
+
+class VacancySignature(models.Model):
+
+    # MinHash-сигнатура текста вакансии (uint32 на каждую перестановку)
+    minhash = models.BinaryField('Сигнатура')
+
+    vacancy = models.OneToOneField(
+        Vacancy,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='signature',
+    )
+
+
+class VacancyBucket(models.Model):
+
+    # Корзины LSH: вакансии с совпадающей полосой сигнатуры - кандидаты в дубликаты
+    band = models.PositiveSmallIntegerField('Полоса')
+    bucket = models.BigIntegerField('Корзина')
+
+    vacancy = models.ForeignKey(
+        Vacancy,
+        on_delete=models.CASCADE,
+        related_name='lsh_buckets',
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=['band', 'bucket', 'vacancy'], name='vacancy_bucket_idx')]
+
+
+class SimilarityRefresh(models.Model):
+
+    # Очередь вакансий, для которых нужно пересчитать похожие
+    vacancy_id = models.IntegerField(primary_key=True)
+
+
+class SalaryStats(models.Model):
+
+    # Гистограмма с логарифмическими корзинами: значения внутри корзины
+    # отличаются не больше чем на SALARY_BUCKET_RATIO, корзины складываются
+    SALARY_BUCKET_RATIO = 1.05
+
+    VACANCY = 'vacancy'
+    RESUME = 'resume'
+    KINDS = [
+        (VACANCY, 'Вакансии'),
+        (RESUME, 'Резюме'),
+    ]
+
+    kind = models.CharField('Источник', max_length=10, choices=KINDS)
+    # Пустая строка - все города
+    location = models.CharField('Город', max_length=15, blank=True)
+    count = models.IntegerField('Количество', default=0)
+    total = models.BigIntegerField('Сумма', default=0)
+
+    speciality = models.ForeignKey(
+        Speciality,
+        on_delete=models.CASCADE,
+        related_name='salary_stats',
+    )
+
+    class Meta:
+        unique_together = [('speciality', 'kind', 'location')]
+
+    @classmethod
+    def bucket_of(cls, salary):
+        return int(math.log(max(salary, 1)) / math.log(cls.SALARY_BUCKET_RATIO))
+
+    @classmethod
+    def bucket_value(cls, bucket):
+        return int(cls.SALARY_BUCKET_RATIO ** (bucket + 0.5))
+
+    def summary(self):
+        buckets = sorted((bucket.bucket, bucket.count) for bucket in self.buckets.all() if bucket.count > 0)
+        summary = {
+            'count': self.count,
+            'mean': round(self.total / self.count) if self.count else None,
+        }
+        for name, fraction in (('p25', 0.25), ('p50', 0.5), ('p75', 0.75), ('p90', 0.9)):
+            summary[name] = None
+            seen = 0
+            for bucket, count in buckets:
+                seen += count
+                if seen >= fraction * self.count:
+                    summary[name] = self.bucket_value(bucket)
+                    break
+        return summary
+
+
+class SalaryBucket(models.Model):
+
+    bucket = models.SmallIntegerField('Корзина')
+    count = models.IntegerField('Количество', default=0)
+
+    stats = models.ForeignKey(
+        SalaryStats,
+        on_delete=models.CASCADE,
+        related_name='buckets',
+    )
+
+    class Meta:
+        unique_together = [('stats', 'bucket')]
+
+
+class VacancyDailyStats(models.Model):
+
+    # Отклики и просмотры вакансии за день. Ссылки хранятся числами, как в архиве,
+    # чтобы история оставалась после переноса вакансии в архив
+    vacancy_id = models.IntegerField('Вакансия')
+    company_id = models.IntegerField('Компания')
+    day = models.DateField('День')
+    applications = models.IntegerField('Отклики', default=0)
+    views = models.IntegerField('Просмотры', default=0)
+
+    class Meta:
+        unique_together = [('vacancy_id', 'day')]
+        indexes = [models.Index(fields=['company_id', 'day'], name='daily_stats_company_day_idx')]
+
+
+class PrerenderQueue(models.Model):
+
+    # Страницы, статические копии которых устарели и ждут перегенерации
+    path = models.CharField('Адрес страницы', max_length=200, unique=True)
+    queued_at = models.DateTimeField('Поставлена в очередь', auto_now_add=True)
+
+
+class LogoProcessingQueue(models.Model):
+
+    # Компании, логотип которых нужно пережать вне запроса
+    company_id = models.IntegerField(primary_key=True)
+
+
+class SavedSearch(models.Model):
+
+    query = models.CharField('Запрос', max_length=100, blank=True)
+    salary_min = models.PositiveIntegerField('Зарплата не ниже', null=True, blank=True)
+    created_at = models.DateTimeField('Создан', auto_now_add=True)
+
+    speciality = models.ForeignKey(
+        Speciality,
+        verbose_name='Специализация',
+        on_delete=models.CASCADE,
+        related_name='saved_searches',
+        null=True,
+        blank=True,
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='saved_searches',
+    )
+
+
+class SavedSearchMatcherState(models.Model):
+
+    # Последняя вакансия, уже проверенная на совпадение с сохраненными поисками
+    last_vacancy_id = models.IntegerField(default=0)
+    ran_at = models.DateTimeField(null=True)
+
+# Архив устаревших вакансий и откликов на них
+
+
+class ArchivedVacancy(models.Model):
+
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField('Название вакансии', max_length=50)
+    skills = models.CharField('Навыки', max_length=500, blank=True)
+    published_at = models.DateField('Дата размещения')
+    text = models.TextField('Описание', blank=True)
+    salary_min = models.IntegerField('Зарплата от', null=True, blank=True)
+    salary_max = models.IntegerField('Зарплата до', null=True, blank=True)
+    is_closed = models.BooleanField('Закрыта', default=False)
+    speciality_id = models.IntegerField('Специализация', db_index=True)
+    company_id = models.IntegerField('Компания', db_index=True)
+    archived_at = models.DateTimeField('Перенесена в архив', auto_now_add=True)
+
+
+class ArchivedApplication(models.Model):
+
+    id = models.IntegerField(primary_key=True)
+    written_username = models.CharField('Имя', max_length=30)
+    written_phone = models.CharField('Телефон', max_length=15)
+    written_cover_letter = models.TextField('Сопроводительное письмо')
+    vacancy_id = models.IntegerField('Вакансия', db_index=True)
+    user_id = models.IntegerField('Пользователь', null=True, db_index=True)
+    idempotency_key = models.UUIDField('Ключ отправки', unique=True, null=True, blank=True, editable=False)
+    # Время исходного отклика, а не переноса в архив
+    created_at = models.DateTimeField('Отправлен', null=True)
+
 # Модели для форм
 
 
@@ -151,6 +571,7 @@ GRADES = [
 
 class ApplicationForm(forms.ModelForm):
 
+    idempotency_key = forms.UUIDField(initial=uuid.uuid4, required=False, widget=forms.HiddenInput)
     written_phone = forms.CharField(
         label='Ваш телефон',
         min_length=10,
@@ -181,6 +602,24 @@ class RegisterForm(UserCreationForm):
         fields = ['username', 'first_name', 'last_name', 'email', 'password1', 'password2']
 
 
+class LogoField(forms.FileField):
+    """
+    Логотип проверяется в to_python по размеру файла и заголовку картинки:
+    forms.ImageField сначала целиком декодирует ее Pillow.
+    """
+
+    def to_python(self, data):
+        from vacancy.uploads import inspect_image
+
+        data = super().to_python(data)
+        if data is None:
+            return None
+        if data.size > settings.LOGO_MAX_UPLOAD_SIZE:
+            raise forms.ValidationError('Файл больше {}'.format(filesizeformat(settings.LOGO_MAX_UPLOAD_SIZE)))
+        inspect_image(data)
+        return data
+
+
 class CompanyForm(forms.ModelForm):
     name = forms.CharField(
         label='Название компании',
@@ -188,7 +627,7 @@ class CompanyForm(forms.ModelForm):
         required=True,
         widget=forms.TextInput(attrs=({'class': 'form-control'}))
     )
-    logo = forms.FileField(
+    logo = LogoField(
         label='Загрузить',
         required=False,
         widget=forms.FileInput(attrs={'class': 'custom-file-input'}),
@@ -321,6 +760,76 @@ class ResumeForm(forms.ModelForm):
         fields = ['name', 'surname', 'status', 'salary', 'grade', 'education', 'experience', 'portfolio']
 
 
+class SavedSearchForm(forms.ModelForm):
+
+    query = forms.CharField(
+        label='Запрос',
+        max_length=100,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+    )
+    speciality = forms.ChoiceField(
+        label='Специализация',
+        choices=[('', 'Любая')] + SPECIALITIES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'custom-select mr-sm-2'}),
+    )
+    salary_min = forms.IntegerField(
+        label='Зарплата не ниже',
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+
+    class Meta:
+        model = SavedSearch
+        fields = ['query', 'salary_min']
+
+    def clean_query(self):
+        from vacancy.search import normalize_query
+
+        query = normalize_query(self.cleaned_data['query'])
+        if query and len(query) < settings.SEARCH_MIN_QUERY_LENGTH:
+            raise forms.ValidationError(
+                'Запрос должен быть не короче {} символов'.format(settings.SEARCH_MIN_QUERY_LENGTH)
+            )
+        return query
+
+
+class ResumeSearchForm(forms.Form):
+
+    query = forms.CharField(
+        label='Опыт и образование',
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Например, Django PostgreSQL'}),
+    )
+    speciality = forms.ChoiceField(
+        label='Специализация',
+        choices=[('', 'Любая')] + SPECIALITIES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'custom-select mr-sm-2'}),
+    )
+    status = forms.ChoiceField(
+        label='Готовность к работе',
+        choices=[('', 'Любая')] + Resume.STATUS,
+        required=False,
+        widget=forms.Select(attrs={'class': 'custom-select mr-sm-2'}),
+    )
+    grade = forms.ChoiceField(
+        label='Квалификация',
+        choices=[('', 'Любая')] + Resume.GRADES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'custom-select mr-sm-2'}),
+    )
+    salary_max = forms.IntegerField(
+        label='Зарплата не выше',
+        required=False,
+        min_value=0,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    after = forms.IntegerField(required=False, widget=forms.HiddenInput())
+
+
 class SearchVacanciesForm(forms.Form):
 
     search = forms.CharField(
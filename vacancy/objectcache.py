@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from vacancy import metrics
+
+# Запись лежит под ключом с номером поколения модели и версией объекта:
+# при изменении номер увеличивается, и старая запись больше не читается,
+# даже если ее успел положить запрос, прочитавший базу до изменения
+GENERATION_KEY = 'objects:{}:generation'
+VERSION_KEY = 'objects:{}:{}:version'
+ENTRY_KEY = 'objects:{}:g{}:{}:v{}'
+
+
+def _bump(key):
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def _entry_key(model, pk):
+    label = model._meta.model_name
+    generation_key, version_key = GENERATION_KEY.format(label), VERSION_KEY.format(label, pk)
+    versions = cache.get_many([generation_key, version_key])
+    return ENTRY_KEY.format(label, versions.get(generation_key, 0), pk, versions.get(version_key, 0))
+
+
+def _load(model, pk, related):
+    return model._base_manager.select_related(*related).filter(pk=pk).first()
+
+
+def get(model, pk, related=()):
+    """Объект с загруженными related-записями из кеша, при промахе - из базы. None, если объекта нет."""
+    key = _entry_key(model, pk)
+    instance = cache.get(key)
+    if instance is not None:
+        metrics.incr('objects.{}.hits'.format(model._meta.model_name))
+        return instance
+    metrics.incr('objects.{}.misses'.format(model._meta.model_name))
+    instance = _load(model, pk, related)
+    if instance is not None:
+        cache.add(key, instance, settings.OBJECT_CACHE_TIMEOUT)
+    return instance
+
+
+def invalidate(model, pk):
+    _bump(VERSION_KEY.format(model._meta.model_name, pk))
+
+
+def refresh(model, pk, related=()):
+    """Сквозная запись: новая версия объекта сразу кладется в кеш."""
+    invalidate(model, pk)
+    instance = _load(model, pk, related)
+    if instance is not None:
+        cache.set(_entry_key(model, pk), instance, settings.OBJECT_CACHE_TIMEOUT)
+
+
+def bump_generation(model):
+    _bump(GENERATION_KEY.format(model._meta.model_name))
+
+
+def metric_names(*models):
+    return tuple(
+        'objects.{}.{}'.format(model._meta.model_name, name) for model in models for name in ('hits', 'misses')
+    )
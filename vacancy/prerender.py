@@ -0,0 +1,158 @@
+import os
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpRequest
+from django.urls import Resolver404, resolve, reverse
+
+from vacancy.models import Company, PrerenderQueue, Speciality, Vacancy
+
+PUBLIC_URL_NAMES = {'index', 'vacancies', 'specialization', 'vacancy', 'company'}
+
+# CSRF-токен у каждого посетителя свой: в файл пишется метка,
+# которая подменяется токеном при отдаче страницы
+CSRF_PLACEHOLDER = '__CSRF_TOKEN__'
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+# Ключ формы отклика тоже должен быть у каждого посетителя свой
+IDEMPOTENCY_PLACEHOLDER = '__IDEMPOTENCY_KEY__'
+IDEMPOTENCY_INPUT_RE = re.compile(r'(name="idempotency_key" value=")[^"]*(")')
+
+
+def is_public(path):
+    try:
+        return resolve(path).url_name in PUBLIC_URL_NAMES
+    except Resolver404:
+        return False
+
+
+def page_file(path):
+    relative = path.strip('/')
+    if not relative:
+        relative = 'index'
+    filename = os.path.normpath(os.path.join(settings.PRERENDER_DIR, relative + '.html'))
+    if not filename.startswith(os.path.normpath(settings.PRERENDER_DIR) + os.sep):
+        return None
+    return filename
+
+
+def all_paths():
+    yield reverse('index')
+    yield reverse('vacancies')
+    for code in Speciality.objects.values_list('code', flat=True).iterator():
+        yield reverse('specialization', args=[code])
+    for vacancy_id in Vacancy.objects.active().values_list('id', flat=True).iterator():
+        yield reverse('vacancy', args=[vacancy_id])
+    for company_id in Company.objects.values_list('id', flat=True).iterator():
+        yield reverse('company', args=[company_id])
+
+
+def vacancy_paths(vacancy):
+    return [
+        reverse('index'),
+        reverse('vacancies'),
+        reverse('specialization', args=[vacancy.speciality.code]),
+        reverse('vacancy', args=[vacancy.id]),
+        reverse('company', args=[vacancy.company_id]),
+    ]
+
+
+def company_paths(company):
+    paths = [reverse('index'), reverse('vacancies'), reverse('company', args=[company.id])]
+    for vacancy_id, code in company.vacancies.values_list('id', 'speciality__code').iterator():
+        paths.append(reverse('vacancy', args=[vacancy_id]))
+        paths.append(reverse('specialization', args=[code]))
+    return paths
+
+
+def speciality_paths(speciality):
+    return [reverse('index'), reverse('specialization', args=[speciality.code])]
+
+
+def invalidate(paths):
+    """Убирает устаревшие копии (дальше страница рендерится как обычно) и ставит их в очередь."""
+    paths = set(paths)
+    for path in paths:
+        filename = page_file(path)
+        if filename and os.path.exists(filename):
+            os.remove(filename)
+    PrerenderQueue.objects.bulk_create([PrerenderQueue(path=path) for path in paths], ignore_conflicts=True)
+
+
+def remove_stale(paths):
+    """Удаляет копии страниц, которых нет среди paths: закрытых и устаревших вакансий, удаленных компаний."""
+    expected = {page_file(path) for path in paths}
+    removed = 0
+    for directory, _, names in os.walk(settings.PRERENDER_DIR):
+        for name in names:
+            filename = os.path.join(directory, name)
+            if name.endswith('.html') and filename not in expected:
+                os.remove(filename)
+                removed += 1
+    return removed
+
+
+def remove_inactive_vacancies():
+    """
+    Удаляет копии страниц вакансий, которые закрыты в обход сигналов, устарели
+    или удалены, и ставит в очередь страницы, где они были в списках.
+    """
+    directory = os.path.dirname(page_file(reverse('vacancy', args=[1])))
+    if not os.path.isdir(directory):
+        return 0
+    ids = {int(name[:-len('.html')]) for name in os.listdir(directory) if re.fullmatch(r'\d+\.html', name)}
+    inactive = ids - set(Vacancy.objects.active().filter(id__in=ids).values_list('id', flat=True))
+    paths = [reverse('vacancy', args=[vacancy_id]) for vacancy_id in inactive]
+    for vacancy in Vacancy.objects.filter(id__in=inactive).select_related('speciality').iterator():
+        paths.extend(vacancy_paths(vacancy))
+    if paths:
+        invalidate(paths)
+    return len(inactive)
+
+
+def render_page(path):
+    match = resolve(path)
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {'SERVER_NAME': settings.PRERENDER_HOST, 'SERVER_PORT': '443', 'wsgi.url_scheme': 'https'}
+    request.user = AnonymousUser()
+    response = match.func(request, *match.args, **match.kwargs)
+    if response.status_code != 200:
+        return None
+    html = CSRF_INPUT_RE.sub(r'\g<1>{}\g<2>'.format(CSRF_PLACEHOLDER), response.content.decode())
+    return IDEMPOTENCY_INPUT_RE.sub(r'\g<1>{}\g<2>'.format(IDEMPOTENCY_PLACEHOLDER), html)
+
+
+def write_page(path):
+    filename = page_file(path)
+    if filename is None:
+        return False
+    try:
+        html = render_page(path)
+    except Http404:
+        html = None
+    if html is None:
+        if os.path.exists(filename):
+            os.remove(filename)
+        return False
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp_filename = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(tmp_filename, 'w') as output:
+        output.write(html)
+    os.replace(tmp_filename, filename)
+    return True
+
+
+def regenerate_queued(batch_size):
+    count = 0
+    while True:
+        queued = list(PrerenderQueue.objects.order_by('id').values_list('id', 'path')[:batch_size])
+        if not queued:
+            return count
+        for queue_id, path in queued:
+            # Запись удаляется до рендера: если страница снова изменится во время
+            # рендера, сигнал поставит ее в очередь заново
+            PrerenderQueue.objects.filter(id=queue_id).delete()
+            count += write_page(path)
@@ -0,0 +1,124 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+class StackSampler:
+    """
+    Сэмплирующий профайлер: отдельный поток с заданным интервалом снимает стек
+    потока запроса. Результат - стеки в формате collapsed для flamegraph.pl/speedscope.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class QueryRecorder:
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params),
+                'many': many,
+                'time': round(time.perf_counter() - start, 6),
+            })
+
+
+class ViewProfile:
+    """Профили одного представления, накопленные за несколько запросов."""
+
+    def __init__(self, view_name):
+        self.view_name = view_name
+        self.requests = 0
+        self.stats = None
+        self.stacks = Counter()
+        self.queries = []
+
+    def add(self, profiler, sampler, recorder, path):
+        self.requests += 1
+        if self.stats is None:
+            self.stats = pstats.Stats(profiler)
+        else:
+            self.stats.add(profiler)
+        self.stacks.update(sampler.stacks)
+        self.queries.append({'path': path, 'queries': recorder.queries})
+
+    def dump(self):
+        directory = os.path.join(settings.PROFILING_DIR, self.view_name)
+        os.makedirs(directory, exist_ok=True)
+        name = os.path.join(directory, '{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+
+        self.stats.dump_stats(name + '.prof')
+        with open(name + '.collapsed', 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write('{} {}\n'.format(stack, count))
+        with open(name + '.sql.json', 'w') as output:
+            json.dump(self.queries, output, ensure_ascii=False, indent=2)
+        return name
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def profile_request(view_name, path, get_response, request):
+    profiler = cProfile.Profile()
+    recorder = QueryRecorder()
+    with StackSampler(settings.PROFILING_SAMPLE_INTERVAL) as sampler, ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+
+    with _profiles_lock:
+        profile = _profiles.setdefault(view_name, ViewProfile(view_name))
+        profile.add(profiler, sampler, recorder, path)
+        if profile.requests >= settings.PROFILING_REQUESTS_PER_DUMP:
+            del _profiles[view_name]
+        else:
+            profile = None
+    if profile is not None:
+        response['X-Profile-Dump'] = os.path.relpath(profile.dump(), settings.PROFILING_DIR)
+    return response
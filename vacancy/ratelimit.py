@@ -0,0 +1,52 @@
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+RATE_LIMIT_KEY = 'ratelimit:{}:{}'
+# Истекший ключ - полное ведро, поэтому срок много больше периодов пополнения
+RATE_LIMIT_TIMEOUT = 24 * 60 * 60
+
+
+def client_id(request):
+    if request.user.is_authenticated:
+        return 'user:{}'.format(request.user.pk)
+    address = request.META.get('REMOTE_ADDR', '')
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if settings.RATE_LIMIT_FORWARDED_FOR and forwarded:
+        # Последний адрес добавлен нашим балансировщиком, предыдущие мог подставить клиент
+        address = forwarded.split(',')[-1].strip()
+    return 'ip:' + address
+
+
+def consume(client, route, tokens, period):
+    """
+    Забирает жетон из ведра клиента на маршруте. Ведро вмещает tokens жетонов
+    и пополняется по одному раз в period / tokens секунд. Возвращает 0, если
+    жетон нашелся, иначе - через сколько секунд он появится.
+
+    Ведро хранится как время в миллисекундах, когда оно снова будет полным:
+    жетон сдвигает это время на интервал пополнения, поэтому обычный запрос
+    обходится одним атомарным incr.
+    """
+    now = int(time.time() * 1000)
+    interval = max(1, period * 1000 // tokens)
+    # Адрес из заголовка может содержать недопустимые для memcached символы
+    client = hashlib.md5(client.encode()).hexdigest()
+    key = RATE_LIMIT_KEY.format(route, client)
+    try:
+        full_at = cache.incr(key, interval)
+    except ValueError:
+        full_at = now + interval if cache.add(key, now + interval, RATE_LIMIT_TIMEOUT) else cache.incr(key, interval)
+    if full_at < now + interval:
+        # Ведро было полным: жетоны сверх tokens не копятся. Одновременные
+        # запросы могут потерять здесь по жетону, но не больше
+        full_at = now + interval
+        cache.set(key, full_at, RATE_LIMIT_TIMEOUT)
+    if full_at - now <= period * 1000:
+        return 0
+    # Отказ не расходует жетон
+    cache.decr(key, interval)
+    return max(1, math.ceil((full_at - now - period * 1000) / 1000))
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db import transaction
+
+from vacancy.matching import tokenize
+from vacancy.models import Resume, ResumeTerm, Speciality
+
+TERM_MAX_LENGTH = ResumeTerm._meta.get_field('term').max_length
+
+
+def resume_terms(experience, education):
+    return {term[:TERM_MAX_LENGTH] for term in tokenize(experience, education) if len(term) > 1}
+
+
+def index_resume(resume):
+    with transaction.atomic():
+        ResumeTerm.objects.filter(resume_id=resume.id).delete()
+        ResumeTerm.objects.bulk_create(
+            [ResumeTerm(term=term, resume_id=resume.id) for term in resume_terms(resume.experience, resume.education)],
+            ignore_conflicts=True,
+        )
+
+
+def rebuild_index(batch_size):
+    ResumeTerm.objects.all().delete()
+    terms = []
+    for resume_id, experience, education in Resume.objects.values_list('id', 'experience', 'education').iterator():
+        terms.extend(ResumeTerm(term=term, resume_id=resume_id) for term in resume_terms(experience, education))
+        if len(terms) >= batch_size:
+            ResumeTerm.objects.bulk_create(terms, ignore_conflicts=True)
+            terms = []
+    ResumeTerm.objects.bulk_create(terms, ignore_conflicts=True)
+
+
+def search_resumes(query='', speciality='', status='', grade='', salary_max=None, after=None):
+    """
+    Возвращает страницу резюме и курсор следующей страницы. Сначала по
+    индексу выбираются только id (keyset-пагинация по убыванию id), затем
+    одним запросом читаются сами резюме этой страницы.
+    """
+    ids = Resume.objects.all()
+    if speciality:
+        ids = ids.filter(speciality_id=Speciality.objects.filter(code=speciality).values('id')[:1])
+    if status:
+        ids = ids.filter(status=status)
+    if grade:
+        ids = ids.filter(grade=grade)
+    if salary_max is not None:
+        ids = ids.filter(salary__lte=salary_max)
+    for term in resume_terms(query, ''):
+        ids = ids.filter(id__in=ResumeTerm.objects.filter(term=term).values('resume_id'))
+    if after:
+        ids = ids.filter(id__lt=after)
+
+    page_size = settings.RESUME_SEARCH_PAGE_SIZE
+    page_ids = list(ids.order_by('-id').values_list('id', flat=True)[:page_size + 1])
+    next_after = page_ids[page_size - 1] if len(page_ids) > page_size else None
+    page_ids = page_ids[:page_size]
+
+    resumes = Resume.objects.filter(id__in=page_ids).select_related('speciality').order_by('-id')
+    return list(resumes), next_after
@@ -0,0 +1,162 @@
+import datetime
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from vacancy.models import Application, ArchivedVacancy, Vacancy, VacancyDailyStats
+
+logger = logging.getLogger(__name__)
+
+
+def add(vacancy_id, company_id, day, applications=0, views=0):
+    with transaction.atomic():
+        stats, created = VacancyDailyStats.objects.get_or_create(
+            vacancy_id=vacancy_id, day=day,
+            defaults={'company_id': company_id, 'applications': applications, 'views': views},
+        )
+        if not created:
+            VacancyDailyStats.objects.filter(id=stats.id).update(
+                applications=F('applications') + applications,
+                views=F('views') + views,
+            )
+
+
+def record_application(application):
+    # Удаленные (в том числе перенесенные в архив) отклики из истории не вычитаются
+    if application.vacancy_id is None:
+        return
+    day = timezone.localdate(application.created_at)
+    add(application.vacancy_id, application.vacancy.company_id, day, applications=1)
+
+
+# Просмотры копятся в памяти воркера и пишутся в базу пачкой раз в
+# ROLLUP_FLUSH_INTERVAL секунд, а не отдельным UPDATE на каждый просмотр
+
+_views = Counter()
+_views_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def record_view(vacancy_id):
+    global _flushed_at
+    with _views_lock:
+        _views[(vacancy_id, timezone.localdate())] += 1
+        if len(_views) < settings.ROLLUP_FLUSH_SIZE and time.monotonic() - _flushed_at < settings.ROLLUP_FLUSH_INTERVAL:
+            return
+        _flushed_at = time.monotonic()
+    flush_views()
+
+
+def flush_views():
+    with _views_lock:
+        pending = dict(_views)
+        _views.clear()
+    if not pending:
+        return 0
+    try:
+        companies = dict(
+            Vacancy.objects.filter(id__in={vacancy_id for vacancy_id, day in pending}).values_list('id', 'company_id')
+        )
+        with transaction.atomic():
+            for (vacancy_id, day), count in pending.items():
+                if vacancy_id in companies:
+                    add(vacancy_id, companies[vacancy_id], day, views=count)
+    except DatabaseError:
+        # Не записанные просмотры вернутся в базу со следующей пачкой
+        logger.exception('Failed to flush %d vacancy view counters', len(pending))
+        with _views_lock:
+            _views.update(pending)
+        return 0
+    return sum(pending.values())
+
+
+def backfill(batch_size, since=None):
+    """
+    Пересчитывает отклики в дневной статистике по таблице откликов. Отклики
+    группируются по (вакансия, день) пачками по диапазонам id. Просмотры и
+    статистика вакансий, уже перенесенных в архив, не меняются.
+    """
+    applications = Application.objects.filter(vacancy__isnull=False, created_at__isnull=False)
+    if since is not None:
+        start = timezone.make_aware(datetime.datetime.combine(since, datetime.time()))
+        applications = applications.filter(created_at__gte=start)
+    bounds = applications.aggregate(first_id=Min('id'), last_id=Max('id'))
+
+    counts = Counter()
+    companies = {}
+    if bounds['first_id'] is not None:
+        for first_id in range(bounds['first_id'], bounds['last_id'] + 1, batch_size):
+            groups = (
+                applications.filter(id__gte=first_id, id__lt=first_id + batch_size)
+                .annotate(day=TruncDate('created_at'))
+                .values('vacancy_id', 'vacancy__company_id', 'day')
+                .annotate(total=Count('id'))
+                .order_by()
+            )
+            for group in groups:
+                counts[(group['vacancy_id'], group['day'])] += group['total']
+                companies[group['vacancy_id']] = group['vacancy__company_id']
+
+    with transaction.atomic():
+        existing = VacancyDailyStats.objects.filter(vacancy_id__in=Vacancy.objects.values('id'))
+        if since is not None:
+            existing = existing.filter(day__gte=since)
+        changed = []
+        for stats in existing.iterator(chunk_size=batch_size):
+            total = counts.pop((stats.vacancy_id, stats.day), 0)
+            if stats.applications != total:
+                stats.applications = total
+                changed.append(stats)
+        VacancyDailyStats.objects.bulk_update(changed, ['applications'], batch_size=batch_size)
+        VacancyDailyStats.objects.bulk_create(
+            [
+                VacancyDailyStats(
+                    vacancy_id=vacancy_id, company_id=companies[vacancy_id], day=day, applications=total,
+                )
+                for (vacancy_id, day), total in counts.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(changed) + len(counts)
+
+
+def company_summary(company_id, days):
+    """Отклики и просмотры по дням и по вакансиям компании за последние days дней."""
+    today = timezone.localdate()
+    since = today - datetime.timedelta(days=days - 1)
+    rows = VacancyDailyStats.objects.filter(company_id=company_id, day__gte=since)
+
+    by_day = {
+        row['day']: row
+        for row in rows.values('day').annotate(applications=Sum('applications'), views=Sum('views')).order_by()
+    }
+    daily = []
+    for offset in range(days):
+        day = since + datetime.timedelta(days=offset)
+        row = by_day.get(day, {})
+        daily.append({'day': day, 'applications': row.get('applications', 0), 'views': row.get('views', 0)})
+
+    vacancies = list(
+        rows.values('vacancy_id')
+        .annotate(applications=Sum('applications'), views=Sum('views'))
+        .order_by('-applications', '-views', 'vacancy_id')
+    )
+    ids = [row['vacancy_id'] for row in vacancies]
+    titles = dict(ArchivedVacancy.objects.filter(id__in=ids).values_list('id', 'title'))
+    titles.update(Vacancy.objects.filter(id__in=ids).values_list('id', 'title'))
+    for row in vacancies:
+        row['title'] = titles.get(row['vacancy_id'], '')
+    return {
+        'since': since,
+        'daily': daily,
+        'vacancies': vacancies,
+        'applications': sum(row['applications'] for row in daily),
+        'views': sum(row['views'] for row in daily),
+    }
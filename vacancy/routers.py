@@ -0,0 +1,86 @@
+import os
+import random
+import time
+
+from asgiref.local import Local
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_SYNCED_KEY = 'replica:synced:{}'
+
+_state = Local()
+
+
+def get_read_alias():
+    return getattr(_state, 'read_alias', DEFAULT_DB_ALIAS)
+
+
+def set_read_alias(alias):
+    _state.read_alias = alias
+
+
+def mark_replica_synced(alias, timestamp=None):
+    timestamp = timestamp or time.time()
+    cache.set(REPLICA_SYNCED_KEY.format(alias), timestamp, None)
+    database = connections.databases[alias]
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        os.utime(database['NAME'], (timestamp, timestamp))
+
+
+def replica_synced_at(alias, mark=None):
+    """
+    Время последней синхронизации реплики или None, если оно неизвестно.
+    mark - отметка из кеша. Кеш может быть своим у каждого процесса, поэтому
+    у SQLite-реплики временем синхронизации служит и время изменения файла.
+    """
+    database = connections.databases[alias]
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        try:
+            return max(mark or 0, os.path.getmtime(database['NAME']))
+        except OSError:
+            pass
+    return mark
+
+
+def healthy_replicas():
+    # Реплика без отметки о синхронизации считается отставшей: отметки ставит
+    # sync_replicas или внешний мониторинг репликации
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas:
+        return []
+    marks = cache.get_many([REPLICA_SYNCED_KEY.format(alias) for alias in replicas])
+    horizon = time.time() - settings.REPLICA_MAX_LAG
+    return [
+        alias for alias in replicas
+        if (replica_synced_at(alias, marks.get(REPLICA_SYNCED_KEY.format(alias))) or 0) >= horizon
+    ]
+
+
+def choose_replica():
+    replicas = healthy_replicas()
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтение идет в реплику, выбранную ReplicaRoutingMiddleware на время запроса,
+    запись и все запросы вне HTTP-запроса - в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        # После записи дочитываем свои же данные из основной базы
+        set_read_alias(DEFAULT_DB_ALIAS)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,49 @@
+from django.core.files.storage import default_storage
+
+# Облегченные строки для списков вакансий: шаблонам нужны несколько полей,
+# а полный экземпляр модели с _state и всеми полями в разы тяжелее
+
+VACANCY_ROW_FIELDS = (
+    'id', 'title', 'text', 'salary_min', 'salary_max', 'published_at',
+    'company_id', 'company__name', 'company__logo',
+)
+
+
+class LogoRow:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __bool__(self):
+        return bool(self.name)
+
+    @property
+    def url(self):
+        return default_storage.url(self.name) if self.name else ''
+
+
+class CompanyRow:
+    __slots__ = ('id', 'name', 'logo')
+
+    def __init__(self, id, name, logo):
+        self.id = id
+        self.name = name
+        self.logo = LogoRow(logo)
+
+
+class VacancyRow:
+    __slots__ = ('id', 'title', 'text', 'salary_min', 'salary_max', 'published_at', 'company')
+
+    def __init__(self, id, title, text, salary_min, salary_max, published_at, company_id, company_name, company_logo):
+        self.id = id
+        self.title = title
+        self.text = text
+        self.salary_min = salary_min
+        self.salary_max = salary_max
+        self.published_at = published_at
+        self.company = CompanyRow(company_id, company_name, company_logo)
+
+
+def vacancy_rows(queryset):
+    return [VacancyRow(*row) for row in queryset.values_list(*VACANCY_ROW_FIELDS)]
@@ -0,0 +1,142 @@
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from vacancy.models import Resume, SalaryBucket, SalaryStats, Vacancy
+
+# Номера корзин заведомо меньше: log(10 ** 9) / log(1.05) ~ 425
+BUCKETS_SPAN = 1024
+
+
+def vacancy_salary(salary_min, salary_max):
+    if salary_min and salary_max:
+        return (salary_min + salary_max) // 2
+    return salary_min or salary_max or None
+
+
+def vacancy_contribution(speciality_id, location, salary_min, salary_max):
+    salary = vacancy_salary(salary_min, salary_max)
+    if salary is None or speciality_id is None:
+        return None
+    return (SalaryStats.VACANCY, speciality_id, (location or '').strip(), salary)
+
+
+def resume_contribution(speciality_id, salary):
+    if not salary or speciality_id is None:
+        return None
+    return (SalaryStats.RESUME, speciality_id, '', salary)
+
+
+def apply(contribution, delta):
+    """Добавляет (delta=1) или убирает (delta=-1) зарплату из статистики."""
+    if contribution is None:
+        return
+    kind, speciality_id, location, salary = contribution
+    bucket = SalaryStats.bucket_of(salary)
+    with transaction.atomic():
+        for stats_location in {location, ''}:
+            stats, _ = SalaryStats.objects.get_or_create(
+                kind=kind, speciality_id=speciality_id, location=stats_location,
+            )
+            SalaryStats.objects.filter(id=stats.id).update(
+                count=F('count') + delta,
+                total=F('total') + delta * salary,
+            )
+            SalaryBucket.objects.get_or_create(stats=stats, bucket=bucket)
+            SalaryBucket.objects.filter(stats=stats, bucket=bucket).update(count=F('count') + delta)
+
+
+def replace(old, new):
+    if old == new:
+        return
+    with transaction.atomic():
+        apply(old, -1)
+        apply(new, 1)
+
+
+def _aggregate(kind, rows, totals, histograms):
+    """Векторно раскладывает пачку (speciality_id, location, salary) по статистикам."""
+    if not rows:
+        return
+    specialities, locations, salaries = zip(*rows)
+    salaries = np.array(salaries, dtype=np.int64)
+    buckets = (np.log(np.maximum(salaries, 1)) / np.log(SalaryStats.SALARY_BUCKET_RATIO)).astype(np.int64)
+
+    # Зарплата без города уже попала в статистику по всем городам: как и в
+    # apply(), второй раз она туда не добавляется
+    located = np.fromiter((bool(location) for location in locations), dtype=bool, count=len(locations))
+    passes = (
+        (list(zip(specialities, locations)), salaries, buckets),
+        ([(speciality_id, '') for speciality_id, location in zip(specialities, locations) if location],
+         salaries[located], buckets[located]),
+    )
+    for keys, pass_salaries, pass_buckets in passes:
+        if not keys:
+            continue
+        unique_keys = list(dict.fromkeys(keys))
+        positions = {key: position for position, key in enumerate(unique_keys)}
+        inverse = np.fromiter((positions[key] for key in keys), dtype=np.int64, count=len(keys))
+
+        counts = np.bincount(inverse, minlength=len(unique_keys))
+        sums = np.bincount(inverse, weights=pass_salaries, minlength=len(unique_keys))
+        for position, (speciality_id, location) in enumerate(unique_keys):
+            total = totals[(kind, speciality_id, location)]
+            total[0] += int(counts[position])
+            total[1] += int(sums[position])
+
+        # Пары (статистика, корзина) кодируются одним числом и считаются за один проход
+        pairs, pair_counts = np.unique(inverse * BUCKETS_SPAN + pass_buckets, return_counts=True)
+        for pair, count in zip(pairs, pair_counts):
+            speciality_id, location = unique_keys[pair // BUCKETS_SPAN]
+            histograms[(kind, speciality_id, location)][int(pair % BUCKETS_SPAN)] += int(count)
+
+
+def rebuild():
+    """Пересчитывает статистику с нуля, читая вакансии и резюме пачками."""
+    totals = defaultdict(lambda: [0, 0])
+    histograms = defaultdict(Counter)
+    chunk_size = settings.SALARY_STATS_CHUNK_SIZE
+
+    rows = []
+    vacancies = Vacancy.objects.values_list('speciality_id', 'company__location', 'salary_min', 'salary_max')
+    for speciality_id, location, salary_min, salary_max in vacancies.iterator(chunk_size=chunk_size):
+        contribution = vacancy_contribution(speciality_id, location, salary_min, salary_max)
+        if contribution:
+            rows.append(contribution[1:])
+        if len(rows) == chunk_size:
+            _aggregate(SalaryStats.VACANCY, rows, totals, histograms)
+            rows = []
+    _aggregate(SalaryStats.VACANCY, rows, totals, histograms)
+
+    rows = []
+    resumes = Resume.objects.filter(salary__gt=0).values_list('speciality_id', 'salary')
+    for speciality_id, salary in resumes.iterator(chunk_size=chunk_size):
+        rows.append((speciality_id, '', salary))
+        if len(rows) == chunk_size:
+            _aggregate(SalaryStats.RESUME, rows, totals, histograms)
+            rows = []
+    _aggregate(SalaryStats.RESUME, rows, totals, histograms)
+
+    with transaction.atomic():
+        SalaryStats.objects.all().delete()
+        stats = SalaryStats.objects.bulk_create([
+            SalaryStats(kind=kind, speciality_id=speciality_id, location=location, count=count, total=total)
+            for (kind, speciality_id, location), (count, total) in totals.items()
+        ])
+        # bulk_create не возвращает id на SQLite, поэтому перечитываем
+        ids = {
+            (stat.kind, stat.speciality_id, stat.location): stat.id
+            for stat in SalaryStats.objects.only('id', 'kind', 'speciality_id', 'location')
+        }
+        SalaryBucket.objects.bulk_create(
+            [
+                SalaryBucket(stats_id=ids[key], bucket=int(bucket), count=int(count))
+                for key, histogram in histograms.items()
+                for bucket, count in histogram.items()
+            ],
+            batch_size=1000,
+        )
+    return len(stats)
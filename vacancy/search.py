@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connections, router, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from vacancy import metrics
+from vacancy.models import Vacancy
+from vacancy.rows import vacancy_rows
+
+logger = logging.getLogger(__name__)
+
+SEARCH_METRICS = ('search.requests', 'search.cache_hits', 'search.too_short', 'search.timeouts', 'search.degraded')
+SEARCH_CACHE_KEY = 'search:{}:{}'
+SEARCH_FIELDS = ('title', 'skills', 'text')
+# Сколько инструкций виртуальной машины SQLite выполняется между проверками времени
+SQLITE_PROGRESS_STEPS = 10000
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+@contextmanager
+def statement_timeout(using, seconds):
+    """Ограничивает время выполнения запросов внутри блока."""
+    connection = connections[using]
+    connection.ensure_connection()
+    if connection.vendor == 'sqlite':
+        deadline = time.monotonic() + seconds
+        connection.connection.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+        try:
+            yield
+        except (OperationalError, sqlite3.OperationalError) as error:
+            # При DEBUG курсор Django после ошибки выполняет еще один запрос
+            # для журнала, и прерывается уже он - с исключением самого sqlite3
+            if 'interrupted' in str(error):
+                raise QueryTimeout() from error
+            raise
+        finally:
+            connection.connection.set_progress_handler(None, 0)
+    elif connection.vendor == 'postgresql':
+        try:
+            with transaction.atomic(using=using):
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL statement_timeout = %s', [int(seconds * 1000)])
+                yield
+        except OperationalError as error:
+            if getattr(error.__cause__, 'pgcode', None) == '57014':
+                raise QueryTimeout() from error
+            raise
+    else:
+        yield
+
+
+def normalize_query(querystring):
+    return ' '.join((querystring or '').lower().split())
+
+
+def _cache_key(kind, query):
+    return SEARCH_CACHE_KEY.format(kind, hashlib.md5(query.encode()).hexdigest())
+
+
+class UnicodeLower(Lower):
+    """
+    LOWER() в SQLite меняет регистр только у латиницы, поэтому там вызывается
+    зарегистрированная в соединении str.lower() - та же, что в matches().
+    """
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='UNICODE_LOWER', **extra_context)
+
+
+def unicode_lower(value):
+    return value.lower() if value is not None else None
+
+
+def _matching(query):
+    # Поле приводится к нижнему регистру так же, как запрос в normalize_query:
+    # LIKE в SQLite без учета регистра сравнивает только латиницу
+    lowered = {field + '_lower': UnicodeLower(field) for field in SEARCH_FIELDS}
+    conditions = Q()
+    for name in lowered:
+        conditions |= Q(**{name + '__contains': query})
+    return Vacancy.objects.active().collapsed().annotate(**lowered).filter(conditions)
+
+
+def matches(query, vacancy):
+    """Условие _matching() для вакансии из памяти (словаря полей)."""
+    return any(query in (vacancy[field] or '').lower() for field in SEARCH_FIELDS)
+
+
+def _rows_by_ids(ids):
+    rows = {row.id: row for row in vacancy_rows(Vacancy.objects.filter(id__in=ids))}
+    return [rows[vacancy_id] for vacancy_id in ids if vacancy_id in rows]
+
+
+def search_vacancies(querystring):
+    """
+    Возвращает (строки, статус). Статус: 'ok', 'too_short' или 'degraded',
+    если запрос не уложился в SEARCH_TIME_BUDGET и показаны сохраненные
+    ранее или неполные результаты.
+    """
+    metrics.incr('search.requests')
+    query = normalize_query(querystring)
+    if len(query) < settings.SEARCH_MIN_QUERY_LENGTH:
+        metrics.incr('search.too_short')
+        return [], 'too_short'
+
+    ids = cache.get(_cache_key('fresh', query))
+    if ids is not None:
+        metrics.incr('search.cache_hits')
+        return _rows_by_ids(ids), 'ok'
+
+    using = router.db_for_read(Vacancy)
+    try:
+        with statement_timeout(using, settings.SEARCH_TIME_BUDGET):
+            ids = list(
+                _matching(query).using(using).order_by('-id')
+                .values_list('id', flat=True)[:settings.SEARCH_MAX_RESULTS]
+            )
+    except QueryTimeout:
+        metrics.incr('search.timeouts')
+        logger.warning('Search for %r exceeded %s s', query, settings.SEARCH_TIME_BUDGET)
+        return degraded_results(query, using), 'degraded'
+
+    cache.set(_cache_key('fresh', query), ids, settings.SEARCH_CACHE_TIMEOUT)
+    cache.set(_cache_key('stale', query), ids, settings.SEARCH_STALE_TIMEOUT)
+    return _rows_by_ids(ids), 'ok'
+
+
+def degraded_results(query, using):
+    metrics.incr('search.degraded')
+    ids = cache.get(_cache_key('stale', query))
+    if ids is not None:
+        return _rows_by_ids(ids)
+
+    # Устаревших результатов нет: ищем только среди самых свежих вакансий,
+    # это ограниченный просмотр по первичному ключу
+    newest = Vacancy.objects.using(using).order_by('-id').values_list('id', flat=True).first() or 0
+    try:
+        with statement_timeout(using, settings.SEARCH_TIME_BUDGET):
+            ids = list(
+                _matching(query).using(using)
+                .filter(id__gt=newest - settings.SEARCH_DEGRADED_WINDOW)
+                .order_by('-id')
+                .values_list('id', flat=True)[:settings.SEARCH_MAX_RESULTS]
+            )
+    except QueryTimeout:
+        return []
+    return _rows_by_ids(ids)
@@ -0,0 +1,82 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+# Раздел каталога - набор вакансий, выдача которого кешируется целиком:
+# страница sitemap, лента специализации или лента компании.
+# У каждого раздела есть версия, которая меняется при изменении его вакансий.
+
+SECTION_STATE_KEY = 'section:state:{}'
+SECTION_BODY_KEY = 'section:body:{}:{}'
+
+
+def sitemap_section(page):
+    return 'sitemap:{}'.format(page)
+
+
+def speciality_section(code):
+    return 'speciality:{}'.format(code)
+
+
+def company_section(company_id):
+    return 'company:{}'.format(company_id)
+
+
+def sitemap_page_for(vacancy_id):
+    return (vacancy_id - 1) // settings.SITEMAP_PAGE_SIZE + 1
+
+
+def touch_section(*sections):
+    now = time.time()
+    state = {'version': int(now * 1000), 'modified': int(now)}
+    cache.set_many(
+        {SECTION_STATE_KEY.format(section): state for section in sections},
+        settings.SECTION_CACHE_TIMEOUT,
+    )
+
+
+def get_section_state(section):
+    key = SECTION_STATE_KEY.format(section)
+    state = cache.get(key)
+    if state is None:
+        # Состояние потеряно вместе с кешем - считаем раздел только что измененным
+        now = time.time()
+        state = {'version': int(now * 1000), 'modified': int(now)}
+        if not cache.add(key, state, settings.SECTION_CACHE_TIMEOUT):
+            state = cache.get(key, state)
+    return state
+
+
+def _tee_to_cache(chunks, key):
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(body).encode(), settings.SECTION_CACHE_TIMEOUT)
+
+
+def section_response(request, section, content_type, render):
+    """
+    Отдает раздел с ETag/Last-Modified. Тело берется из кеша текущей версии
+    раздела, а при промахе стримится из render() и сохраняется в кеш.
+    render() возвращает итератор строк.
+    """
+    state = get_section_state(section)
+    etag = quote_etag('{}-{}'.format(section, state['version']))
+
+    response = get_conditional_response(request, etag=etag, last_modified=state['modified'])
+    if response is None:
+        key = SECTION_BODY_KEY.format(section, state['version'])
+        body = cache.get(key)
+        if body is not None:
+            response = HttpResponse(body, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(_tee_to_cache(render(), key), content_type=content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(state['modified'])
+    return response
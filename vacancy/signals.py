@@ -0,0 +1,207 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from vacancy import catalog, dedup, locations, objectcache, prerender, resume_search, rollups, salaries, search
+from vacancy.models import Application, ChangeLogEntry, Company, Resume, SimilarityRefresh, Speciality, Vacancy
+from vacancy.sections import (
+    company_section,
+    sitemap_page_for,
+    sitemap_section,
+    speciality_section,
+    touch_section,
+)
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('UNICODE_LOWER', 1, search.unicode_lower, deterministic=True)
+
+
+@receiver([post_save, post_delete], sender=Vacancy)
+def vacancy_changed(sender, instance, **kwargs):
+    touch_section(
+        'sitemap:index',
+        sitemap_section(sitemap_page_for(instance.id)),
+        speciality_section(instance.speciality.code),
+        company_section(instance.company_id),
+    )
+
+
+@receiver([post_save, post_delete], sender=Vacancy)
+def queue_similarity_refresh(sender, instance, **kwargs):
+    SimilarityRefresh.objects.bulk_create([SimilarityRefresh(vacancy_id=instance.id)], ignore_conflicts=True)
+
+
+@receiver([post_save, post_delete], sender=Company)
+def company_changed(sender, instance, **kwargs):
+    touch_section('sitemap:catalog', company_section(instance.id))
+
+
+@receiver([post_save, post_delete], sender=Speciality)
+def speciality_changed(sender, instance, **kwargs):
+    touch_section('sitemap:catalog', speciality_section(instance.code))
+
+
+@receiver(post_delete, sender=Vacancy)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Application)
+def log_delete(sender, instance, using, **kwargs):
+    # post_delete отправляется внутри транзакции удаления, в том числе каскадного
+    ChangeLogEntry.record(instance, ChangeLogEntry.DELETE, using=using)
+
+
+@receiver(post_save, sender=Resume)
+def index_resume(sender, instance, **kwargs):
+    resume_search.index_resume(instance)
+
+
+# Кеш объектов: обновляется после коммита, чтобы не закешировать откатившиеся данные
+
+
+@receiver(post_save, sender=Vacancy)
+@receiver(post_save, sender=Company)
+def write_through_cached_object(sender, instance, using, **kwargs):
+    transaction.on_commit(lambda: sender.objects.refresh_cached(instance.pk), using=using)
+
+
+@receiver(post_delete, sender=Vacancy)
+@receiver(post_delete, sender=Company)
+def invalidate_cached_object(sender, instance, using, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: objectcache.invalidate(sender, pk), using=using)
+
+
+@receiver([post_save, post_delete], sender=Company)
+@receiver([post_save, post_delete], sender=Speciality)
+def invalidate_cached_vacancies(sender, instance, using, **kwargs):
+    # Компания и специализация лежат в записях вакансий, поэтому сбрасывается
+    # все поколение: такие изменения редки
+    transaction.on_commit(lambda: objectcache.bump_generation(Vacancy), using=using)
+
+
+# Статические копии публичных страниц
+
+
+@receiver([post_save, post_delete], sender=Vacancy)
+def invalidate_vacancy_pages(sender, instance, **kwargs):
+    prerender.invalidate(prerender.vacancy_paths(instance))
+
+
+@receiver([post_save, post_delete], sender=Company)
+def invalidate_company_pages(sender, instance, **kwargs):
+    prerender.invalidate(prerender.company_paths(instance))
+
+
+@receiver([post_save, post_delete], sender=Speciality)
+def invalidate_speciality_pages(sender, instance, **kwargs):
+    prerender.invalidate(prerender.speciality_paths(instance))
+
+
+# Статистика зарплат: перед сохранением запоминаем прежний вклад записи
+
+
+def _vacancy_contribution(vacancy):
+    location = Company.objects.filter(id=vacancy.company_id).values_list('location', flat=True).first()
+    return salaries.vacancy_contribution(vacancy.speciality_id, location, vacancy.salary_min, vacancy.salary_max)
+
+
+@receiver(pre_save, sender=Vacancy)
+def remember_vacancy_salary(sender, instance, **kwargs):
+    old = None
+    if instance.pk:
+        row = Vacancy.objects.filter(pk=instance.pk).values_list(
+            'speciality_id', 'company__location', 'salary_min', 'salary_max',
+        ).first()
+        old = salaries.vacancy_contribution(*row) if row else None
+    instance._salary_contribution = old
+
+
+@receiver(post_save, sender=Vacancy)
+def update_vacancy_salary(sender, instance, **kwargs):
+    salaries.replace(getattr(instance, '_salary_contribution', None), _vacancy_contribution(instance))
+
+
+@receiver(post_delete, sender=Vacancy)
+def remove_vacancy_salary(sender, instance, **kwargs):
+    salaries.apply(_vacancy_contribution(instance), -1)
+
+
+@receiver(pre_save, sender=Resume)
+def remember_resume_salary(sender, instance, **kwargs):
+    old = None
+    if instance.pk:
+        row = Resume.objects.filter(pk=instance.pk).values_list('speciality_id', 'salary').first()
+        old = salaries.resume_contribution(*row) if row else None
+    instance._salary_contribution = old
+
+
+@receiver(post_save, sender=Resume)
+def update_resume_salary(sender, instance, **kwargs):
+    new = salaries.resume_contribution(instance.speciality_id, instance.salary)
+    salaries.replace(getattr(instance, '_salary_contribution', None), new)
+
+
+@receiver(post_delete, sender=Resume)
+def remove_resume_salary(sender, instance, **kwargs):
+    salaries.apply(salaries.resume_contribution(instance.speciality_id, instance.salary), -1)
+
+
+@receiver(pre_save, sender=Company)
+def resolve_company_city(sender, instance, **kwargs):
+    instance.city_id = locations.resolve(instance.location)
+
+
+@receiver(pre_save, sender=Company)
+def remember_company_location(sender, instance, **kwargs):
+    old = None
+    if instance.pk:
+        old = Company.objects.filter(pk=instance.pk).values_list('location', flat=True).first()
+    instance._old_location = old
+
+
+@receiver(post_save, sender=Company)
+def move_company_salaries(sender, instance, created, **kwargs):
+    old_location = getattr(instance, '_old_location', None)
+    if created or old_location is None or old_location.strip() == instance.location.strip():
+        return
+    rows = instance.vacancies.values_list('speciality_id', 'salary_min', 'salary_max')
+    for speciality_id, salary_min, salary_max in rows.iterator():
+        salaries.replace(
+            salaries.vacancy_contribution(speciality_id, old_location, salary_min, salary_max),
+            salaries.vacancy_contribution(speciality_id, instance.location, salary_min, salary_max),
+        )
+
+
+# Поиск дубликатов: оригинал определяется до сохранения, чтобы попасть
+# в ту же запись и журнал изменений
+
+
+@receiver(pre_save, sender=Vacancy)
+def find_vacancy_original(sender, instance, **kwargs):
+    minhash = dedup.signature(instance.title, instance.skills, instance.text)
+    instance._minhash = minhash
+    instance.duplicate_of_id = dedup.find_originals([(instance.pk, minhash)])[instance.pk]
+
+
+@receiver(post_save, sender=Vacancy)
+def store_vacancy_signature(sender, instance, **kwargs):
+    if hasattr(instance, '_minhash'):
+        dedup.store_signatures([(instance.pk, instance._minhash)])
+
+
+# Дневная статистика откликов пишется в той же транзакции, что и сам отклик
+
+
+@receiver(post_save, sender=Application)
+def count_application(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_application(instance)
+
+
+@receiver([post_save, post_delete], sender=Vacancy)
+@receiver([post_save, post_delete], sender=Company)
+def refresh_catalog(sender, using, **kwargs):
+    transaction.on_commit(catalog.mark_stale, using=using)
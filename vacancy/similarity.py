@@ -0,0 +1,229 @@
+import math
+import os
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from scipy import sparse
+
+from vacancy.models import SimilarityRefresh, SimilarVacancy, Vacancy
+
+WORD_RE = re.compile(r'\w+')
+VACANCY_FIELDS = ('id', 'title', 'skills', 'text', 'salary_min', 'salary_max', 'speciality_id')
+
+# Веса признаков: совпадение в названии и специализации важнее, чем в описании
+TITLE_WEIGHT = 3
+SKILLS_WEIGHT = 2
+SPECIALITY_WEIGHT = 4
+SALARY_WEIGHT = 2
+
+
+def _column(feature):
+    # crc32 стабилен между процессами в отличие от hash()
+    return zlib.crc32(feature.encode()) % settings.SIMILARITY_FEATURES
+
+
+def vacancy_features(vacancy):
+    features = Counter()
+    for word in WORD_RE.findall(vacancy['title'].lower()):
+        features['w:' + word] += TITLE_WEIGHT
+    for word in WORD_RE.findall(vacancy['skills'].lower()):
+        features['w:' + word] += SKILLS_WEIGHT
+    for word in WORD_RE.findall(vacancy['text'].lower()):
+        features['w:' + word] += 1
+    features['speciality:{}'.format(vacancy['speciality_id'])] += SPECIALITY_WEIGHT
+    salary = vacancy['salary_max'] or vacancy['salary_min']
+    if salary:
+        # Зарплаты близкого порядка попадают в одну корзину
+        features['salary:{}'.format(int(math.log2(salary) * 2))] += SALARY_WEIGHT
+    return features
+
+
+def vectorize(rows):
+    """Сырые частоты признаков (hashing trick) для пачки вакансий."""
+    ids, data, indices, indptr = [], [], [], [0]
+    for vacancy in rows:
+        columns = Counter()
+        for feature, weight in vacancy_features(vacancy).items():
+            columns[_column(feature)] += weight
+        ids.append(vacancy['id'])
+        indices.extend(columns.keys())
+        data.extend(columns.values())
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(ids), settings.SIMILARITY_FEATURES),
+    )
+    return np.array(ids, dtype=np.int64), matrix
+
+
+def tfidf(counts):
+    """Логарифмированные частоты, взвешенные по IDF и нормированные по строкам."""
+    documents = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((1 + documents) / (1 + df)).astype(np.float32) + 1
+    weighted = counts.copy()
+    weighted.data = np.log1p(weighted.data)
+    weighted = weighted.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1))).ravel()
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(weighted).tocsr()
+
+
+class SimilarityIndex:
+    """
+    Матрица частот признаков всех активных вакансий хранится на диске,
+    при обновлении пересчитываются только строки измененных вакансий.
+    """
+
+    def __init__(self, ids, counts):
+        self.ids = ids
+        self.counts = counts
+        self._vectors = None
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            self._vectors = tfidf(self.counts)
+        return self._vectors
+
+    @classmethod
+    def build(cls):
+        ids, blocks = [], []
+        rows = Vacancy.objects.active().order_by('id').values(*VACANCY_FIELDS)
+        batch = []
+        for vacancy in rows.iterator(chunk_size=settings.SIMILARITY_BATCH_SIZE):
+            batch.append(vacancy)
+            if len(batch) == settings.SIMILARITY_BATCH_SIZE:
+                batch_ids, block = vectorize(batch)
+                ids.append(batch_ids)
+                blocks.append(block)
+                batch = []
+        batch_ids, block = vectorize(batch)
+        ids.append(batch_ids)
+        blocks.append(block)
+        return cls(np.concatenate(ids), sparse.vstack(blocks).tocsr())
+
+    @classmethod
+    def load(cls):
+        path = settings.SIMILARITY_INDEX_PATH
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as stored:
+            counts = sparse.csr_matrix(
+                (stored['data'], stored['indices'], stored['indptr']),
+                shape=(len(stored['ids']), settings.SIMILARITY_FEATURES),
+            )
+            return cls(stored['ids'], counts)
+
+    def save(self):
+        path = settings.SIMILARITY_INDEX_PATH
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            ids=self.ids,
+            data=self.counts.data,
+            indices=self.counts.indices,
+            indptr=self.counts.indptr,
+        )
+        os.replace(tmp_path, path)
+
+    def replace(self, vacancy_ids):
+        """Убирает строки вакансий vacancy_ids и добавляет актуальные для активных из них."""
+        vacancy_ids = list(vacancy_ids)
+        keep = ~np.isin(self.ids, vacancy_ids)
+        rows = Vacancy.objects.active().filter(id__in=vacancy_ids).order_by('id').values(*VACANCY_FIELDS)
+        new_ids, new_counts = vectorize(rows)
+        self.ids = np.concatenate([self.ids[keep], new_ids])
+        self.counts = sparse.vstack([self.counts[keep], new_counts]).tocsr()
+        self._vectors = None
+        return new_ids
+
+    def neighbours(self, vacancy_ids):
+        """Top-k соседей для vacancy_ids: {vacancy_id: [(similar_id, score), ...]}."""
+        return self.neighbours_at(np.flatnonzero(np.isin(self.ids, vacancy_ids)))
+
+    def neighbours_at(self, positions):
+        vectors = self.vectors
+        top_k = settings.SIMILARITY_TOP_K
+        result = {}
+        for start in range(0, len(positions), settings.SIMILARITY_BATCH_SIZE):
+            batch = positions[start:start + settings.SIMILARITY_BATCH_SIZE]
+            scores = vectors[batch].dot(vectors.T).tocsr()
+            for row, position in enumerate(batch):
+                begin, end = scores.indptr[row], scores.indptr[row + 1]
+                columns, values = scores.indices[begin:end], scores.data[begin:end]
+                mask = columns != position
+                columns, values = columns[mask], values[mask]
+                if len(values) > top_k:
+                    best = np.argpartition(-values, top_k)[:top_k]
+                    columns, values = columns[best], values[best]
+                order = np.argsort(-values)
+                result[int(self.ids[position])] = [
+                    (int(self.ids[column]), float(value)) for column, value in zip(columns[order], values[order])
+                ]
+        return result
+
+
+def store_neighbours(neighbours):
+    with transaction.atomic():
+        SimilarVacancy.objects.filter(vacancy_id__in=list(neighbours)).delete()
+        SimilarVacancy.objects.bulk_create(
+            [
+                SimilarVacancy(vacancy_id=vacancy_id, similar_id=similar_id, score=score)
+                for vacancy_id, similar in neighbours.items()
+                for similar_id, score in similar
+            ],
+            batch_size=1000,
+        )
+
+
+def rebuild():
+    # Очередь очищается до чтения вакансий: изменения во время сборки
+    # попадут в нее заново и будут учтены следующим refresh()
+    SimilarityRefresh.objects.all().delete()
+    index = SimilarityIndex.build()
+    for start in range(0, len(index.ids), settings.SIMILARITY_BATCH_SIZE):
+        positions = np.arange(start, min(start + settings.SIMILARITY_BATCH_SIZE, len(index.ids)))
+        store_neighbours(index.neighbours_at(positions))
+    SimilarVacancy.objects.exclude(vacancy__in=Vacancy.objects.active()).delete()
+    index.save()
+    return len(index.ids)
+
+
+def refresh():
+    """Пересчитывает соседей вакансий из очереди SimilarityRefresh."""
+    index = SimilarityIndex.load()
+    if index is None:
+        return rebuild()
+
+    queued = list(SimilarityRefresh.objects.values_list('vacancy_id', flat=True))
+    # Устаревшие по дате вакансии не сохраняются и в очередь не попадают,
+    # поэтому из индекса убираются все, кто больше не активен
+    active = np.fromiter(Vacancy.objects.active().values_list('id', flat=True).iterator(), dtype=np.int64)
+    inactive = index.ids[~np.isin(index.ids, active)].tolist()
+    if not queued and not inactive:
+        return 0
+    changed = index.replace(set(queued) | set(inactive))
+    removed = (set(queued) | set(inactive)) - set(changed.tolist())
+
+    # Измененная вакансия могла стать похожей на своих соседей, а у соседей
+    # выпавшей из индекса освободилось место, поэтому пересчитываются и они
+    neighbours = index.neighbours(changed)
+    affected = {similar_id for similar in neighbours.values() for similar_id, score in similar}
+    affected.update(SimilarVacancy.objects.filter(similar_id__in=removed).values_list('vacancy_id', flat=True))
+    affected -= set(neighbours) | removed
+    if affected:
+        neighbours.update(index.neighbours(list(affected)))
+
+    with transaction.atomic():
+        store_neighbours(neighbours)
+        SimilarVacancy.objects.filter(Q(vacancy_id__in=removed) | Q(similar_id__in=removed)).delete()
+    SimilarityRefresh.objects.filter(vacancy_id__in=queued).delete()
+    index.save()
+    return len(neighbours)
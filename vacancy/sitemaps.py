@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.db.models import Max
+from django.http import Http404
+from django.urls import reverse
+from django.utils.html import escape
+
+from vacancy.models import Company, Speciality, Vacancy
+from vacancy.sections import section_response, sitemap_section
+
+SITEMAP_CONTENT_TYPE = 'application/xml; charset=utf-8'
+SITEMAP_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_CLOSE = '</urlset>\n'
+INDEX_OPEN = '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+INDEX_CLOSE = '</sitemapindex>\n'
+
+
+def _url(loc, lastmod=None):
+    if lastmod is None:
+        return '<url><loc>{}</loc></url>\n'.format(escape(loc))
+    return '<url><loc>{}</loc><lastmod>{}</lastmod></url>\n'.format(escape(loc), lastmod.isoformat())
+
+
+def _pages_count():
+    # Страницы нарезаются по диапазонам id, поэтому изменение вакансии
+    # затрагивает только одну страницу, а удаление не сдвигает остальные
+    max_id = Vacancy.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    return (max_id - 1) // settings.SITEMAP_PAGE_SIZE + 1 if max_id else 0
+
+
+def sitemap_index(request):
+
+    def render():
+        yield SITEMAP_HEADER
+        yield INDEX_OPEN
+        loc = request.build_absolute_uri(reverse('sitemap_catalog'))
+        yield '<sitemap><loc>{}</loc></sitemap>\n'.format(escape(loc))
+        for page in range(1, _pages_count() + 1):
+            loc = request.build_absolute_uri(reverse('sitemap_vacancies', args=[page]))
+            yield '<sitemap><loc>{}</loc></sitemap>\n'.format(escape(loc))
+        yield INDEX_CLOSE
+
+    return section_response(request, 'sitemap:index', SITEMAP_CONTENT_TYPE, render)
+
+
+def sitemap_catalog(request):
+
+    def render():
+        yield SITEMAP_HEADER
+        yield URLSET_OPEN
+        yield _url(request.build_absolute_uri(reverse('index')))
+        yield _url(request.build_absolute_uri(reverse('vacancies')))
+        for code in Speciality.objects.values_list('code', flat=True).iterator():
+            yield _url(request.build_absolute_uri(reverse('specialization', args=[code])))
+        for company_id in Company.objects.values_list('id', flat=True).iterator():
+            yield _url(request.build_absolute_uri(reverse('company', args=[company_id])))
+        yield URLSET_CLOSE
+
+    return section_response(request, 'sitemap:catalog', SITEMAP_CONTENT_TYPE, render)
+
+
+def sitemap_vacancies(request, page):
+    if page < 1:
+        raise Http404
+    first_id = (page - 1) * settings.SITEMAP_PAGE_SIZE + 1
+    last_id = page * settings.SITEMAP_PAGE_SIZE
+
+    def render():
+        rows = (
+            Vacancy.objects.active().filter(id__range=(first_id, last_id))
+            .order_by('id')
+            .values_list('id', 'published_at')
+        )
+        yield SITEMAP_HEADER
+        yield URLSET_OPEN
+        for vacancy_id, published_at in rows.iterator(chunk_size=settings.SITEMAP_CHUNK_SIZE):
+            yield _url(request.build_absolute_uri(reverse('vacancy', args=[vacancy_id])), published_at)
+        yield URLSET_CLOSE
+
+    return section_response(request, sitemap_section(page), SITEMAP_CONTENT_TYPE, render)
@@ -1,3 +1,1084 @@
-from django.test import TestCase
+import datetime
+import email
+import glob
+import gzip
+import io
+import json
+import os
+import pstats
+import re
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import uuid
+import zlib
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.http import HttpRequest
+from django.http.multipartparser import MultiPartParser
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.template import engines
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from vacancy import backups, catalog, locations, metrics, prerender, ratelimit, resume_search, similarity, warmup
+from vacancy.changes import ChangeFeed, prune
+from vacancy.search import matches, normalize_query, search_vacancies
+from vacancy.models import (
+    Application, ArchivedApplication, ArchivedVacancy, ChangeConsumer, ChangeLogEntry, Company, CompanyForm, Location,
+    LogoField, Resume, ResumeTerm, SavedSearch, SimilarityRefresh, SimilarVacancy, Speciality, Vacancy, VacancyBucket,
+    VacancySignature, vacancy_expiry_date,
+)
+from vacancy.routers import healthy_replicas, mark_replica_synced
+from vacancy.uploads import LimitedTemporaryFileUploadHandler
+
+
+class FixturesMixin:
+    """
+    Общая подготовка: пустой кеш (кеш объектов и счетчики лимитов общие для
+    тестов, а id записей повторяются), временный каталог, специализация и компания.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.speciality = Speciality.objects.create(title='Бэкенд', code='backend')
+        self.company = Company.objects.create(name='Компания', logo='company_images/logo.png')
+
+    def override_settings(self, **options):
+        settings_override = override_settings(**options)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_vacancy(self, title='Python разработчик', **fields):
+        fields.setdefault('text', 'Описание')
+        fields.setdefault('speciality', self.speciality)
+        fields.setdefault('company', self.company)
+        return Vacancy.objects.create(title=title, **fields)
+
+    def apply(self, vacancy, number=1, client=None, idempotency_key=None):
+        response = (client or self.client).post('/vacancies/{}/'.format(vacancy.id), {
+            'written_username': 'Соискатель {}'.format(number),
+            'written_phone': '8900000{:04d}'.format(number),
+            'written_cover_letter': 'Письмо',
+            'idempotency_key': str(idempotency_key or uuid.uuid4()),
+        })
+        self.assertEqual(response.status_code, 302)
+        return response
+
+
+class VacancyTestCase(FixturesMixin, TestCase):
+    pass
+
+
+class VacancyTransactionTestCase(FixturesMixin, TransactionTestCase):
+    pass
+
+
+def use_file_database(test_case):
+    """
+    Тестовая база SQLite живет в памяти, а резервному копированию нужен файл:
+    на время теста основная база копируется во временный файл и подменяется им.
+    """
+    directory = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, directory)
+    path = os.path.join(directory, 'db.sqlite3')
+    connection.ensure_connection()
+    memory = connection.connection
+    target = sqlite3.connect(path)
+    try:
+        memory.backup(target)
+    finally:
+        target.close()
+    # Соединение с базой в памяти не закрывается: вместе с ним пропала бы сама база
+    name = connection.settings_dict['NAME']
+    connection.connection = None
+    connection.settings_dict['NAME'] = path
+
+    def restore():
+        connection.close()
+        connection.settings_dict['NAME'] = name
+        connection.connection = memory
+
+    test_case.addCleanup(restore)
+
+
+def read_snapshot(path):
+    if path.endswith('.gz'):
+        unpacked = path[:-len('.gz')]
+        with gzip.open(path, 'rb') as packed, open(unpacked, 'wb') as raw:
+            shutil.copyfileobj(packed, raw)
+        path = unpacked
+    snapshot = sqlite3.connect(path)
+    try:
+        integrity = snapshot.execute('PRAGMA integrity_check').fetchone()[0]
+        application_ids = {row[0] for row in snapshot.execute('SELECT id FROM vacancy_application')}
+        logged_ids = {
+            row[0] for row in snapshot.execute(
+                "SELECT object_id FROM vacancy_changelogentry WHERE model = 'application' AND action = 'save'"
+            )
+        }
+        counted = snapshot.execute('SELECT COALESCE(SUM(applications), 0) FROM vacancy_vacancydailystats').fetchone()[0]
+    finally:
+        snapshot.close()
+    return integrity, application_ids, logged_ids, counted
+
+
+@override_settings(RATE_LIMITS={})
+class BackupTests(VacancyTransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.vacancy = self.create_vacancy()
+        use_file_database(self)
+
+    def submit_application(self, client, number):
+        self.apply(self.vacancy, number, client)
+
+    def test_backup_during_applications(self):
+        for number in range(5):
+            self.submit_application(Client(), number)
+        done = threading.Event()
+        submitted = []
+        errors = []
+
+        def submit():
+            client = Client()
+            try:
+                while not done.is_set():
+                    self.submit_application(client, 100 + len(submitted))
+                    submitted.append(1)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=submit)
+        writer.start()
+        try:
+            path = backups.backup('default', self.directory, pages=1, sleep=0.005)
+        finally:
+            done.set()
+            writer.join()
+
+        self.assertEqual(errors, [])
+        self.assertTrue(submitted, 'отклики во время копирования не отправлялись')
+        integrity, application_ids, logged_ids, counted = read_snapshot(path)
+        self.assertEqual(integrity, 'ok')
+        # Отклик, запись журнала и дневная статистика пишутся одной транзакцией:
+        # в копии либо есть все три, либо нет ни одного
+        self.assertGreaterEqual(len(application_ids), 5)
+        self.assertLessEqual(len(application_ids), Application.objects.count())
+        self.assertEqual(application_ids, logged_ids)
+        self.assertEqual(counted, len(application_ids))
+        self.assertEqual(application_ids, set(range(min(application_ids), max(application_ids) + 1)))
+
+    def test_compressed_backup(self):
+        self.submit_application(Client(), 1)
+        path = backups.backup('default', self.directory, compress=True)
+        self.assertTrue(path.endswith('.sqlite3.gz'))
+        integrity, application_ids, logged_ids, counted = read_snapshot(path)
+        self.assertEqual(integrity, 'ok')
+        self.assertEqual(len(application_ids), 1)
+
+    def test_restore_db_from_snapshot(self):
+        self.submit_application(Client(), 1)
+        path = backups.backup('default', self.directory)
+        self.submit_application(Client(), 2)
+        self.assertEqual(Application.objects.count(), 2)
+
+        call_command('restore_db', path, '--noinput', stdout=io.StringIO())
+        self.assertEqual(list(Application.objects.values_list('written_phone', flat=True)), ['89000000001'])
+
+    def test_restore_db_latest_compressed_snapshot(self):
+        backups.backup('default', self.directory, compress=True)
+        os.rename(backups.snapshots(self.directory)[-1], os.path.join(self.directory, 'db-20000101-000000.sqlite3.gz'))
+        self.submit_application(Client(), 1)
+        latest = backups.backup('default', self.directory, compress=True)
+        self.submit_application(Client(), 2)
+
+        call_command('restore_db', '--noinput', '--dir', self.directory, stdout=io.StringIO())
+        self.assertEqual(backups.snapshots(self.directory)[-1], latest)
+        self.assertEqual(Application.objects.count(), 1)
+
+    def test_restore_db_errors(self):
+        with self.assertRaisesMessage(CommandError, 'Снимков не найдено'):
+            call_command('restore_db', '--noinput', '--dir', self.directory)
+        with self.assertRaisesMessage(CommandError, 'не найден'):
+            call_command('restore_db', os.path.join(self.directory, 'missing.sqlite3'), '--noinput')
+
+        broken = os.path.join(self.directory, 'db-broken.sqlite3')
+        with open(broken, 'wb') as output:
+            output.write(b'SQLite format 3\x00' + b'\x00' * 1000)
+        self.submit_application(Client(), 1)
+        with self.assertRaisesMessage(CommandError, 'повреждена'):
+            call_command('restore_db', broken, '--noinput')
+        self.assertEqual(Application.objects.count(), 1)
+
+
+class AdminSearchTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.vacancy = self.create_vacancy(company=Company.objects.create(name='Рога и копыта'))
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+
+    def search(self, term):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/vacancy/vacancy/', {'q': term})
+        self.assertFalse([query for query in queries if 'LIKE' in query['sql']])
+        return list(response.context['cl'].result_list)
+
+    def test_exact_company_name(self):
+        self.assertEqual(self.search('Рога и копыта'), [self.vacancy])
+        self.assertEqual(self.search('Рога'), [])
+
+    def test_id(self):
+        self.assertEqual(self.search(str(self.vacancy.id)), [self.vacancy])
+        self.assertEqual(self.search(str(self.vacancy.id + 1)), [])
+
+
+@override_settings(RATE_LIMITS={})
+class ArchiveTests(VacancyTestCase):
+
+    def test_application_keeps_date_and_key(self):
+        key = uuid.uuid4()
+        self.apply(self.create_vacancy(), idempotency_key=key)
+        application = Application.objects.get()
+
+        with override_settings(VACANCY_LIFETIME_DAYS=-1):
+            call_command('archive_vacancies', stdout=io.StringIO())
+
+        self.assertFalse(Application.objects.exists())
+        archived = ArchivedApplication.objects.get(id=application.id)
+        self.assertEqual(archived.idempotency_key, key)
+        self.assertEqual(archived.created_at, application.created_at)
+
+    def test_only_active_vacancies_are_public(self):
+        active = self.create_vacancy('Открытая')
+        closed = self.create_vacancy('Закрытая', is_closed=True)
+        expired = self.create_vacancy('Устаревшая')
+        Vacancy.objects.filter(id=expired.id).update(published_at=vacancy_expiry_date() - datetime.timedelta(days=1))
+        expired.refresh_from_db()
+
+        self.assertEqual(
+            [active.status, closed.status, expired.status], [Vacancy.ACTIVE, Vacancy.CLOSED, Vacancy.EXPIRED],
+        )
+        self.assertEqual(list(Vacancy.objects.active()), [active])
+        self.assertEqual(self.client.get('/vacancies/{}/'.format(active.id)).status_code, 200)
+        self.assertEqual(self.client.get('/vacancies/{}/'.format(closed.id)).status_code, 404)
+        self.assertEqual(self.client.get('/vacancies/{}/'.format(expired.id)).status_code, 404)
+
+    def test_archives_expired_vacancies_in_batches(self):
+        fresh = self.create_vacancy('Свежая')
+        expired = [self.create_vacancy('Устаревшая {}'.format(number)) for number in range(3)]
+        for number, vacancy in enumerate(expired, start=1):
+            self.apply(vacancy, number=number)
+        self.apply(fresh, number=4)
+        Vacancy.objects.exclude(id=fresh.id).update(published_at=vacancy_expiry_date() - datetime.timedelta(days=1))
+
+        output = io.StringIO()
+        call_command('archive_vacancies', batch_size=2, stdout=output)
+
+        self.assertIn('В архив перенесено вакансий: 3', output.getvalue())
+        self.assertEqual(list(Vacancy.objects.all()), [fresh])
+        self.assertEqual(sorted(ArchivedVacancy.objects.values_list('title', flat=True)), [
+            'Устаревшая 0', 'Устаревшая 1', 'Устаревшая 2',
+        ])
+        self.assertEqual(ArchivedApplication.objects.count(), 3)
+        self.assertEqual(list(Application.objects.values_list('vacancy_id', flat=True)), [fresh.id])
+
+
+@override_settings(RATE_LIMITS={})
+class CatalogTests(VacancyTestCase):
+
+    def age_log(self):
+        # Записи созданы только что и еще не считаются зафиксированными
+        ChangeLogEntry.objects.update(created_at=timezone.now() - datetime.timedelta(minutes=1))
+
+    def last_entry_id(self):
+        return ChangeLogEntry.objects.latest('id').id
+
+    def test_poll_applies_changes_incrementally(self):
+        first = self.create_vacancy()
+        self.age_log()
+        vacancy_catalog = catalog.VacancyCatalog.load()
+        self.assertEqual(vacancy_catalog.columns['id'].tolist(), [first.id])
+
+        second = self.create_vacancy()
+        first.salary_max = 300000
+        first.save()
+        self.apply(first)
+        self.age_log()
+
+        self.assertTrue(vacancy_catalog.poll())
+        self.assertEqual(vacancy_catalog.columns['id'].tolist(), [first.id, second.id])
+        self.assertEqual(vacancy_catalog.columns['salary_max'].tolist(), [300000, -1])
+        # Позиция проходит и записи откликов, которые каталогу не нужны
+        self.assertEqual(vacancy_catalog.position, self.last_entry_id())
+
+    def test_poll_after_consumer_passed_position(self):
+        self.create_vacancy()
+        self.age_log()
+        vacancy_catalog = catalog.VacancyCatalog.load()
+        self.apply(Vacancy.objects.get())
+        self.age_log()
+        feed = ChangeFeed('test')
+        feed.ack(feed.read())
+
+        self.assertTrue(vacancy_catalog.poll())
+        self.assertTrue(vacancy_catalog.poll())
+        self.assertEqual(vacancy_catalog.position, self.last_entry_id())
+
+    def test_poll_requires_reload_after_prune(self):
+        self.age_log()
+        vacancy_catalog = catalog.VacancyCatalog.load()
+        self.create_vacancy()
+        self.create_vacancy()
+        self.age_log()
+        feed = ChangeFeed('test')
+        feed.ack(feed.read())
+        prune()
+
+        self.assertFalse(vacancy_catalog.poll())
+        reloaded = catalog.VacancyCatalog.load()
+        self.assertEqual(len(reloaded), 2)
+        self.assertEqual(reloaded.position, self.last_entry_id())
+        self.assertTrue(reloaded.poll())
+
+
+class ChangeFeedTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ChangeLogEntry.objects.all().delete()
+
+    def log(self, entry_id, age=datetime.timedelta(minutes=1)):
+        ChangeLogEntry.objects.create(id=entry_id, model='vacancy', object_id=entry_id, action=ChangeLogEntry.SAVE)
+        ChangeLogEntry.objects.filter(id=entry_id).update(created_at=timezone.now() - age)
+
+    def read(self, feed):
+        entries = feed.read()
+        feed.ack(entries)
+        return [entry.id for entry in entries]
+
+    def test_stops_at_gap_until_it_commits(self):
+        for entry_id in (10, 11, 13):
+            self.log(entry_id)
+        feed = ChangeFeed('test')
+
+        self.assertEqual(self.read(feed), [10, 11])
+        self.assertEqual(self.read(feed), [])
+        self.assertEqual(ChangeConsumer.objects.get(name='test').position, 11)
+
+        self.log(12)
+        self.assertEqual(self.read(feed), [12, 13])
+
+    def test_stops_at_fresh_entry(self):
+        self.log(10)
+        self.log(11, age=datetime.timedelta())
+        self.log(12)
+        feed = ChangeFeed('test')
+
+        self.assertEqual(self.read(feed), [10])
+        self.assertEqual(self.read(feed), [])
+
+    def test_skips_rolled_back_gap(self):
+        self.log(10, age=datetime.timedelta(minutes=10))
+        self.log(12, age=datetime.timedelta(minutes=10))
+
+        self.assertEqual(self.read(ChangeFeed('test')), [10, 12])
+
+    def test_prune_keeps_last_read_entry(self):
+        for entry_id in (10, 11, 12):
+            self.log(entry_id)
+        feed = ChangeFeed('test')
+        feed.ack(feed.read()[:2])
+
+        self.assertEqual(prune(), 1)
+        self.assertEqual(list(ChangeLogEntry.objects.values_list('id', flat=True).order_by('id')), [11, 12])
+        self.assertEqual(self.read(ChangeFeed('late')), [11, 12])
+
+
+class DedupTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        words = ['навык{}'.format(number) for number in range(60)]
+        self.original = self.create_vacancy(text=' '.join(words))
+        self.copy = self.create_vacancy(text=' '.join(words[:-1] + ['другое']))
+        self.other = self.create_vacancy('Аналитик', text=' '.join(reversed(words)))
+        self.copy_of_copy = self.create_vacancy(text=' '.join(['Срочно'] + words[1:]))
+
+    def originals(self):
+        return dict(Vacancy.objects.values_list('id', 'duplicate_of'))
+
+    def test_duplicates_found_on_save(self):
+        self.assertEqual(self.originals(), {
+            self.original.id: None,
+            self.copy.id: self.original.id,
+            self.other.id: None,
+            self.copy_of_copy.id: self.original.id,
+        })
+
+    def test_duplicates_hidden_while_original_open(self):
+        self.assertEqual(set(Vacancy.objects.active().collapsed()), {self.original, self.other})
+
+        self.original.is_closed = True
+        self.original.save()
+
+        self.assertEqual(set(Vacancy.objects.active().collapsed()), {self.copy, self.other, self.copy_of_copy})
+
+    def test_command_matches_incremental_detection(self):
+        expected = self.originals()
+        Vacancy.objects.update(duplicate_of=None)
+        VacancySignature.objects.all().delete()
+        VacancyBucket.objects.all().delete()
+        logged = ChangeLogEntry.objects.count()
+
+        output = io.StringIO()
+        call_command('deduplicate_vacancies', batch_size=2, stdout=output)
+
+        self.assertIn('Обработано вакансий: 4, изменено: 2', output.getvalue())
+        self.assertEqual(self.originals(), expected)
+        self.assertEqual(ChangeLogEntry.objects.count(), logged + 2)
+
+
+@override_settings(RATE_LIMITS={})
+class IdempotencyTests(VacancyTestCase):
+
+    def test_replayed_key_creates_one_application(self):
+        vacancy = self.create_vacancy()
+        key = uuid.uuid4()
+
+        self.apply(vacancy, idempotency_key=key)
+        response = self.apply(vacancy, idempotency_key=key)
+
+        self.assertEqual(response['Location'], '/vacancies/{}/send'.format(vacancy.id))
+        self.assertEqual(Application.objects.get().idempotency_key, key)
+
+    def test_user_applies_once_per_vacancy(self):
+        vacancy = self.create_vacancy()
+        self.client.force_login(User.objects.create_user('user', password='password'))
+        first_key = uuid.uuid4()
+
+        self.apply(vacancy, idempotency_key=first_key)
+        self.apply(vacancy, number=2)
+
+        application = Application.objects.get()
+        self.assertEqual(application.idempotency_key, first_key)
+        self.assertEqual(application.written_username, 'Соискатель 1')
+
+
+class LocationTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, location in (('Москва', 'г. Москва'), ('Химки', 'khimki'), ('Тула', 'Тула')):
+            company = Company.objects.create(name='Компания {}'.format(name), location=location)
+            self.create_vacancy('Вакансия {}'.format(name), company=company)
+
+    def test_company_city_resolved(self):
+        self.assertEqual(
+            dict(Company.objects.values_list('name', 'city__name')),
+            {'Компания': None, 'Компания Москва': 'Москва', 'Компания Химки': 'Химки', 'Компания Тула': 'Тула'},
+        )
+
+    def test_locations_within_radius(self):
+        moscow = locations.find('Мск')
+        names = {
+            radius: set(Location.objects.filter(id__in=locations.locations_within(moscow, radius))
+                        .values_list('name', flat=True))
+            for radius in (50, 200)
+        }
+
+        self.assertTrue({'Москва', 'Химки', 'Подольск'} <= names[50])
+        self.assertNotIn('Тула', names[50])
+        self.assertIn('Тула', names[200])
+        self.assertAlmostEqual(locations.distance_km(55.7558, 37.6173, 55.7963, 49.1088), 720, delta=10)
+
+    def test_box_crosses_antimeridian(self):
+        south, north, longitudes = locations.box_ranges(65.0, 179.5, 100)
+
+        # 100 км на широте 65 градусов - около 2.13 градуса долготы
+        self.assertEqual((round(south, 1), round(north, 1)), (64.1, 65.9))
+        longitudes = [(round(west, 1), round(east, 1)) for west, east in longitudes]
+        self.assertEqual(longitudes, [(177.4, 180), (-180, -178.4)])
+
+    def test_vacancies_near_city(self):
+        response = self.client.get('/vacancies/', {'city': 'moscow', 'radius': 50})
+
+        self.assertContains(response, 'Вакансия Москва')
+        self.assertContains(response, 'Вакансия Химки')
+        self.assertNotContains(response, 'Вакансия Тула')
+        self.assertNotContains(self.client.get('/vacancies/', {'city': 'Нигдеград'}), 'Вакансия')
+
+
+@override_settings(LOGO_MAX_UPLOAD_SIZE=1024)
+class LogoUploadTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('employer', password='employer')
+        self.company.owner = self.user
+        self.company.save()
+        self.client.force_login(self.user)
+
+    def test_oversized_logo_stops_upload(self):
+        response = self.client.post('/mycompany/edit/', {
+            'name': 'Новое название',
+            'logo': SimpleUploadedFile('logo.png', b'0' * 200 * 1024, content_type='image/png'),
+            'employee_count': 10,
+            'location': 'Москва',
+            'description': 'Описание',
+        })
+
+        self.assertRedirects(response, '/mycompany/edit/', fetch_redirect_response=False)
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.name, 'Компания')
+        self.assertEqual(self.company.logo.name, 'company_images/logo.png')
+        self.assertContains(self.client.get('/mycompany/edit/'), 'изменения не сохранены')
+
+    def test_body_not_read_past_limit(self):
+        body = encode_multipart(BOUNDARY, {
+            'logo': SimpleUploadedFile('logo.png', b'0' * 200 * 1024, content_type='image/png'),
+            'description': 'Описание',
+        })
+        stream = io.BytesIO(body)
+        request = HttpRequest()
+        parser = MultiPartParser(
+            {'CONTENT_TYPE': MULTIPART_CONTENT, 'CONTENT_LENGTH': len(body)},
+            stream, [LimitedTemporaryFileUploadHandler(request)],
+        )
+        post, files = parser.parse()
+
+        self.assertEqual(request.rejected_uploads, ['logo'])
+        self.assertNotIn('logo', files)
+        self.assertNotIn('description', post)
+        self.assertLess(stream.tell(), 100 * 1024)
+
+    def test_dimensions_checked_by_header(self):
+        # Только заголовок PNG: декодировать картинку 5000x5000 было бы нечего
+        header = b'\x89PNG\r\n\x1a\n' + struct.pack('>I4sIIBBBBB', 13, b'IHDR', 5000, 5000, 8, 6, 0, 0, 0)
+        header += struct.pack('>I', zlib.crc32(header[12:]))
+        header += struct.pack('>I4sI', 0, b'IEND', zlib.crc32(b'IEND'))
+        form = CompanyForm({'name': 'Компания'}, {'logo': SimpleUploadedFile('logo.png', header)})
+
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['logo'], ['Изображение должно быть не больше 4000x4000 пикселей'])
+
+    def test_admin_checks_logo_by_header(self):
+        request = HttpRequest()
+        request.user = self.user
+        form_class = admin.site._registry[Company].get_form(request)
+
+        self.assertIsInstance(form_class.base_fields['logo'], LogoField)
+
+
+@override_settings(MEMORY_TRACKING_SAMPLE_RATE=1)
+class MemoryStatsTests(VacancyTestCase):
+
+    def test_metrics_show_view_peaks(self):
+        self.create_vacancy()
+        self.client.get('/vacancies/')
+        staff = User.objects.create_user('staff', password='password', is_staff=True)
+        self.client.force_login(staff)
+
+        memory = self.client.get('/api/metrics/').json()['memory']
+
+        self.assertEqual(memory['pid'], os.getpid())
+        self.assertGreater(memory['rss'], 0)
+        stats = memory['views']['vacancies']
+        self.assertGreaterEqual(stats['requests'], 1)
+        self.assertGreaterEqual(stats['max'], stats['mean'])
+
+    def test_metrics_hidden_from_users(self):
+        self.client.force_login(User.objects.create_user('user', password='password'))
+
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+
+class MetricsTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_incr_counts(self):
+        metrics.incr('test.requests')
+        metrics.incr('test.requests', 2)
+
+        self.assertEqual(metrics.snapshot(['test.requests', 'test.errors']), {'test.requests': 3, 'test.errors': 0})
+
+
+class PrerenderTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.override_settings(PRERENDER_DIR=self.directory)
+        self.vacancy = self.create_vacancy()
+        self.path = '/vacancies/{}/'.format(self.vacancy.id)
+        call_command('prerender_pages', '--all', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(prerender.page_file(self.path)))
+
+    def test_closed_in_admin(self):
+        admin_user = User.objects.create_superuser('admin', password='admin')
+        self.client.force_login(admin_user)
+        self.client.post('/admin/vacancy/vacancy/', {
+            'action': 'close_vacancies',
+            '_selected_action': [self.vacancy.id],
+        })
+        self.client.logout()
+
+        self.assertFalse(os.path.exists(prerender.page_file(self.path)))
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+
+    # Срок жизни меньше нуля: все вакансии, опубликованные сегодня, уже устарели
+    @override_settings(VACANCY_LIFETIME_DAYS=-1)
+    def test_expired_removed_by_scheduled_run(self):
+        call_command('prerender_pages', stdout=io.StringIO())
+
+        self.assertFalse(os.path.exists(prerender.page_file(self.path)))
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+        self.assertNotContains(self.client.get('/vacancies/'), self.path)
+
+    # Срок жизни меньше нуля: все вакансии, опубликованные сегодня, уже устарели
+    @override_settings(VACANCY_LIFETIME_DAYS=-1)
+    def test_expired_removed_by_full_run(self):
+        call_command('prerender_pages', '--all', stdout=io.StringIO())
+
+        self.assertFalse(os.path.exists(prerender.page_file(self.path)))
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+
+
+class ProfilingTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.override_settings(PROFILING_DIR=self.directory, PROFILING_REQUESTS_PER_DUMP=2)
+        self.create_vacancy()
+
+    def test_staff_profiles_are_dumped_per_view(self):
+        self.client.force_login(User.objects.create_user('staff', password='password', is_staff=True))
+
+        first = self.client.get('/vacancies/', {'profile': 1})
+        second = self.client.get('/vacancies/', HTTP_X_PROFILE='1')
+
+        self.assertNotIn('X-Profile-Dump', first)
+        name = os.path.join(self.directory, second['X-Profile-Dump'])
+        self.assertEqual(os.path.dirname(name), os.path.join(self.directory, 'vacancies'))
+        self.assertGreater(pstats.Stats(name + '.prof').total_calls, 0)
+        self.assertTrue(os.path.exists(name + '.collapsed'))
+        with open(name + '.sql.json') as dump:
+            profiled = json.load(dump)
+        self.assertEqual([request['path'] for request in profiled], ['/vacancies/?profile=1', '/vacancies/'])
+        self.assertTrue(all(request['queries'] for request in profiled))
+
+    def test_not_profiled_for_users(self):
+        self.client.force_login(User.objects.create_user('user', password='password'))
+
+        for _ in range(2):
+            response = self.client.get('/vacancies/', {'profile': 1})
+
+        self.assertNotIn('X-Profile-Dump', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+@override_settings(RESUME_SEARCH_PAGE_SIZE=2)
+class ResumeSearchTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.resumes = [
+            self.create_resume('Анна', 'Django, PostgreSQL', grade='SENIOR', salary=250000),
+            self.create_resume('Борис', 'Django и Celery', grade='MIDDLE', salary=150000),
+            self.create_resume('Вера', 'PostgreSQL', grade='MIDDLE', salary=120000, status='NOT LOOKING FOR'),
+            self.create_resume('Глеб', 'Вёрстка', education='Django курсы', grade='JUNIOR'),
+        ]
+
+    def create_resume(self, name, experience, **fields):
+        user = User.objects.create_user(name, password='password')
+        return Resume.objects.create(
+            name=name, surname='Иванов', speciality=self.speciality, user=user, experience=experience, **fields,
+        )
+
+    def names(self, **filters):
+        resumes, next_after = resume_search.search_resumes(**filters)
+        return [resume.name for resume in resumes], next_after
+
+    def test_filters_and_terms(self):
+        self.assertEqual(self.names(query='celery')[0], ['Борис'])
+        self.assertEqual(self.names(query='DJANGO postgresql')[0], ['Анна'])
+        self.assertEqual(self.names(query='вёрстка курсы')[0], ['Глеб'])
+        self.assertEqual(self.names(grade='MIDDLE', salary_max=130000)[0], ['Вера'])
+        self.assertEqual(self.names(status='NOT LOOKING FOR', speciality='backend')[0], ['Вера'])
+        self.assertEqual(self.names(speciality='frontend')[0], [])
+
+    def test_keyset_pages(self):
+        names, next_after = self.names(query='django')
+        self.assertEqual((names, next_after), (['Глеб', 'Борис'], self.resumes[1].id))
+        self.assertEqual(self.names(query='django', after=next_after), (['Анна'], None))
+
+    def test_index_follows_edits(self):
+        resume = self.resumes[0]
+        resume.experience = 'FastAPI'
+        resume.save()
+
+        self.assertEqual(self.names(query='fastapi')[0], ['Анна'])
+        self.assertEqual(self.names(query='postgresql')[0], ['Вера'])
+        indexed = set(ResumeTerm.objects.values_list('resume_id', 'term'))
+        call_command('rebuild_resume_index', stdout=io.StringIO())
+        self.assertEqual(set(ResumeTerm.objects.values_list('resume_id', 'term')), indexed)
+
+    def test_view_for_employers(self):
+        employer = User.objects.create_user('employer', password='password')
+        self.client.force_login(employer)
+        self.assertRedirects(self.client.get('/resumes/'), '/mycompany/', fetch_redirect_response=False)
+
+        self.company.owner = employer
+        self.company.save()
+        response = self.client.get('/resumes/', {'query': 'django'})
+
+        self.assertContains(response, 'Глеб Иванов')
+        self.assertContains(response, 'Борис Иванов')
+        self.assertNotContains(response, 'Анна Иванов')
+        self.assertContains(response, '?query=django&amp;after={}'.format(self.resumes[1].id))
+
+        response = self.client.get('/resumes/', {'query': 'django', 'after': self.resumes[1].id})
+        self.assertContains(response, 'Анна Иванов')
+        self.assertNotContains(response, 'Дальше')
+
+
+class SalaryStatsTests(VacancyTestCase):
+
+    def stats(self, location=''):
+        response = self.client.get('/api/salaries/backend/', {'location': location})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_incremental_stats_match_rebuild(self):
+        self.company.location = 'Москва'
+        self.company.save()
+        self.create_vacancy(salary_min=100000, salary_max=150000)
+        changed = self.create_vacancy(salary_min=50000)
+        removed = self.create_vacancy(salary_max=300000)
+        self.create_vacancy()
+        other = Company.objects.create(name='Другая', location='Казань')
+        self.create_vacancy(company=other, salary_min=80000)
+        user = User.objects.create_user('user', password='password')
+        Resume.objects.create(name='Иван', surname='Иванов', speciality=self.speciality, user=user, salary=120000)
+
+        changed.salary_min = 200000
+        changed.save()
+        removed.delete()
+        other.location = 'Москва'
+        other.save()
+
+        moscow = self.stats('Москва')['vacancy']
+        self.assertEqual((moscow['count'], moscow['mean']), (3, (125000 + 200000 + 80000) // 3))
+        self.assertIsNone(self.stats('Казань')['vacancy'])
+        self.assertEqual(self.stats()['resume']['count'], 1)
+        self.assertLessEqual(moscow['p25'], moscow['p50'])
+        self.assertLessEqual(moscow['p50'], moscow['p75'])
+
+        incremental = {location: self.stats(location) for location in ('', 'Москва', 'Казань')}
+        call_command('rebuild_salary_stats', stdout=io.StringIO())
+        self.assertEqual({location: self.stats(location) for location in incremental}, incremental)
+
+    def test_unknown_speciality(self):
+        self.assertEqual(self.client.get('/api/salaries/unknown/').status_code, 404)
+
+
+@override_settings(SITE_URL='https://example.com')
+class SavedSearchTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.override_settings(SAVED_SEARCH_OUTBOX_DIR=self.directory)
+        self.user = User.objects.create_user('seeker', email='seeker@example.com', password='seeker')
+        Resume.objects.create(name='Иван', surname='Иванов', speciality=self.speciality, user=self.user)
+        # Первый запуск только запоминает позицию
+        call_command('match_saved_searches', stdout=io.StringIO())
+
+    def digests(self):
+        call_command('match_saved_searches', stdout=io.StringIO())
+        digests = {}
+        for path in glob.glob(os.path.join(self.directory, '*.log')):
+            with open(path, 'rb') as log:
+                # В файле outbox письма разделены строкой из дефисов
+                for raw in log.read().split(b'-' * 79 + b'\n'):
+                    if raw.strip():
+                        message = email.message_from_bytes(raw)
+                        digests[message['To']] = message.get_payload(decode=True).decode()
+        return digests
+
+    def test_same_matching_as_site_search(self):
+        emails = {}
+        for number, query in enumerate(SEARCH_QUERIES):
+            user = User.objects.create_user('seeker{}'.format(number), email='seeker{}@example.com'.format(number))
+            Resume.objects.create(name='Иван', surname='Иванов', speciality=self.speciality, user=user)
+            SavedSearch.objects.create(user=user, query=query)
+            emails[query] = user.email
+        vacancies = [self.create_vacancy(**fields) for fields in SEARCH_VACANCIES]
+
+        digests = self.digests()
+        for query, user_email in emails.items():
+            with self.subTest(query=query):
+                rows, status = search_vacancies(query)
+                found = {row.id for row in rows}
+                body = digests.get(user_email, '')
+                for vacancy in vacancies:
+                    url = 'https://example.com/vacancies/{}/'.format(vacancy.id)
+                    self.assertEqual(url in body, vacancy.id in found, url)
+
+    def test_short_query_rejected(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/mysearches/', {'query': 'ab', 'speciality': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(SavedSearch.objects.exists())
+
+
+def content(response):
+    if response.streaming:
+        return b''.join(response.streaming_content).decode()
+    return response.content.decode()
+
+
+# Вакансии и запросы для проверки поиска на сайте и сохраненных поисков:
+# запрос -> номера вакансий SEARCH_VACANCIES, которые он находит
+SEARCH_VACANCIES = (
+    {'title': 'Старший Python разработчик', 'skills': 'Django', 'text': 'Описание'},
+    {'title': 'Бэкенд', 'skills': '', 'text': 'Ищем в команду PYTHON РАЗРАБОТЧИКА'},
+    {'title': 'Python', 'skills': 'SQL', 'text': 'Ищем разработчика'},
+    {'title': 'Аналитик данных', 'skills': 'Ёмкие отчеты', 'text': 'Описание'},
+)
+SEARCH_QUERIES = {
+    'Разработчик': {0, 1, 2},
+    'РАЗРАБОТЧИКА': {1, 2},
+    'python разработчик': {0, 1},
+    '  Python   Разработчик ': {0, 1},
+    'ёмкие': {3},
+    'ЕМКИЕ': set(),
+    'sql': {2},
+}
+
+
+class SearchTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.vacancies = [self.create_vacancy(**fields) for fields in SEARCH_VACANCIES]
+
+    def found(self, query):
+        rows, status = search_vacancies(query)
+        self.assertEqual(status, 'ok')
+        numbers = {vacancy.id: number for number, vacancy in enumerate(self.vacancies)}
+        return {numbers[row.id] for row in rows}
+
+    def test_mixed_case_queries(self):
+        for query, expected in SEARCH_QUERIES.items():
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), expected)
+
+    def test_in_memory_matching_agrees(self):
+        for query, expected in SEARCH_QUERIES.items():
+            with self.subTest(query=query):
+                matched = {
+                    number for number, fields in enumerate(SEARCH_VACANCIES)
+                    if matches(normalize_query(query), fields)
+                }
+                self.assertEqual(matched, expected)
+
+    def test_search_page(self):
+        response = self.client.get('/vacancies/search/', {'search': 'Разработчик'})
+        self.assertContains(response, 'Старший Python разработчик')
+        self.assertNotContains(response, 'Аналитик данных')
+
+
+class SitemapFeedTests(VacancyTestCase):
+
+    def test_sitemap_lists_active_vacancies(self):
+        active = self.create_vacancy()
+        closed = self.create_vacancy('Закрытая вакансия', is_closed=True)
+
+        body = content(self.client.get('/sitemap-vacancies-1.xml'))
+        self.assertIn('/vacancies/{}/</loc>'.format(active.id), body)
+        self.assertNotIn('/vacancies/{}/</loc>'.format(closed.id), body)
+        self.assertIn('/sitemap-vacancies-1.xml', content(self.client.get('/sitemap.xml')))
+
+    def test_conditional_get_until_section_changes(self):
+        self.create_vacancy()
+        response = self.client.get('/feeds/cat/backend/')
+        self.assertIn('Python разработчик', content(response))
+
+        self.assertEqual(self.client.get('/feeds/cat/backend/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.create_vacancy('Go разработчик')
+        changed = self.client.get('/feeds/cat/backend/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertIn('Go разработчик', content(changed))
+
+    def test_unknown_speciality_feed(self):
+        self.assertEqual(self.client.get('/feeds/cat/missing/').status_code, 404)
+
+
+@override_settings(RATE_LIMITS={'vacancies_search': {'GET': (2, 60)}})
+class RateLimitTests(VacancyTestCase):
+
+    def test_rejects_with_retry_after(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/vacancies/search/', {'s': 'python'}).status_code, 200)
+
+        response = self.client.get('/vacancies/search/', {'s': 'python'})
+
+        self.assertEqual(response.status_code, 429)
+        # Жетон пополняется раз в 60 / 2 секунд
+        self.assertIn(int(response['Retry-After']), (29, 30))
+        other = Client(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.get('/vacancies/search/', {'s': 'python'}).status_code, 200)
+
+    def test_bucket_refills_one_token_per_interval(self):
+        with mock.patch('vacancy.ratelimit.time.time') as clock:
+            clock.return_value = 1000.0
+            self.assertEqual([ratelimit.consume('client', 'route', 3, 60) for _ in range(4)], [0, 0, 0, 20])
+            # Отказ не расходует жетон: через 20 секунд появляется ровно один
+            clock.return_value = 1020.0
+            self.assertEqual([ratelimit.consume('client', 'route', 3, 60) for _ in range(2)], [0, 20])
+            # Простаивающее ведро не копит жетонов сверх объема
+            clock.return_value = 2000.0
+            self.assertEqual([ratelimit.consume('client', 'route', 3, 60) for _ in range(4)], [0, 0, 0, 20])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_MAX_LAG=10)
+class ReplicaTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'replica.sqlite3')
+        connections.databases['replica1'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.path}
+        self.addCleanup(connections.databases.pop, 'replica1')
+
+    def test_unsynced_replica_is_stale(self):
+        self.assertEqual(healthy_replicas(), [])
+        open(self.path, 'wb').close()
+        os.utime(self.path, (0, 0))
+        self.assertEqual(healthy_replicas(), [])
+
+    def test_sync_seen_by_other_processes(self):
+        open(self.path, 'wb').close()
+        mark_replica_synced('replica1')
+        # Процесс с другим кешом видит синхронизацию по времени изменения файла
+        cache.clear()
+        self.assertEqual(healthy_replicas(), ['replica1'])
+        mark_replica_synced('replica1', timestamp=1)
+        self.assertEqual(healthy_replicas(), [])
+
+
+class SimilarityTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.override_settings(SIMILARITY_INDEX_PATH=os.path.join(self.directory, 'similarity.npz'))
+        self.vacancies = [
+            self.create_vacancy('Python разработчик {}'.format(number), skills='Django') for number in range(3)
+        ]
+        similarity.rebuild()
+        self.assertFalse(SimilarityRefresh.objects.exists())
+
+    def similar_ids(self):
+        return set(SimilarVacancy.objects.values_list('vacancy_id', flat=True)) | set(
+            SimilarVacancy.objects.values_list('similar_id', flat=True)
+        )
+
+    def test_deleted_vacancy_dropped(self):
+        deleted_id = self.vacancies[0].id
+        self.vacancies[0].delete()
+        self.assertTrue(SimilarityRefresh.objects.filter(vacancy_id=deleted_id).exists())
+
+        similarity.refresh()
+        self.assertEqual(self.similar_ids(), {vacancy.id for vacancy in self.vacancies[1:]})
+        self.assertNotIn(deleted_id, similarity.SimilarityIndex.load().ids)
+
+    def test_closed_vacancy_dropped(self):
+        # update() сигналов не отправляет: вакансия выпадает из индекса без очереди
+        closed = self.vacancies[0]
+        Vacancy.objects.filter(id=closed.id).update(is_closed=True)
+
+        similarity.refresh()
+        self.assertNotIn(closed.id, self.similar_ids())
+        self.assertEqual(self.similar_ids(), {vacancy.id for vacancy in self.vacancies[1:]})
+
+    # Срок жизни меньше нуля: все вакансии, опубликованные сегодня, уже устарели
+    @override_settings(VACANCY_LIFETIME_DAYS=-1)
+    def test_expired_vacancies_dropped(self):
+        similarity.refresh()
+        self.assertFalse(SimilarVacancy.objects.exists())
+        self.assertEqual(len(similarity.SimilarityIndex.load().ids), 0)
+
+
+class TemplateEngineTests(VacancyTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.override_settings(PRERENDER_DIR=self.directory)
+        self.company.location = 'Москва'
+        self.company.save()
+        self.vacancy = self.create_vacancy(skills='Django, SQL', salary_min=100000, salary_max=150000)
+        self.create_vacancy('Аналитик <данных> & BI', text='Отчеты "как есть"')
+        self.paths = [
+            '/', '/vacancies/', '/vacancies/?city=Москва&radius=10', '/vacancies/cat/backend',
+            '/vacancies/search/?search=python', '/vacancies/{}/'.format(self.vacancy.id),
+            '/companies/{}/'.format(self.company.id),
+        ]
+
+    def render(self, engine, path):
+        with override_settings(PUBLIC_TEMPLATE_ENGINE=engine):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        html = response.content.decode()
+        # Токены CSRF и ключи отправки формы меняются от запроса к запросу
+        html = re.sub(r'name="(csrfmiddlewaretoken|idempotency_key)" value="[^"]*"', r'name="\1"', html)
+        # MarkupSafe и Django по-разному записывают одни и те же символы
+        html = html.replace('&#34;', '&quot;').replace('&#39;', '&#x27;')
+        return re.sub(r'\s+', ' ', re.sub(r'>\s+<', '><', html)).strip()
+
+    def assert_same_html(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.render('jinja2', path), self.render('django', path))
+
+    def test_same_html_for_visitors(self):
+        self.assert_same_html()
+
+    def test_same_html_for_users(self):
+        self.client.force_login(User.objects.create_user('user', password='password'))
+        self.assert_same_html()
+
+
+class WarmupTests(TestCase):
+
+    def test_templates_compiled_by_both_engines(self):
+        jinja2_env = engines['jinja2'].env
+        jinja2_env.cache.clear()
+        cached_loader = engines['django'].engine.template_loaders[0]
+        cached_loader.reset()
+
+        compiled = warmup.compile_templates()
+
+        cached = [template.name for template in jinja2_env.cache.values() if template.name.startswith('vacancy/')]
+        self.assertIn('vacancy/vacancies.html', cached)
+        self.assertIn('vacancy/vacancies.html', cached_loader.get_template_cache)
+        self.assertEqual(compiled, len(cached) + len(cached_loader.get_template_cache))
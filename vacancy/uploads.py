@@ -0,0 +1,88 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from PIL import Image
+
+from vacancy.models import Company, LogoProcessingQueue
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загрузку сразу во временный файл и прерывает разбор запроса, как
+    только она превышает max_size: остаток тела запроса не читается, а поля
+    формы после файла не попадают в request.POST.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.LOGO_MAX_UPLOAD_SIZE
+        self.received = 0
+
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.file.close()
+            self.request.rejected_uploads = getattr(self.request, 'rejected_uploads', []) + [self.field_name]
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def inspect_image(upload):
+    """
+    Проверяет формат и размеры по заголовку файла: Image.open не
+    декодирует пиксели, поэтому огромная картинка отклоняется до распаковки.
+    """
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError('Загрузите изображение в формате PNG, JPEG, GIF или WebP')
+    finally:
+        upload.seek(0)
+
+    if image_format not in settings.LOGO_FORMATS:
+        raise ValidationError('Загрузите изображение в формате PNG, JPEG, GIF или WebP')
+    max_width, max_height = settings.LOGO_MAX_DIMENSIONS
+    if width > max_width or height > max_height:
+        raise ValidationError('Изображение должно быть не больше {}x{} пикселей'.format(max_width, max_height))
+    return image_format, width, height
+
+
+def reencode_logo(company):
+    """Уменьшает логотип до LOGO_SIZE и пересохраняет без метаданных."""
+    if not company.logo:
+        return False
+    with company.logo.open('rb') as source, Image.open(source) as image:
+        image.thumbnail(settings.LOGO_SIZE)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        output = io.BytesIO()
+        image.save(output, format='PNG', optimize=True)
+
+    old_name = company.logo.name
+    name = os.path.splitext(os.path.basename(old_name))[0] + '.png'
+    company.logo.save(name, ContentFile(output.getvalue()), save=False)
+    company.save(update_fields=['logo'])
+    if company.logo.name != old_name:
+        company.logo.storage.delete(old_name)
+    return True
+
+
+def process_queued_logos(batch_size):
+    count = 0
+    while True:
+        queued = list(LogoProcessingQueue.objects.values_list('company_id', flat=True)[:batch_size])
+        if not queued:
+            return count
+        LogoProcessingQueue.objects.filter(company_id__in=queued).delete()
+        for company in Company.objects.filter(id__in=queued):
+            count += reencode_logo(company)
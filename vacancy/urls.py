@@ -1,7 +1,7 @@
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from . import views
+from . import feeds, sitemaps, views
 
 handler404 = views.custom_handler404
 
@@ -16,14 +16,25 @@ urlpatterns = [
     path('companies/<int:company_id>/', views.CompanyDetailView.as_view(), name='company'),
     path('myresume/', views.MyResumeView.as_view(), name='my_resume'),
     path('myresume/edit/', views.MyResumeEditView.as_view(), name='resume_edit'),
+    path('resumes/', views.ResumeSearchView.as_view(), name='resume_search'),
+    path('mysearches/', views.MySavedSearchesView.as_view(), name='my_searches'),
+    path('mysearches/<int:search_id>/delete/', views.SavedSearchDeleteView.as_view(), name='saved_search_delete'),
     path('mycompany/', views.MyCompanyView.as_view(), name='my_company'),
     path('mycompany/edit/', views.MyCompanyEditView.as_view(), name='company_edit'),
     path('mycompany/vacancies/', views.MyCompanyVacaniesView.as_view(), name='mycompany_vacancies'),
     path('mycompany/vacancies/<int:vacancy_id>', views.MyVacancyEditView.as_view(), name='my_vacancy_edit'),
     path('mycompany/vacancies/create/', views.MyCompanyCreateVacancy.as_view(), name='my_vacancy_create'),
+    path('mycompany/analytics/', views.MyCompanyAnalyticsView.as_view(), name='my_company_analytics'),
     path('login/', views.LoginView.as_view(), name='login'),
     path('logout/', views.LogoutView.as_view(), name='logout'),
     path('registration/', views.RegistrationView.as_view(), name='register'),
+    path('api/salaries/<str:speciality>/', views.SalaryStatsView.as_view(), name='salary_stats'),
+    path('api/metrics/', views.MetricsView.as_view(), name='metrics'),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-catalog.xml', sitemaps.sitemap_catalog, name='sitemap_catalog'),
+    path('sitemap-vacancies-<int:page>.xml', sitemaps.sitemap_vacancies, name='sitemap_vacancies'),
+    path('feeds/cat/<str:speciality>/', feeds.speciality_feed, name='speciality_feed'),
+    path('feeds/companies/<int:company_id>/', feeds.company_feed, name='company_feed'),
 ]
 
 
@@ -1,13 +1,22 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.shortcuts import render
-from django.http import Http404, HttpResponseNotFound, HttpResponseServerError, HttpResponseRedirect
+from django.http import Http404, HttpResponseNotFound, HttpResponseServerError, JsonResponse
 from django.urls import reverse
 from django.shortcuts import redirect
 from django.views import View
 from django.contrib.auth.views import LoginView, LogoutView
-from django.db.models import Count, Q
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Prefetch, Q
 from django.views.generic import TemplateView, CreateView, ListView
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
 from django.contrib import messages
+from django.template.defaultfilters import filesizeformat
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 
 from vacancy.models import (
     Company,
@@ -15,12 +24,86 @@ from vacancy.models import (
     Vacancy,
     Resume,
     Application,
+    LogoProcessingQueue,
+    SalaryStats,
+    SavedSearch,
     ApplicationForm,
     CompanyForm,
     RegisterForm,
     ResumeForm,
+    ResumeSearchForm,
+    SavedSearchForm,
     VacancyForm,
-    SearchVacanciesForm)
+    SearchVacanciesForm,
+    vacancy_expiry_date)
+from vacancy import catalog, locations, metrics, objectcache, rollups
+from vacancy.memory import current_rss, view_memory_stats
+from vacancy.resume_search import search_resumes
+from vacancy.rows import VACANCY_ROW_FIELDS, VacancyRow, vacancy_rows
+from vacancy.search import SEARCH_METRICS, search_vacancies
+from vacancy.uploads import LimitedTemporaryFileUploadHandler
+
+
+def render_public(request, template_name, context=None):
+    # Публичные страницы можно рендерить через Jinja2, см. PUBLIC_TEMPLATE_ENGINE
+    return render(request, template_name, context, using=settings.PUBLIC_TEMPLATE_ENGINE)
+
+
+VACANCY_ORDERINGS = (
+    ('new', 'Сначала новые'),
+    ('salary', 'Сначала с большей зарплатой'),
+)
+
+
+def vacancy_page(request, speciality_ids=None, city_ids=None):
+    """
+    Страница списка открытых вакансий. Если включен каталог в памяти
+    (VACANCY_CATALOG_ENABLED), id страницы находятся в нем и из базы
+    читаются только строки этой страницы.
+    """
+    ordering = request.GET.get('order', catalog.DEFAULT_ORDERING)
+    if ordering not in catalog.ORDERINGS:
+        ordering = catalog.DEFAULT_ORDERING
+
+    vacancy_catalog = catalog.get()
+    if vacancy_catalog is not None:
+        columns, mask = vacancy_catalog.select(speciality_ids, city_ids)
+        paginator = Paginator(vacancy_catalog.sorted_ids(columns, mask, ordering), settings.VACANCIES_PAGE_SIZE)
+        page = paginator.get_page(request.GET.get('page'))
+        ids = page.object_list.tolist()
+        rows = {row.id: row for row in vacancy_rows(Vacancy.objects.filter(id__in=ids))}
+        page.object_list = [rows[vacancy_id] for vacancy_id in ids if vacancy_id in rows]
+    else:
+        vacancies = Vacancy.objects.active().collapsed()
+        if speciality_ids is not None:
+            vacancies = vacancies.filter(speciality_id__in=speciality_ids)
+        if city_ids is not None:
+            vacancies = vacancies.filter(company__city_id__in=city_ids)
+        vacancies = vacancies.order_by(*catalog.ORDERINGS[ordering]).values_list(*VACANCY_ROW_FIELDS)
+        page = Paginator(vacancies, settings.VACANCIES_PAGE_SIZE).get_page(request.GET.get('page'))
+        page.object_list = [VacancyRow(*row) for row in page.object_list]
+
+    def query(**params):
+        query = request.GET.copy()
+        query.pop('page', None)
+        for key, value in params.items():
+            query[key] = value
+        return query.urlencode()
+
+    return {
+        'vacancies': page.object_list,
+        'page_obj': page,
+        'orderings': [(code, title, code == ordering, query(order=code)) for code, title in VACANCY_ORDERINGS],
+        'previous_query': query(page=page.previous_page_number()) if page.has_previous() else None,
+        'next_query': query(page=page.next_page_number()) if page.has_next() else None,
+    }
+
+
+def salary_stats_queryset(location=''):
+    # Строка, из которой убрали все зарплаты, остается до пересчета
+    return SalaryStats.objects.filter(
+        kind=SalaryStats.VACANCY, location=location, count__gt=0,
+    ).prefetch_related('buckets')
 
 
 class MainView(TemplateView):
@@ -29,36 +112,60 @@ class MainView(TemplateView):
 
     def get(self, request):
         context = {}
+        active = Q(vacancies__is_closed=False, vacancies__published_at__gte=vacancy_expiry_date())
         context['specialities'] = Speciality.objects.annotate(
-            vacancies_count=Count('vacancies')
+            vacancies_count=Count('vacancies', filter=active)
+        ).prefetch_related(
+            Prefetch('salary_stats', queryset=salary_stats_queryset(), to_attr='market_salaries')
         ).all()
         context['compaines'] = Company.objects.annotate(
-            vacancies_count=Count('vacancies')
+            vacancies_count=Count('vacancies', filter=active)
         ).all()
         form = self.form_class(initial=self.initial)
-        return render(request, 'vacancy/index.html', context={'compaines': context['compaines'],
-                                                              'specialities': context['specialities'],
-                                                              'form': form})
+        return render_public(request, 'vacancy/index.html', context={'compaines': context['compaines'],
+                                                                     'specialities': context['specialities'],
+                                                                     'form': form})
 
 
 class VacanciesView(View):
 
     def get(self, request):
-        context = {}
-        context['vacancies'] = Vacancy.objects.select_related('company').all()
-
-        return render(request, 'vacancy/vacancies.html', context={'vacancies': context['vacancies']})
+        context = {'location_filter': True}
+        city_ids = None
+        city = request.GET.get('city', '').strip()
+        if city:
+            try:
+                radius = int(request.GET.get('radius', settings.LOCATION_DEFAULT_RADIUS))
+            except ValueError:
+                radius = settings.LOCATION_DEFAULT_RADIUS
+            context['city'] = city
+            context['radius'] = min(max(radius, 0), settings.LOCATION_MAX_RADIUS)
+            context['near'] = locations.find(city)
+            if context['near'] is None:
+                city_ids = []
+            else:
+                city_ids = locations.locations_within(context['near'], context['radius'])
+        context.update(vacancy_page(request, city_ids=city_ids))
+
+        return render_public(request, 'vacancy/vacancies.html', context=context)
 
 
 class VacanciesCategoryView(View):
 
     def get(self, request, speciality):
-        if not Vacancy.objects.filter(speciality__code=speciality).exists():
+        speciality_ids = list(Speciality.objects.filter(code=speciality).values_list('id', flat=True))
+        vacancy_catalog = catalog.get()
+        if vacancy_catalog is not None:
+            exists = vacancy_catalog.select(speciality_ids, collapsed=False)[1].any()
+        else:
+            exists = Vacancy.objects.active().filter(speciality_id__in=speciality_ids).exists()
+        if not exists:
             raise Http404
-        context = {}
-        context['vacancies'] = Vacancy.objects.filter(speciality__code=speciality)
+        context = vacancy_page(request, speciality_ids=speciality_ids)
+        stats = salary_stats_queryset().filter(speciality__code=speciality).first()
+        context['salary'] = stats.summary() if stats else None
 
-        return render(request, 'vacancy/vacancies.html', context={'vacancies': context['vacancies']})
+        return render_public(request, 'vacancy/vacancies.html', context=context)
 
 
 class VacancyDetailView(View):
@@ -68,17 +175,27 @@ class VacancyDetailView(View):
 
     # Handle GET HTTP requests
     def get(self, request, vacancy_id, *args, **kwargs):
-        if not Vacancy.objects.filter(id=vacancy_id).exists():
-            raise Http404
         context = {}
-        context['vacancy'] = Vacancy.objects.get(id=vacancy_id)
+        context['vacancy'] = Vacancy.objects.cached(vacancy_id)
+        if context['vacancy'] is None or context['vacancy'].status != Vacancy.ACTIVE:
+            raise Http404
+        context['similar_vacancies'] = (
+            Vacancy.objects.active()
+            .filter(similar_to__vacancy_id=vacancy_id)
+            .select_related('company')
+            .order_by('-similar_to__score')
+        )
         form = self.form_class(initial=self.initial)
-        return render(request, self.template_name, {'form': form, 'vacancy': context['vacancy']})
+        return render_public(request, self.template_name, {'form': form,
+                                                           'vacancy': context['vacancy'],
+                                                           'similar_vacancies': context['similar_vacancies']})
 
     # Handle POST GTTP requests
     def post(self, request, vacancy_id, *args, **kwargs):
         context = {}
-        context['vacancy'] = Vacancy.objects.get(id=vacancy_id)
+        context['vacancy'] = Vacancy.objects.cached(vacancy_id)
+        if context['vacancy'] is None or context['vacancy'].status != Vacancy.ACTIVE:
+            raise Http404
         form = self.form_class(request.POST)
         if form.is_valid():
             data = form.save(commit=False)
@@ -88,10 +205,17 @@ class VacancyDetailView(View):
             data.username = form.cleaned_data['written_username']
             data.phone = form.cleaned_data['written_phone']
             data.cover = form.cleaned_data['written_cover_letter']
-            data.save()
-            return HttpResponseRedirect('send')
+            data.idempotency_key = form.cleaned_data['idempotency_key'] or uuid.uuid4()
+            try:
+                with transaction.atomic():
+                    data.save()
+            except IntegrityError:
+                # Повторная отправка той же формы или повторный отклик пользователя:
+                # отклик уже есть, уникальный индекс отсек дубликат
+                pass
+            return redirect('send_resume', vacancy_id=context['vacancy'].id)
 
-        return render(request, self.template_name, {'form': form, 'vacancy': context['vacancy']})
+        return render_public(request, self.template_name, {'form': form, 'vacancy': context['vacancy']})
 
 
 class SendedResumeView(TemplateView):
@@ -101,11 +225,13 @@ class SendedResumeView(TemplateView):
 class CompanyDetailView(View):
 
     def get(self, request, company_id):
-        if not Company.objects.filter(id=company_id).exists():
-            raise Http404
         context = {}
-        context['company'] = Company.objects.get(id=company_id)
-        return render(request, 'vacancy/company.html', context={'company': context['company']})
+        context['company'] = Company.objects.cached(company_id)
+        if context['company'] is None:
+            raise Http404
+        context['vacancies'] = context['company'].vacancies.active()
+        return render_public(request, 'vacancy/company.html', context={'company': context['company'],
+                                                                       'vacancies': context['vacancies']})
 
 
 class MyCompanyView(View):
@@ -117,11 +243,18 @@ class MyCompanyView(View):
         return redirect('company_edit')
 
 
+@method_decorator(csrf_exempt, name='dispatch')
 class MyCompanyEditView(View):
     form_class = CompanyForm
     template_name = 'vacancy/company-edit.html'
     initial = {'key': 'value'}
 
+    def dispatch(self, request, *args, **kwargs):
+        # Обработчики загрузки меняются до первого чтения request.POST,
+        # поэтому CSRF проверяется здесь, а не в middleware
+        request.upload_handlers = [LimitedTemporaryFileUploadHandler(request)]
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
     def get(self, request, *args, **kwargs):
 
         user = request.user if request.user.is_authenticated else redirect('login')
@@ -138,6 +271,16 @@ class MyCompanyEditView(View):
 
     def post(self, request, *args, **kwargs):
 
+        # Тело запроса разбирается при первом обращении к request.FILES
+        if 'logo' not in request.FILES and 'logo' in getattr(request, 'rejected_uploads', []):
+            # Разбор прерван на логотипе, и полей формы после него нет
+            messages.error(
+                request,
+                'Файл больше {}, изменения не сохранены'.format(filesizeformat(settings.LOGO_MAX_UPLOAD_SIZE)),
+                extra_tags='danger',
+            )
+            return redirect('company_edit')
+
         user = request.user if request.user.is_authenticated else None
         if hasattr(user, 'company'):
             form = self.form_class(request.POST,
@@ -150,12 +293,15 @@ class MyCompanyEditView(View):
             data = form.save(commit=False)
             data.owner_id = user.id
             data.name = form.cleaned_data['name']
-            if request.FILES:
-                Company(logo=request.FILES['logo'])
             data.employee_count = form.cleaned_data['employee_count']
             data.location = form.cleaned_data['location']
             data.description = form.cleaned_data['description']
             data.save()
+            if 'logo' in request.FILES:
+                # Пережатие логотипа - в фоне, командой process_logos
+                LogoProcessingQueue.objects.bulk_create(
+                    [LogoProcessingQueue(company_id=data.id)], ignore_conflicts=True
+                )
             messages.success(
                 request, 'Информация о компании обновлена', extra_tags='info'
             )
@@ -268,6 +414,31 @@ class MyCompanyCreateVacancy(View):
         return render(request, self.template_name, {'form': form})
 
 
+class MyCompanyAnalyticsView(View):
+    template_name = 'vacancy/company-analytics.html'
+    periods = (7, 30, 90, 365)
+
+    def get(self, request, *args, **kwargs):
+
+        if not request.user.is_authenticated:
+            return redirect('login')
+        if not hasattr(request.user, 'company'):
+            return redirect('my_company')
+
+        try:
+            days = int(request.GET.get('days', settings.ANALYTICS_DEFAULT_DAYS))
+        except ValueError:
+            days = settings.ANALYTICS_DEFAULT_DAYS
+        days = min(max(days, 1), settings.ANALYTICS_MAX_DAYS)
+        summary = rollups.company_summary(request.user.company.id, days)
+        peak = max([row['applications'] for row in summary['daily']] + [1])
+        for row in summary['daily']:
+            row['percent'] = row['applications'] * 100 // peak
+        return render(request, self.template_name, context={'days': days,
+                                                            'periods': self.periods,
+                                                            'summary': summary})
+
+
 class LoginView(LoginView):
     template_name = 'vacancy/login.html'
     redirect_authenticated_user = True
@@ -353,28 +524,127 @@ class MyResumeEditView(View):
         return render(request, self.template_name, {'form': form})
 
 
+class MySavedSearchesView(View):
+    template_name = 'vacancy/saved-searches.html'
+    form_class = SavedSearchForm
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return redirect('login')
+        if not hasattr(request.user, 'resume'):
+            return redirect('my_resume')
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_searches(self):
+        return SavedSearch.objects.filter(user=self.request.user).select_related('speciality')
+
+    def get(self, request, *args, **kwargs):
+
+        form = self.form_class(initial={'query': request.GET.get('search', '')})
+        return render(request, self.template_name, context={'form': form, 'searches': self.get_searches()})
+
+    def post(self, request, *args, **kwargs):
+
+        form = self.form_class(request.POST)
+        if form.is_valid():
+            data = form.save(commit=False)
+            data.user = request.user
+            speciality = form.cleaned_data['speciality']
+            data.speciality = Speciality.objects.filter(code=speciality).first() if speciality else None
+            data.save()
+            messages.success(
+                request, 'Поиск сохранен', extra_tags='info'
+            )
+            return redirect('my_searches')
+
+        return render(request, self.template_name, context={'form': form, 'searches': self.get_searches()})
+
+
+class SavedSearchDeleteView(View):
+
+    def post(self, request, search_id):
+        if request.user.is_authenticated:
+            SavedSearch.objects.filter(id=search_id, user=request.user).delete()
+        return redirect('my_searches')
+
+
+class ResumeSearchView(View):
+    template_name = 'vacancy/resume-search.html'
+    form_class = ResumeSearchForm
+
+    def get(self, request, *args, **kwargs):
+
+        if not request.user.is_authenticated:
+            return redirect('login')
+        if not hasattr(request.user, 'company'):
+            return redirect('my_company')
+
+        form = self.form_class(request.GET)
+        resumes, next_after = [], None
+        if form.is_valid():
+            resumes, next_after = search_resumes(**form.cleaned_data)
+        next_query = None
+        if next_after:
+            next_query = request.GET.copy()
+            next_query['after'] = next_after
+            next_query = next_query.urlencode()
+        return render(request, self.template_name, context={'form': form,
+                                                            'resumes': resumes,
+                                                            'next_query': next_query})
+
+
 class SearchVacanciesView(ListView):
     template_name = "vacancy/vacancies.html"
     context_object_name = 'vacancies'
 
+    @property
+    def template_engine(self):
+        return settings.PUBLIC_TEMPLATE_ENGINE
+
     def get_context_data(self, *args, **kwargs):
 
         context = super().get_context_data(**kwargs)
         context['title'] = 'Найдено вакансий'
+        context['search'] = self.request.GET.get('search', '')
+        context['search_status'] = self.search_status
+        context['search_min_length'] = settings.SEARCH_MIN_QUERY_LENGTH
         return context
 
     def get_queryset(self):
 
         querystring = self.request.GET.get('search')
-        return (
-            Vacancy.objects.filter(
-                Q(title__icontains=querystring)
-                | Q(skills__icontains=querystring)
-                | Q(text__icontains=querystring),
-            )
-            .select_related('company')
-            .all()
+        vacancies, self.search_status = search_vacancies(querystring)
+        return vacancies
+
+
+class MetricsView(View):
+
+    def get(self, request):
+        if not request.user.is_staff:
+            raise Http404
+        data = metrics.snapshot(
+            SEARCH_METRICS + objectcache.metric_names(Vacancy, Company) + ('ratelimit.rejected',)
+        )
+        # Пики памяти по представлениям копит каждый воркер свои: это данные
+        # воркера, ответившего на запрос
+        data['memory'] = {'pid': os.getpid(), 'rss': current_rss(), 'views': view_memory_stats()}
+        return JsonResponse(data)
+
+
+class SalaryStatsView(View):
+
+    def get(self, request, speciality):
+        location = request.GET.get('location', '').strip()
+        stats = (
+            SalaryStats.objects.filter(speciality__code=speciality, location=location, count__gt=0)
+            .prefetch_related('buckets')
         )
+        data = {kind: None for kind, title in SalaryStats.KINDS}
+        for item in stats:
+            data[item.kind] = item.summary()
+        if not any(data.values()) and not Speciality.objects.filter(code=speciality).exists():
+            raise Http404
+        return JsonResponse({'speciality': speciality, 'location': location, **data})
 
 
 def custom_handler404(request, exception):
@@ -0,0 +1,91 @@
+import logging
+import os
+import time
+from wsgiref.util import setup_testing_defaults
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.urls import get_resolver, reverse
+
+from vacancy import catalog
+
+logger = logging.getLogger(__name__)
+
+# Страницы, которые открываются первыми после выкладки
+WARMUP_URL_NAMES = ('index', 'vacancies')
+
+
+def compile_templates():
+    """
+    Компилирует шаблоны приложения обоими движками. Jinja2 держит
+    скомпилированные шаблоны в кеше окружения всегда, Django - только в
+    кешированном загрузчике, который включен при выключенном DEBUG. В режиме
+    разработки прогрев шаблонов Django лишь проверяет, что они компилируются.
+    """
+    app_path = apps.get_app_config('vacancy').path
+    count = 0
+    for engine in engines.all():
+        directory = os.path.join(app_path, engine.app_dirname, 'vacancy')
+        for name in sorted(name for name in os.listdir(directory) if name.endswith('.html')):
+            engine.get_template('vacancy/' + name)
+            count += 1
+    return count
+
+
+def resolve_urls():
+    resolver = get_resolver()
+    # Обращение к reverse_dict заполняет таблицы обратного разрешения
+    return len(resolver.reverse_dict)
+
+
+def open_connections():
+    for connection in connections.all():
+        connection.ensure_connection()
+    return len(connections.all())
+
+
+def load_catalog():
+    vacancy_catalog = catalog.get()
+    return len(vacancy_catalog) if vacancy_catalog is not None else 0
+
+
+def prime_pages(application):
+    """Прогоняет публичные страницы через весь стек middleware и представлений."""
+    statuses = []
+    for url_name in WARMUP_URL_NAMES:
+        environ = {
+            'PATH_INFO': reverse(url_name),
+            # Параметр запроса не дает отдать заранее отрендеренный файл
+            'QUERY_STRING': 'warmup=1',
+            'HTTP_HOST': settings.PRERENDER_HOST,
+        }
+        setup_testing_defaults(environ)
+        started = []
+        body = application(environ, lambda status, headers, exc_info=None: started.append(status))
+        for chunk in body:
+            pass
+        if hasattr(body, 'close'):
+            body.close()
+        statuses.append(started[0] if started else None)
+    return statuses
+
+
+def timed(name, step, *args):
+    start = time.perf_counter()
+    result = step(*args)
+    logger.info('Warm-up %s: %s in %.1f ms', name, result, (time.perf_counter() - start) * 1000)
+    return result
+
+
+def warm_up_code():
+    """Шаги, не открывающие соединений: их можно выполнить в мастере до fork."""
+    timed('templates', compile_templates)
+    timed('urls', resolve_urls)
+
+
+def warm_up_worker(application):
+    timed('connections', open_connections)
+    timed('catalog', load_catalog)
+    timed('pages', prime_pages, application)